@@ -0,0 +1,377 @@
+"""
+LLM backend 앞단의 admission control.
+
+- ``AIMDLimiter``: 동시 실행 한도를 AIMD 로 조절한다.
+  요청이 정상적으로 끝나면 한도를 조금씩 (additive) 늘리고, 429 를 받거나 latency 가 평소보다 크게 늘어나면 한도를 절반으로 (multiplicative) 줄인다.
+- ``AdmissionGate``: 한도를 넘는 요청을 priority queue 에서 기다리게 한다.
+  queue 가 가득 차면 바로 ``AdmissionRejected`` 를 raise 하고, deadline 까지 차례가 오지 않아도 ``AdmissionRejected`` 로 끝난다.
+
+``/search/`` 요청 하나는 global gate 의 slot 하나를 차지하고, 그 안의 LLM 호출은 model 별 gate 를 거친다.
+
+gate 는 process 별이다. prefork 로 N 개의 worker 를 띄우면 worker 마다 ``share_limits(N)`` 을 불러서 한도와 queue 를
+설정값의 1/N 로 줄이므로, pool 전체의 동시 실행 수는 설정값을 넘지 않는다. AIMD 조절은 worker 가 각자 한다.
+
+Environment variables:
+    ADMISSION_INITIAL_LIMIT   -> global 동시 요청 수 초기값 (default 16)
+    ADMISSION_MAX_LIMIT       -> global 동시 요청 수 상한 (default 64)
+    ADMISSION_MAX_QUEUE       -> 대기할 수 있는 요청 수 (default 128)
+    ADMISSION_QUEUE_TIMEOUT   -> queue 에서 기다리는 최대 시간 초 (default 10)
+    ADMISSION_PRIORITY_KEYS   -> "<API key>:<priority>,..." ``X-API-Key`` header 가 일치하는 요청만 그 priority 를 받는다 (default 없음)
+    MODEL_INITIAL_LIMIT       -> model 별 동시 LLM 호출 수 초기값 (default 8)
+    MODEL_MAX_LIMIT           -> model 별 동시 LLM 호출 수 상한 (default 32)
+"""
+import os
+import hmac
+import time
+import heapq
+import asyncio
+import logging
+import weakref
+import itertools
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from telemetry import Gauge, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_WAIT = registry.register(Histogram(
+    "omni_admission_wait_seconds",
+    "Time requests and LLM calls waited in the admission queue.",
+    ["gate"]
+))
+
+# /metrics 의 gauge 가 읽을 수 있도록 만들어진 gate 를 모두 기억한다
+_gates: "weakref.WeakSet[AdmissionGate]" = weakref.WeakSet()
+# 한도를 나눠 쓰는 process 수 (share_limits)
+_process_count = 1
+
+
+def _gate_gauge(name: str, documentation: str, read) -> Gauge:
+    return registry.register(Gauge(
+        name, documentation, ["gate"],
+        lambda: {(gate.name,): read(gate) for gate in list(_gates)}
+    ))
+
+
+_gate_gauge("omni_admission_queue_depth", "Requests waiting in the admission queue.", lambda gate: gate.queue_depth)
+_gate_gauge("omni_admission_in_flight", "Admitted requests currently running.", lambda gate: gate.limiter.in_flight)
+_gate_gauge("omni_admission_limit", "Current AIMD concurrency limit.", lambda gate: gate.limiter.capacity)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, gate: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{gate} is busy ({reason})")
+        self.gate = gate
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """openai.RateLimitError, GatewayError 등 status_code 가 429 인 exception."""
+    return getattr(exc, "status_code", None) == 429
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        baseline_smoothing: float = 0.01,
+        warmup_samples: int = 20,
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        # 최근 latency (EWMA) 가 장기 baseline 의 이 배수를 넘으면 과부하로 본다
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_smoothing = baseline_smoothing
+        # baseline 이 안정될 때까지는 latency 로 한도를 줄이지 않는다
+        self.warmup_samples = warmup_samples
+
+        self.in_flight = 0
+        self.samples = 0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return int(self.limit)
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.capacity
+
+    def on_sample(self, latency: Optional[float], throttled: bool = False) -> None:
+        """latency 가 None 이면 (streaming 처럼 latency 가 응답 길이에 좌우되는 호출) 429 여부만 반영한다."""
+        slow = False
+        if latency is not None:
+            self.samples += 1
+            if self.latency is None:
+                self.latency = self.baseline = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+                self.baseline += self.baseline_smoothing * (latency - self.baseline)
+            slow = self.samples > self.warmup_samples and self.latency > self.baseline * self.latency_tolerance
+
+        if throttled or slow:
+            # 한 번의 과부하에 진행 중이던 요청들이 연달아 한도를 줄이지 않도록, 최근 latency 만큼은 다시 줄이지 않는다
+            now = time.monotonic()
+            if now - self._last_decrease >= (self.latency or 0.0):
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                self.decreases += 1
+        else:
+            # 한도만큼의 요청이 끝나면 한도가 increase 만큼 늘어난다
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def share(self, processes: int) -> None:
+        """한도를 processes 개의 process 가 나눠 쓰도록 줄인다. 각 process 는 최소 min_limit 은 갖는다."""
+        self.max_limit = max(self.min_limit, self.max_limit // processes)
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), self.limit / processes))
+
+
+@dataclass(order=True)
+class _Waiter:
+    # priority 가 큰 요청이 먼저, 같으면 먼저 온 요청이 먼저
+    sort_key: tuple
+    future: asyncio.Future = field(compare=False)
+
+
+class Permit:
+    def __init__(self, gate: "AdmissionGate", track_latency: bool = True) -> None:
+        self._gate = gate
+        self._start = time.monotonic()
+        self._released = False
+        self.track_latency = track_latency
+
+    def release(self, throttled: bool = False) -> None:
+        if self._released:
+            return
+        self._released = True
+        latency = time.monotonic() - self._start if self.track_latency else None
+        self._gate._release(latency, throttled)
+
+
+class AdmissionGate:
+    def __init__(
+        self,
+        name: str,
+        limiter: AIMDLimiter,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.limiter = limiter
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._queue: List[_Waiter] = []
+        self._counter = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.throttled = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        _gates.add(self)
+        if _process_count > 1:
+            self.share(_process_count)
+
+    def share(self, processes: int) -> None:
+        self.limiter.share(processes)
+        if self.max_queue is not None:
+            self.max_queue = max(1, self.max_queue // processes)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._queue if not waiter.future.done())
+
+    def is_saturated(self) -> bool:
+        """slot 도 없고 queue 도 가득 찬 상태. 이 때 들어온 요청은 기다리지 않고 바로 거절된다."""
+        return (
+            not self.limiter.has_capacity()
+            and self.max_queue is not None
+            and self.queue_depth >= self.max_queue
+        )
+
+    async def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> Permit:
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+
+        if self.limiter.has_capacity() and not self.queue_depth:
+            return self._admit(start)
+
+        if self.max_queue is not None and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, "queue full", retry_after=self.retry_after())
+
+        waiter = _Waiter((-priority, next(self._counter)), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+                self.timed_out += 1
+                raise AdmissionRejected(self.name, "queue timeout", retry_after=self.retry_after())
+        except asyncio.CancelledError:
+            if not waiter.future.done():
+                waiter.future.cancel()
+            elif not waiter.future.cancelled():
+                # slot 을 받은 직후 cancel 되면 slot 을 돌려준다
+                self.limiter.in_flight -= 1
+                self._dispatch()
+            raise
+
+        return self._admit(start, counted=True)
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        track_latency: bool = True
+    ) -> AsyncIterator[Permit]:
+        """slot 을 잡고 실행한다. 안에서 429 exception 이 나오면 한도를 줄인다."""
+        permit = await self.acquire(priority, timeout)
+        permit.track_latency = track_latency
+        throttled = False
+        try:
+            yield permit
+        except Exception as e:
+            throttled = is_rate_limited(e)
+            raise
+        finally:
+            permit.release(throttled)
+
+    def _admit(self, start: float, counted: bool = False) -> Permit:
+        if not counted:
+            self.limiter.in_flight += 1
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        ADMISSION_WAIT.observe(waited, gate=self.name)
+        return Permit(self)
+
+    def _release(self, latency: Optional[float], throttled: bool) -> None:
+        self.limiter.in_flight -= 1
+        if throttled:
+            self.throttled += 1
+        self.limiter.on_sample(latency, throttled)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """빈 slot 을 priority 순으로 대기 중인 요청에 넘긴다."""
+        while self._queue and self.limiter.has_capacity():
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            self.limiter.in_flight += 1
+            waiter.future.set_result(None)
+
+    def retry_after(self) -> float:
+        latency = self.limiter.latency or 1.0
+        return round(latency * (1 + self.queue_depth / max(self.limiter.capacity, 1)), 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limiter.capacity,
+            "in_flight": self.limiter.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "throttled": self.throttled,
+            "limit_decreases": self.limiter.decreases,
+            "wait_time_avg": self.wait_time_total / self.admitted if self.admitted else 0.0,
+            "wait_time_max": self.wait_time_max,
+            "latency_ewma": self.limiter.latency,
+            "latency_baseline": self.limiter.baseline,
+        }
+
+
+def share_limits(processes: int) -> None:
+    """
+    prefork worker 안에서 한 번 부른다. 이미 만든 gate (fork 전에 만든 request gate 등) 와 앞으로 만들 gate 의
+    한도와 queue 를 processes 로 나눈다.
+    """
+    global _process_count
+    if processes <= 1 or _process_count > 1:
+        return
+    _process_count = processes
+    for gate in list(_gates):
+        gate.share(processes)
+    logger.info(f"[admission] Sharing admission limits across {processes} worker processes")
+
+
+def _parse_priority_keys(value: str) -> Dict[str, int]:
+    keys = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, priority = item.rpartition(":")
+        keys[key] = int(priority)
+    return keys
+
+
+ADMISSION_PRIORITY_KEYS = _parse_priority_keys(os.getenv("ADMISSION_PRIORITY_KEYS", ""))
+
+
+def request_priority(api_key: Optional[str]) -> int:
+    """
+    request gate 의 priority. client 가 정한 값은 믿지 않고, server 에 등록된 API key 로만 정한다.
+    key 가 없거나 등록되지 않았으면 0 이다.
+    """
+    if not api_key:
+        return 0
+    for key, priority in ADMISSION_PRIORITY_KEYS.items():
+        if hmac.compare_digest(key.encode("utf-8"), api_key.encode("utf-8")):
+            return priority
+    return 0
+
+
+def build_request_gate() -> AdmissionGate:
+    return AdmissionGate(
+        "search",
+        AIMDLimiter(
+            initial_limit=int(os.getenv("ADMISSION_INITIAL_LIMIT", "16")),
+            max_limit=int(os.getenv("ADMISSION_MAX_LIMIT", "64")),
+        ),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "128")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+    )
+
+
+_model_gates: Dict[str, AdmissionGate] = {}
+
+
+def model_gate(model_name: str) -> AdmissionGate:
+    """model 별 LLM 호출 gate. request gate 를 통과한 요청의 호출이므로 queue 는 제한하지 않는다."""
+    gate = _model_gates.get(model_name)
+    if gate is None:
+        gate = AdmissionGate(
+            f"model:{model_name}",
+            AIMDLimiter(
+                initial_limit=int(os.getenv("MODEL_INITIAL_LIMIT", "8")),
+                max_limit=int(os.getenv("MODEL_MAX_LIMIT", "32")),
+            ),
+        )
+        _model_gates[model_name] = gate
+    return gate
+
+
+def model_gate_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: gate.stats() for name, gate in _model_gates.items()}
@@ -0,0 +1,77 @@
+"""
+orchestrator 재시도 loop 를 흉내낸 synthetic 대화에서 대화 이력 render 비용과 prompt 크기를 비교한다.
+
+    python -m benchmarks.bench_chat_history --rounds 3 --docs-per-tool 30
+"""
+import time
+import random
+import string
+import argparse
+
+from typing import Callable, List
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from utils import ChatHistoryBuilder, estimate_tokens, get_chat_history
+
+
+def synthetic_transcript(rounds: int, tools_per_round: int, docs_per_tool: int, doc_chars: int) -> List[AnyMessage]:
+    rng = random.Random(0)
+    alphabet = string.ascii_letters + "가나다라마바사아자차카타파하 "
+
+    messages: List[AnyMessage] = [HumanMessage(content="연차 휴가는 며칠인가요?", id="human")]
+    for r in range(rounds):
+        calls = [
+            {"name": "hr_doc_retriever", "args": {"query": "연차", "topk": docs_per_tool, "alpha": 0.75}, "id": f"call-{r}-{t}"}
+            for t in range(tools_per_round)
+        ]
+        messages.append(AIMessage(content="", tool_calls=calls, id=f"ai-{r}"))
+        for call in calls:
+            docs = ["".join(rng.choices(alphabet, k=doc_chars)) for _ in range(docs_per_tool)]
+            messages.append(ToolMessage(content="\n\n".join(docs), tool_call_id=call["id"], id=f"tool-{call['id']}"))
+    return messages
+
+
+def run(render: Callable[[List[AnyMessage]], str], messages: List[AnyMessage], repeat: int) -> tuple[float, int]:
+    """graph 의 각 단계마다 (지금까지의 message 로) 대화 이력을 render 하는 것을 흉내낸다."""
+    prompt_tokens = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for step in range(1, len(messages) + 1):
+            prompt_tokens = estimate_tokens(render(messages[:step]))
+    return (time.perf_counter() - start) / repeat, prompt_tokens
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat history rendering benchmark")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tools-per-round", type=int, default=2)
+    parser.add_argument("--docs-per-tool", type=int, default=30)
+    parser.add_argument("--doc-chars", type=int, default=1000)
+    parser.add_argument("--token-budget", type=int, default=8000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    messages = synthetic_transcript(args.rounds, args.tools_per_round, args.docs_per_tool, args.doc_chars)
+
+    def fresh_builder() -> Callable[[List[AnyMessage]], str]:
+        builder = ChatHistoryBuilder()
+        return builder.render
+
+    def budgeted_builder() -> Callable[[List[AnyMessage]], str]:
+        builder = ChatHistoryBuilder()
+        return lambda msgs: builder.render(msgs, token_budget=args.token_budget)
+
+    results = {
+        "get_chat_history": run(get_chat_history, messages, args.repeat),
+        "incremental": run(fresh_builder(), messages, args.repeat),
+        f"incremental+budget({args.token_budget})": run(budgeted_builder(), messages, args.repeat),
+    }
+
+    print(f"{len(messages)} messages, {args.repeat} repeats")
+    for name, (seconds, tokens) in results.items():
+        print(f"{name:<32} {seconds * 1e3:10.2f} ms/run   final prompt ~{tokens:>8} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+cold start 측정: ``python -X importtime`` 으로 ``import main`` 의 module 별 import 시간을 모으고,
+``--ready`` 를 주면 ``python main.py`` 를 띄워서 ``/health`` 가 200 을 돌려줄 때까지의 시간도 잰다.
+
+import 는 매번 새 interpreter 에서 ``--repeat`` 번 실행하고 중간값을 쓴다. 결과는 load_test 처럼
+``benchmarks/results/`` 에 JSON 으로 저장하고 ``--compare`` 로 이전 결과와 비교한다.
+
+    python -m benchmarks.bench_import_time --repeat 5 --ready
+    python -m benchmarks.bench_import_time --compare benchmarks/results/<이전 결과>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.load_test import REGRESSION_TOLERANCE, RESULTS_DIR, free_port, git_revision
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportTimeReport:
+    module: str
+    # interpreter 시작부터 끝까지의 wall time 과 -X importtime 의 target module 누적 시간 (초, 중간값)
+    wall: float
+    import_total: float
+    # top-level package 별 self 시간 합
+    packages: Dict[str, float]
+    # 이 repo 의 module 중 누적 시간이 큰 것
+    first_party: Dict[str, float]
+    time_to_ready: Optional[float] = None
+    config: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, float, float]]:
+    """``import time: self | cumulative | name`` 줄을 (name, self 초, cumulative 초) 로."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def is_first_party(name: str) -> bool:
+    top = name.split(".")[0]
+    return (REPO_DIR / top).is_dir() or (REPO_DIR / f"{top}.py").is_file()
+
+
+def measure_import(module: str, env: Dict[str, str]) -> Tuple[float, List[Tuple[str, float, float]]]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return time.perf_counter() - start, parse_importtime(result.stderr)
+
+
+def measure_ready(env: Dict[str, str], timeout: float = 120.0) -> float:
+    """process 시작부터 lifespan warmup 이 끝나고 /health 가 응답할 때까지의 시간."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=REPO_DIR, env={**env, "PORT": str(port), "HOST": "127.0.0.1", "WORKERS": "1"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client() as client:
+            while time.perf_counter() - start < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"main.py exited with code {server.returncode} before becoming ready")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.02)
+        raise TimeoutError("main.py did not become ready")
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def build_report(args: argparse.Namespace, env: Dict[str, str]) -> ImportTimeReport:
+    walls, totals = [], []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    first_party: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(args.repeat):
+        wall, rows = measure_import(args.module, env)
+        walls.append(wall)
+        totals.append(next(cumulative for name, _, cumulative in reversed(rows) if name == args.module))
+
+        per_package: Dict[str, float] = defaultdict(float)
+        for name, self_time, cumulative in rows:
+            per_package[name.split(".")[0]] += self_time
+            if is_first_party(name):
+                first_party[name].append(cumulative)
+        for package, seconds in per_package.items():
+            packages[package].append(seconds)
+
+    def top(values: Dict[str, List[float]]) -> Dict[str, float]:
+        medians = {name: statistics.median(samples) for name, samples in values.items()}
+        return dict(sorted(medians.items(), key=lambda item: item[1], reverse=True)[:args.top])
+
+    return ImportTimeReport(
+        module=args.module,
+        wall=statistics.median(walls),
+        import_total=statistics.median(totals),
+        packages=top(packages),
+        first_party=top(first_party),
+        time_to_ready=measure_ready(env) if args.ready else None,
+        config={"llm_backend": env["LLM_BACKEND"], "retriever_backend": env["RETRIEVER_BACKEND"], "git_rev": git_revision()},
+    )
+
+
+def print_report(report: ImportTimeReport) -> None:
+    print(f"import {report.module}: {report.import_total * 1e3:.0f}ms (process wall {report.wall * 1e3:.0f}ms)")
+    if report.time_to_ready is not None:
+        print(f"time to ready:   {report.time_to_ready * 1e3:.0f}ms")
+    print("\nby package (self time)")
+    for name, seconds in report.packages.items():
+        print(f"  {name:<32} {seconds * 1e3:8.1f}ms")
+    print("\nfirst-party modules (cumulative)")
+    for name, seconds in report.first_party.items():
+        print(f"  {name:<32} {seconds * 1e3:8.1f}ms")
+
+
+def compare(report: ImportTimeReport, baseline_path: Path) -> bool:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    ok = True
+    print(f"\ncompared with {baseline_path.name} ({baseline.get('config', {}).get('git_rev', '?')})")
+    for name in ("import_total", "wall", "time_to_ready"):
+        before, after = baseline.get(name), getattr(report, name)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        regressed = change > REGRESSION_TOLERANCE
+        ok = ok and not regressed
+        print(f"{name:<14} {before * 1e3:8.0f}ms -> {after * 1e3:8.0f}ms ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time / cold start benchmark")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--ready", action="store_true", help="main.py 를 띄워서 /health 까지의 시간도 잰다")
+    parser.add_argument("--llm-backend", default="fake", help="LLM_BACKEND (openai 는 GEMINI_API_KEY 가 필요하다)")
+    parser.add_argument("--retriever-backend", default="local", help="RETRIEVER_BACKEND (es 는 --ready 에 Elasticsearch 가 필요하다)")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        "LLM_BACKEND": args.llm_backend,
+        "RETRIEVER_BACKEND": args.retriever_backend,
+        "LOG_LEVEL": "WARNING",
+        "ROUTER_USE_EMBEDDINGS": os.getenv("ROUTER_USE_EMBEDDINGS", "false"),
+    }
+    report = build_report(args, env)
+    print_report(report)
+
+    output = args.output or RESULTS_DIR / f"importtime-{time.strftime('%Y%m%d-%H%M%S')}-{report.config['git_rev']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(asdict(report), indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nsaved {output}")
+
+    if args.compare is not None and not compare(report, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
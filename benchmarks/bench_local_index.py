@@ -0,0 +1,83 @@
+"""
+local vector index 의 kNN / BM25 검색 latency 를 corpus 크기별로 측정한다. IVF 는 ``--ivf-min-rows`` 이상에서 만든다.
+vector 는 cluster 구조가 없는 random vector 라서 IVF recall 은 실제 embedding 보다 낮게 나온다 (하한).
+
+    python -m benchmarks.bench_local_index --sizes 1000 10000 50000 --dim 768
+"""
+import time
+import random
+import argparse
+import tempfile
+
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.fakes import synthetic_corpus
+from retriever.local_index import LocalIndexWriter, LocalVectorIndex
+
+
+def build_index(root: Path, size: int, dim: int, ivf_min_rows: int) -> LocalVectorIndex:
+    rng = np.random.default_rng(0)
+    writer = LocalIndexWriter(root / f"bench-{size}", ivf_min_rows=ivf_min_rows)
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    for i, (text, vector) in enumerate(zip(synthetic_corpus(size, words_per_doc=40), vectors)):
+        writer.upsert(f"doc-{i}", text, {"source": f"synthetic/{i}.txt"}, vector)
+    writer.commit()
+    return LocalVectorIndex.open(writer.path)
+
+
+def measure(search: Callable[[], object], repeat: int) -> Dict[str, float]:
+    search()
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"p50": timings[len(timings) // 2], "p99": timings[min(len(timings) - 1, int(0.99 * len(timings)))]}
+
+
+def recall(index: LocalVectorIndex, queries: np.ndarray, k: int) -> float:
+    """IVF 결과가 전체 dot product 의 top-k 를 얼마나 찾는지."""
+    if index.centroids is None:
+        return 1.0
+    found = 0
+    for query in queries:
+        exact = set(np.argsort(-(np.asarray(index.vectors) @ (query / np.linalg.norm(query))))[:k].tolist())
+        found += len(exact & {row for row, _ in index.knn(query, k)})
+    return found / (k * len(queries))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local vector index benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topk", type=int, default=30)
+    parser.add_argument("--ivf-min-rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.repeat, args.dim), dtype=np.float32)
+    words = list(synthetic_corpus(args.repeat, words_per_doc=4, seed=1))
+
+    with tempfile.TemporaryDirectory() as root:
+        for size in args.sizes:
+            start = time.perf_counter()
+            index = build_index(Path(root), size, args.dim, args.ivf_min_rows)
+            build_seconds = time.perf_counter() - start
+
+            knn = measure(lambda: index.knn(queries[random.randrange(len(queries))], args.topk), args.repeat)
+            match = measure(lambda: index.match(words[random.randrange(len(words))], args.topk), args.repeat)
+            mode = f"ivf({len(index.centroids)})" if index.centroids is not None else "flat"
+            print(
+                f"{size:>7} docs {mode:<10} build={build_seconds:6.2f}s "
+                f"knn p50={knn['p50'] * 1e3:7.3f}ms p99={knn['p99'] * 1e3:7.3f}ms "
+                f"bm25 p50={match['p50'] * 1e3:7.3f}ms recall@{args.topk}={recall(index, queries[:20], args.topk):.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+검색 결과 cache (``retriever.result_cache``) 유무에 따른 ``Worker`` 호출 latency 를 fake Elasticsearch 로 측정한다.
+
+``queries.jsonl`` 의 query 를 Zipf 분포로 뽑아서 orchestrator 의 재시도와 여러 사용자의 반복 질문을 흉내내고,
+``--upsert-every`` 번마다 문서 하나를 다시 써서 index generation 을 올린다. query embedding 은 ``--embed-latency`` 만큼,
+``msearch`` 는 ``--es-latency`` 만큼 걸린다.
+
+    python -m benchmarks.bench_result_cache --calls 2000 --upsert-every 200
+"""
+import time
+import random
+import asyncio
+import argparse
+
+from pathlib import Path
+from typing import Dict, List
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.fakes import synthetic_corpus
+from benchmarks.load_test import DEFAULT_QUERIES, load_queries, percentiles
+from retriever.fake_es import FakeAsyncElasticsearch
+from retriever.result_cache import RetrievalResultCache
+from retriever.workers import METADATA_FIELD, TEXT_FIELD, VECTOR_FIELD, Worker, resolve_index
+
+
+class SlowEmbedding(DeterministicFakeEmbedding):
+    """query embedding model 호출 지연을 흉내낸다."""
+    latency: float = 0.0
+    calls: int = 0
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+
+async def run(args: argparse.Namespace, queries: List[str], cached: bool) -> Dict[str, float]:
+    embeddings = SlowEmbedding(size=args.dim, latency=args.embed_latency)
+    es_client = FakeAsyncElasticsearch(latency=args.es_latency)
+    index = resolve_index("HR")
+    texts = list(synthetic_corpus(args.num_docs))
+    for i, (text, vector) in enumerate(zip(texts, embeddings.embed_documents(texts))):
+        es_client.indices[index][f"HR-{i}"] = {TEXT_FIELD: text, VECTOR_FIELD: vector, METADATA_FIELD: {"i": i}}
+
+    cache = RetrievalResultCache(max_entries=args.max_entries, generation_check_interval=args.generation_check_interval)
+    worker = Worker("HR", es_client=es_client, embeddings=embeddings, result_cache=cache if cached else None)
+
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(queries))]
+    timings = []
+    for call in range(args.calls):
+        if args.upsert_every and call and call % args.upsert_every == 0:
+            doc_id = f"HR-{rng.randrange(args.num_docs)}"
+            await es_client.index(index, es_client.indices[index][doc_id], id=doc_id)
+
+        query = rng.choices(queries, weights)[0]
+        start = time.perf_counter()
+        await worker(query, topk=args.topk, alpha=args.alpha)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        **percentiles(timings),
+        "msearch": es_client.num_msearch_calls,
+        "embed": embeddings.calls,
+        "hit_rate": cache.hits / args.calls if cached else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retrieval result cache benchmark")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES)
+    parser.add_argument("--zipf", type=float, default=1.0, help="query 인기도 분포의 지수 (0 이면 균등)")
+    parser.add_argument("--upsert-every", type=int, default=200, help="이 호출 수마다 문서 하나를 다시 쓴다 (0 이면 쓰지 않는다)")
+    parser.add_argument("--generation-check-interval", type=float, default=0.0)
+    parser.add_argument("--max-entries", type=int, default=2048)
+    parser.add_argument("--num-docs", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--topk", type=int, default=30)
+    parser.add_argument("--alpha", type=float, default=0.75)
+    parser.add_argument("--embed-latency", type=float, default=0.005)
+    parser.add_argument("--es-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    baseline = None
+    for cached in (False, True):
+        stats = asyncio.run(run(args, queries, cached))
+        baseline = baseline or stats["mean"]
+        print(
+            f"{'cache' if cached else 'no cache':<9} mean={stats['mean'] * 1e3:7.2f}ms (x{stats['mean'] / baseline:.2f}) "
+            f"p50={stats['p50'] * 1e3:7.2f}ms p99={stats['p99'] * 1e3:7.2f}ms "
+            f"hit_rate={stats['hit_rate']:.1%} msearch={stats['msearch']} embed={stats['embed']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+tool 호출마다 발생하는 setup 비용 (sub-graph compile, Worker 생성) 을 registry 사용 전/후로 비교한다.
+
+    python -m benchmarks.bench_setup_overhead --iterations 200
+"""
+import argparse
+import timeit
+
+from langgraph_scripts.agents.document_retriever import DocumentRetriever
+from langgraph_scripts.registry import get_document_retriever, get_worker
+from retriever.workers import Worker
+
+
+def per_call_setup() -> None:
+    DocumentRetriever()
+    Worker(intent="HR")
+    Worker(intent="wiki")
+
+
+def registry_setup() -> None:
+    get_document_retriever()
+    get_worker("HR")
+    get_worker("wiki")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-call setup overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    # 첫 호출 (compile) 비용은 startup 에서 한 번만 지불하므로 측정에서 제외한다
+    registry_setup()
+
+    results = {
+        "per-call construction": timeit.timeit(per_call_setup, number=args.iterations),
+        "shared registry": timeit.timeit(registry_setup, number=args.iterations),
+    }
+
+    for name, total in results.items():
+        print(f"{name:<24} {total / args.iterations * 1e6:>12.1f} us/call")
+
+    speedup = results["per-call construction"] / max(results["shared registry"], 1e-12)
+    print(f"{'speedup':<24} {speedup:>12.1f} x")
+
+
+if __name__ == "__main__":
+    main()
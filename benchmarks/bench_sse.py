@@ -0,0 +1,131 @@
+"""
+SSE encoding 방식별 서버 CPU 시간을 비교한다.
+
+방식마다 같은 token stream 을 흘려보내는 작은 app 을 uvicorn subprocess 로 띄우고, ``--streams`` 개의 client 로
+동시에 받은 뒤 서버가 쓴 CPU 시간 (``time.process_time``) 과 client 가 받은 SSE frame 수를 잰다.
+    legacy     token 마다 json.dumps 한 str frame (이전 StreamingService._format_sse)
+    writer-0   SSEWriter, coalesce_ms=0 (loop 한 바퀴 동안 쌓인 token 만 합친다)
+    writer     SSEWriter, 기본 설정 (SSE_COALESCE_MS / SSE_COALESCE_BYTES)
+
+    python -m benchmarks.bench_sse --streams 200 --tokens 300 --tokens-per-second 100
+"""
+import sys
+import json
+import random
+import asyncio
+import argparse
+import subprocess
+
+from pathlib import Path
+from typing import AsyncIterator, Dict
+
+import httpx
+
+from benchmarks.fakes import synthetic_corpus
+from benchmarks.load_test import free_port
+from sse import SSEEvent, SSEWriter
+
+MODES = ("legacy", "writer-0", "writer")
+
+
+async def token_events(tokens: int, tokens_per_second: float, seed: int) -> AsyncIterator[SSEEvent]:
+    words = next(synthetic_corpus(1, words_per_doc=tokens, seed=seed)).split()
+    # 여러 stream 의 token 이 같은 순간에 몰리지 않도록 시작 시점을 흩뜨린다
+    await asyncio.sleep(random.random() / tokens_per_second)
+    for word in words:
+        yield "stream", {"data": word + " "}
+        await asyncio.sleep(1 / tokens_per_second)
+    yield "finished", {"status": "done", "cache_hit": False, "ttft": 0.1, "e2el": 1.0}
+
+
+async def legacy_frames(events: AsyncIterator[SSEEvent]) -> AsyncIterator[str]:
+    async for type, data in events:
+        yield f"event: {type}\ndata: {json.dumps(data)}\n\n"
+
+
+def run_server(args: argparse.Namespace) -> None:
+    import time
+    import uvicorn
+
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    frames = {
+        "legacy": legacy_frames,
+        "writer-0": SSEWriter(coalesce_ms=0).frames,
+        "writer": SSEWriter().frames,
+    }[args.mode]
+
+    async def stream(request):
+        events = token_events(args.tokens, args.tokens_per_second, int(request.query_params["seed"]))
+        return StreamingResponse(frames(events), media_type="text/event-stream")
+
+    async def cpu(request):
+        return JSONResponse({"cpu": time.process_time()})
+
+    app = Starlette(routes=[Route("/stream", stream), Route("/cpu", cpu)])
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def read_stream(port: int, seed: int) -> int:
+    """raw socket 으로 응답을 끝까지 읽고 SSE frame 수를 센다 (client 쪽 CPU 를 줄이기 위해 httpx 를 쓰지 않는다)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /stream?seed={seed} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    frames = 0
+    tail = b""
+    while chunk := await reader.read(65536):
+        frames += (tail + chunk).count(b"\n\n")
+        tail = chunk[-1:]
+    writer.close()
+    # 응답 header 끝의 \r\n\r\n 은 세지 않는다
+    return frames
+
+
+async def drive(port: int, streams: int) -> Dict[str, float]:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(100):
+            try:
+                before = (await client.get("/cpu")).json()["cpu"]
+                break
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+        frames = await asyncio.gather(*[read_stream(port, seed) for seed in range(streams)])
+        after = (await client.get("/cpu")).json()["cpu"]
+    return {"cpu": after - before, "frames": sum(frames)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE encoding benchmark")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--mode", choices=MODES, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run_server(args)
+        return
+
+    baseline = None
+    for mode in MODES:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_sse", "--mode", mode, "--port", str(port),
+             "--tokens", str(args.tokens), "--tokens-per-second", str(args.tokens_per_second)],
+            cwd=Path(__file__).resolve().parent.parent,
+        )
+        try:
+            random.seed(0)
+            stats = asyncio.run(drive(port, args.streams))
+        finally:
+            server.terminate()
+            server.wait()
+
+        baseline = baseline or stats["cpu"]
+        print(f"{mode:<9} server cpu={stats['cpu']:6.2f}s (x{stats['cpu'] / baseline:.2f}) frames={stats['frames']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+worker process 수 (``WORKERS``) 에 따른 ``/search/`` 처리량을 fake LLM 과 local vector index 로 측정한다.
+
+worker 수마다 ``serve()`` 로 서버를 subprocess 로 띄우고, ``load_test.drive`` 로 같은 부하를 준 뒤 SIGTERM 으로 내린다.
+fake LLM 의 token 간격을 짧게 하고 답변을 길게 해서 SSE encoding 과 graph 실행 같은 CPU 작업이 병목이 되게 한다.
+처리량은 CPU core 수까지만 늘어난다. core 가 하나면 worker 를 늘려도 차이가 없다.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --clients 64 --requests 400
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fakes import configure_fake_llm, install_local_retriever
+from benchmarks.load_test import DEFAULT_QUERIES, drive, free_port, load_queries, percentiles
+
+
+def run_server(args: argparse.Namespace) -> None:
+    """--serve: fake backend 를 설치하고 serve() 로 WORKERS 개의 process 를 띄운다 (driver 가 subprocess 로 실행한다)."""
+    configure_fake_llm(args.llm_latency, args.tokens_per_second, args.answer_tokens, args.tool_rounds)
+    os.environ["RETRIEVER_BACKEND"] = "local"
+    os.environ.setdefault("SESSIONS_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    install_local_retriever(args.index_dir, num_docs=args.num_docs)
+
+    from main import app, preload
+    from serve import serve
+
+    serve(app, host="127.0.0.1", port=args.port, workers=args.workers[0], preload=preload, log_level="warning")
+
+
+async def wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Server at {url} did not become ready")
+
+
+async def worker_pids(url: str, probes: int = 50) -> int:
+    """요청을 처리한 서로 다른 worker 수 (kernel 이 accept 를 나눠주므로 대략적인 값)."""
+    async with httpx.AsyncClient() as client:
+        responses = await asyncio.gather(*[client.get(f"{url}/health") for _ in range(probes)])
+    return len({response.json()["pid"] for response in responses})
+
+
+def measure(args: argparse.Namespace, workers: int, queries: List[str]) -> Dict[str, float]:
+    port = free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.bench_workers", "--serve",
+        "--workers", str(workers), "--port", str(port), "--index-dir", str(args.index_dir),
+        "--llm-latency", str(args.llm_latency), "--tokens-per-second", str(args.tokens_per_second),
+        "--answer-tokens", str(args.answer_tokens), "--tool-rounds", str(args.tool_rounds),
+        "--num-docs", str(args.num_docs),
+    ]
+    server = subprocess.Popen(command, cwd=Path(__file__).resolve().parent.parent)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(url))
+        # 첫 요청의 lazy 초기화가 측정에 섞이지 않도록 worker 마다 몇 번씩 먼저 보낸다
+        asyncio.run(drive(url, queries, args.clients, workers * 4))
+        results, duration = asyncio.run(drive(url, queries, args.clients, args.requests))
+        seen = asyncio.run(worker_pids(url))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    done = [result for result in results if result.status == "done"]
+    return {
+        "throughput": len(done) / duration,
+        "failed": len(results) - len(done),
+        "e2e_p50": percentiles([result.e2e for result in done]).get("p50", 0.0),
+        "workers_seen": seen,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-process serving throughput benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES)
+    parser.add_argument("--llm-latency", type=float, default=0.01)
+    parser.add_argument("--tokens-per-second", type=float, default=5000.0)
+    parser.add_argument("--answer-tokens", type=int, default=300)
+    parser.add_argument("--tool-rounds", type=int, default=1)
+    parser.add_argument("--num-docs", type=int, default=2000)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--index-dir", type=Path, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        run_server(args)
+        return
+
+    queries = load_queries(args.queries)
+    print(f"cpu cores: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory(prefix="omni-bench-workers-") as index_dir:
+        args.index_dir = Path(index_dir)
+        baseline = None
+        for workers in args.workers:
+            stats = measure(args, workers, queries)
+            baseline = baseline or stats["throughput"]
+            print(
+                f"workers={workers:<3} throughput={stats['throughput']:8.2f} req/s "
+                f"(x{stats['throughput'] / baseline:.2f}) e2e p50={stats['e2e_p50'] * 1e3:7.1f}ms "
+                f"failed={stats['failed']} workers_seen={stats['workers_seen']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+benchmark 용 offline 환경: fake LLM (``models.fake_llm``) 과 synthetic 문서를 넣은 fake Elasticsearch 또는 local vector index.
+
+``configure_fake_llm`` 은 ``models.llm`` 이 import 되기 전에 호출해야 한다.
+"""
+import os
+import random
+
+from pathlib import Path
+from typing import Iterable
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from retriever.fake_es import FakeAsyncElasticsearch
+from retriever.local_index import LocalIndexClient, LocalIndexWriter
+from retriever.result_cache import get_result_cache
+from retriever.workers import METADATA_FIELD, TEXT_FIELD, VECTOR_FIELD, Worker, resolve_index, resolve_intent
+
+_VOCABULARY = (
+    "연차 휴가 신청 규정 복지 제도 사내 문서 직원 회사 승인 절차 급여 보험 교육 지원 출장 경비 근무 시간 "
+    "재택 평가 승진 육아 휴직 건강 검진 동호회 식대 주차 장비 보안 계정 역사 과학 지리 인물 사건 도시 국가"
+).split()
+
+
+def configure_fake_llm(
+    latency: float = 0.2,
+    tokens_per_second: float = 50.0,
+    answer_tokens: int = 40,
+    tool_rounds: int = 1,
+) -> None:
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(latency)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(tokens_per_second)
+    os.environ["FAKE_LLM_ANSWER_TOKENS"] = str(answer_tokens)
+    os.environ["FAKE_LLM_TOOL_ROUNDS"] = str(tool_rounds)
+    # 실제 embedding model 이 필요한 response cache 와 router 의 embedding 분류는 끈다
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+    os.environ.setdefault("ROUTER_USE_EMBEDDINGS", "false")
+
+
+def synthetic_corpus(num_docs: int, words_per_doc: int = 120, seed: int = 0) -> Iterable[str]:
+    rng = random.Random(seed)
+    for _ in range(num_docs):
+        yield " ".join(rng.choices(_VOCABULARY, k=words_per_doc))
+
+
+def install_fake_retriever(
+    intents: Iterable[str] = ("HR", "wiki"),
+    num_docs: int = 200,
+    dim: int = 64,
+    latency: float = 0.005,
+) -> FakeAsyncElasticsearch:
+    """
+    intent 별 index 에 synthetic 문서를 넣은 FakeAsyncElasticsearch 로 Worker 를 만들어 registry 에 등록한다.
+    이후 get_worker() 는 이 Worker 를 반환한다.
+    """
+    from langgraph_scripts.registry import worker_registry
+
+    es_client = FakeAsyncElasticsearch(latency=latency)
+    embeddings = DeterministicFakeEmbedding(size=dim)
+
+    for seed, intent in enumerate(intents):
+        index = resolve_index(intent)
+        texts = list(synthetic_corpus(num_docs, seed=seed))
+        for i, (text, vector) in enumerate(zip(texts, embeddings.embed_documents(texts))):
+            es_client.indices[index][f"{intent}-{i}"] = {
+                TEXT_FIELD: text,
+                VECTOR_FIELD: vector,
+                METADATA_FIELD: {"source": f"synthetic/{intent}/{i // 4}.txt", "start_index": (i % 4) * 800},
+            }
+        worker_registry.get(resolve_intent(intent), lambda intent=intent: Worker(
+            intent=intent, es_client=es_client, embeddings=embeddings, result_cache=get_result_cache()
+        ))
+
+    return es_client
+
+
+def install_local_retriever(
+    root: Path,
+    intents: Iterable[str] = ("HR", "wiki"),
+    num_docs: int = 200,
+    dim: int = 64,
+) -> LocalIndexClient:
+    """
+    intent 별 synthetic 문서로 ``root`` 아래에 local vector index 를 만들고, 그 index 를 검색하는 Worker 를 registry 에 등록한다.
+    """
+    from langgraph_scripts.registry import worker_registry
+
+    client = LocalIndexClient(root)
+    embeddings = DeterministicFakeEmbedding(size=dim)
+
+    for seed, intent in enumerate(intents):
+        writer = LocalIndexWriter(Path(root) / resolve_index(intent))
+        texts = list(synthetic_corpus(num_docs, seed=seed))
+        for i, (text, vector) in enumerate(zip(texts, embeddings.embed_documents(texts))):
+            metadata = {"source": f"synthetic/{intent}/{i // 4}.txt", "start_index": (i % 4) * 800}
+            writer.upsert(f"{intent}-{i}", text, metadata, vector)
+        writer.commit()
+        worker_registry.get(resolve_intent(intent), lambda intent=intent: Worker(
+            intent=intent, es_client=client, embeddings=embeddings, result_cache=get_result_cache()
+        ))
+
+    return client
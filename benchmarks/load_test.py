@@ -0,0 +1,303 @@
+"""
+``/search/`` 에 N 개의 SSE client 를 동시에 붙여 처리량, TTFT, E2E latency, event loop lag 를 측정한다.
+
+기본은 fake LLM 과 fake Elasticsearch 로 app 을 같은 process 에서 띄우므로 network 없이 실행된다.
+``--url`` 을 주면 이미 떠 있는 서버에 부하를 준다 (event loop lag 는 서버의 /metrics 에서 읽는다).
+
+    python -m benchmarks.load_test --clients 32 --requests 200
+    python -m benchmarks.load_test --compare benchmarks/results/<이전 결과>.json
+    python -m benchmarks.load_test --url http://localhost:8888 --queries my_queries.jsonl
+
+query file 은 한 줄에 하나의 JSON (``{"query": ...}``, requests.jsonl 처럼 ``title`` 만 있어도 된다) 이다.
+결과는 ``benchmarks/results/`` 에 JSON 으로 저장된다.
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import itertools
+import tempfile
+import subprocess
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import configure_fake_llm, install_fake_retriever, install_local_retriever
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_QUERIES = BENCH_DIR / "queries.jsonl"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# --compare 에서 이 비율 이상 나빠지면 regression 으로 본다
+REGRESSION_TOLERANCE = 0.15
+
+
+@dataclass
+class RequestResult:
+    status: str
+    ttft: Optional[float] = None
+    e2e: float = 0.0
+    # stream payload 를 공백으로 나눈 단어 수 (fake LLM 의 token 수와 같다). SSE frame 하나에 여러 token 이 합쳐져 온다
+    tokens: int = 0
+    frames: int = 0
+
+
+@dataclass
+class LoadTestReport:
+    clients: int
+    requests: int
+    duration: float
+    throughput: float
+    tokens_per_second: float
+    frames_per_second: float
+    statuses: Dict[str, int]
+    ttft: Dict[str, float]
+    e2e: Dict[str, float]
+    loop_lag: Dict[str, float]
+    config: Dict[str, Any] = field(default_factory=dict)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+        "mean": sum(ordered) / len(ordered),
+    }
+
+
+def load_queries(path: Path) -> List[str]:
+    queries = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        query = record.get("query") or record.get("title")
+        if query:
+            queries.append(query)
+    if not queries:
+        raise ValueError(f"No queries found in {path}")
+    return queries
+
+
+async def run_request(client: httpx.AsyncClient, url: str, query: str) -> RequestResult:
+    start = time.perf_counter()
+    result = RequestResult(status="error")
+    event = None
+    try:
+        async with client.stream("POST", f"{url}/search/", json={"query": query}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                result.status = f"http_{response.status_code}"
+                return result
+
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: ") and event == "stream":
+                    if result.ttft is None:
+                        result.ttft = time.perf_counter() - start
+                    result.tokens += len(json.loads(line[len("data: "):])["data"].split())
+                    result.frames += 1
+                elif line.startswith("data: ") and event == "finished":
+                    result.status = json.loads(line[len("data: "):])["status"]
+    except httpx.HTTPError as e:
+        result.status = type(e).__name__
+    finally:
+        result.e2e = time.perf_counter() - start
+    return result
+
+
+async def drive(url: str, queries: List[str], clients: int, requests: int) -> tuple[List[RequestResult], float]:
+    """closed-loop: client 마다 응답을 다 받으면 다음 query 를 보낸다."""
+    query_iter = itertools.cycle(queries)
+    remaining = itertools.count()
+    results: List[RequestResult] = []
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        while next(remaining) < requests:
+            results.append(await run_request(client, url, next(query_iter)))
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(client) for _ in range(clients)])
+        duration = time.perf_counter() - start
+    return results, duration
+
+
+async def scrape_loop_lag(url: str) -> Dict[str, float]:
+    """서버의 omni_event_loop_lag_seconds histogram 의 (sum, count)."""
+    async with httpx.AsyncClient() as client:
+        text = (await client.get(f"{url}/metrics")).text
+    values = {}
+    for name in ("sum", "count"):
+        match = re.search(rf"^omni_event_loop_lag_seconds_{name} (\S+)$", text, re.MULTILINE)
+        values[name] = float(match.group(1)) if match else 0.0
+    return values
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_in_process(args: argparse.Namespace, queries: List[str]) -> LoadTestReport:
+    configure_fake_llm(args.llm_latency, args.tokens_per_second, args.answer_tokens, args.tool_rounds)
+    if args.retriever == "local":
+        install_local_retriever(Path(tempfile.mkdtemp(prefix="omni-local-index-")), num_docs=args.num_docs)
+    else:
+        install_fake_retriever(num_docs=args.num_docs, latency=args.es_latency)
+    if args.speculative:
+        os.environ["SPECULATIVE_RETRIEVAL"] = "true"
+
+    import uvicorn
+    from main import app
+    from telemetry import monitor_event_loop_lag
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    lag_samples: List[float] = []
+    lag_task = asyncio.create_task(monitor_event_loop_lag(interval=0.01, samples=lag_samples))
+    try:
+        results, duration = await drive(f"http://127.0.0.1:{port}", queries, args.clients, args.requests)
+    finally:
+        lag_task.cancel()
+        server.should_exit = True
+        await server_task
+
+    return build_report(args, results, duration, percentiles(lag_samples))
+
+
+async def run_remote(args: argparse.Namespace, queries: List[str]) -> LoadTestReport:
+    before = await scrape_loop_lag(args.url)
+    results, duration = await drive(args.url, queries, args.clients, args.requests)
+    after = await scrape_loop_lag(args.url)
+
+    samples = after["count"] - before["count"]
+    loop_lag = {"mean": (after["sum"] - before["sum"]) / samples} if samples else {}
+    return build_report(args, results, duration, loop_lag)
+
+
+def build_report(args: argparse.Namespace, results: List[RequestResult], duration: float, loop_lag: Dict[str, float]) -> LoadTestReport:
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    done = [result for result in results if result.status == "done"]
+
+    config = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items() if key not in ("compare", "output")}
+    config["git_rev"] = git_revision()
+    return LoadTestReport(
+        clients=args.clients,
+        requests=len(results),
+        duration=duration,
+        throughput=len(done) / duration if duration else 0.0,
+        tokens_per_second=sum(result.tokens for result in done) / duration if duration else 0.0,
+        frames_per_second=sum(result.frames for result in done) / duration if duration else 0.0,
+        statuses=statuses,
+        ttft=percentiles([result.ttft for result in done if result.ttft is not None]),
+        e2e=percentiles([result.e2e for result in done]),
+        loop_lag=loop_lag,
+        config=config,
+    )
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: LoadTestReport) -> None:
+    print(f"{report.requests} requests, {report.clients} clients, {report.duration:.2f}s")
+    print(
+        f"throughput      {report.throughput:10.2f} req/s   {report.tokens_per_second:10.1f} tokens/s"
+        f"   {report.frames_per_second:10.1f} frames/s"
+    )
+    print(f"statuses        {report.statuses}")
+    for name in ("ttft", "e2e", "loop_lag"):
+        stats = getattr(report, name)
+        print(f"{name:<15} " + "  ".join(f"{key}={value * 1e3:.1f}ms" for key, value in stats.items()))
+
+
+def compare(report: LoadTestReport, baseline_path: Path) -> bool:
+    """baseline 대비 나빠진 지표를 출력하고, regression 이 없으면 True."""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    checks = [
+        ("throughput", baseline["throughput"], report.throughput, True),
+        ("ttft.p50", baseline["ttft"].get("p50"), report.ttft.get("p50"), False),
+        ("ttft.p99", baseline["ttft"].get("p99"), report.ttft.get("p99"), False),
+        ("e2e.p50", baseline["e2e"].get("p50"), report.e2e.get("p50"), False),
+        ("e2e.p99", baseline["e2e"].get("p99"), report.e2e.get("p99"), False),
+    ]
+
+    ok = True
+    print(f"\ncompared with {baseline_path.name} ({baseline.get('config', {}).get('git_rev', '?')})")
+    for name, before, after, higher_is_better in checks:
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        regressed = -change > REGRESSION_TOLERANCE if higher_is_better else change > REGRESSION_TOLERANCE
+        ok = ok and not regressed
+        print(f"{name:<12} {before:10.4f} -> {after:10.4f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="/search/ SSE load test")
+    parser.add_argument("--url", default=None, help="부하를 줄 서버. 없으면 fake backend 로 app 을 직접 띄운다")
+    parser.add_argument("--queries", type=Path, default=DEFAULT_QUERIES)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM 의 첫 token 지연 초")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--tool-rounds", type=int, default=1)
+    parser.add_argument("--es-latency", type=float, default=0.005)
+    parser.add_argument("--num-docs", type=int, default=200)
+    parser.add_argument("--retriever", choices=("fake-es", "local"), default="fake-es",
+                        help="synthetic 문서를 fake Elasticsearch 와 local vector index 중 어디에 넣을지")
+    parser.add_argument("--speculative", action="store_true", help="speculative retrieval 을 켜고 실행한다")
+    parser.add_argument("--output", type=Path, default=None, help="결과 JSON 경로 (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, default=None, help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    runner = run_remote if args.url else run_in_process
+    report = asyncio.run(runner(args, queries))
+    print_report(report)
+
+    output = args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report.config['git_rev']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(asdict(report), indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nsaved {output}")
+
+    if args.compare is not None and not compare(report, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
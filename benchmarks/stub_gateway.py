@@ -0,0 +1,114 @@
+"""
+LLM gateway 를 흉내내는 local stub server. OpenAI 호환 ``/v1/chat/completions`` (stream 포함) 를 제공한다.
+지연 시간과 429/5xx 실패 비율을 조절할 수 있어서 gateway client 의 pool/재시도 동작을 확인할 때 쓴다.
+
+    python -m benchmarks.stub_gateway --port 8999 --latency 0.2 --fail-rate 0.1
+    LLM_GATEWAY_URL=http://localhost:8999 LLM_GATEWAY_TOKEN=stub python -m benchmarks.stub_gateway --bench 200
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from typing import Any, Dict
+
+import uvicorn
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency: float = 0.1, token_delay: float = 0.01, fail_rate: float = 0.0, fail_status: int = 503) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.failures = 0
+
+    def completion_text(body: Dict[str, Any]) -> str:
+        user_turns = [m["content"] for m in body.get("messages", []) if m.get("role") == "user"]
+        return f"stub answer to: {user_turns[-1] if user_turns else ''}"
+
+    @app.get("/health")
+    async def health():
+        return {"requests": app.state.requests, "failures": app.state.failures}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(latency)
+
+        if random.random() < fail_rate:
+            app.state.failures += 1
+            return JSONResponse({"error": "injected failure"}, status_code=fail_status, headers={"Retry-After": "0"})
+
+        text = completion_text(body)
+        created = int(time.time())
+        if not body.get("stream"):
+            return {
+                "id": "stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            }
+
+        async def events():
+            for token in text.split(" "):
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+async def bench(requests: int) -> None:
+    """LLM_GATEWAY_URL 의 서버로 call_llm 을 동시에 보내서 처리량과 실패 수를 본다."""
+    from utils import call_llm
+    from models.gateway import get_gateway_client
+    from models.http_pool import close_http_pools
+
+    async def one(i: int) -> bool:
+        try:
+            await call_llm("You are a stub.", f"question {i}")
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    tokens = []
+    async for token in get_gateway_client().stream_chat([{"role": "user", "content": "streaming check"}]):
+        tokens.append(token)
+    await close_http_pools()
+
+    print(f"{requests} requests in {elapsed:.2f}s ({requests / elapsed:.1f} req/s), {results.count(False)} failed")
+    print(f"stream: {''.join(tokens)!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local LLM gateway stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--bench", type=int, default=0, help="서버 대신 client benchmark 를 N 개 요청으로 실행")
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(bench(args.bench))
+        return
+
+    app = create_app(args.latency, args.token_delay, args.fail_rate, args.fail_status)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
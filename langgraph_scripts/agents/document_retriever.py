@@ -1,12 +1,21 @@
 from langgraph.graph import StateGraph
 from langgraph.graph.state import CompiledStateGraph, END
-from langgraph_scripts.tools import *
-from langgraph_scripts.graph_state import *
+from langgraph_scripts.registry import get_worker
+from langgraph_scripts.graph_state import SearchAgentState
+from retriever.context_packer import pack_documents
+
+import os
+import logging
 
 from typing import Any
-from langchain_core.prompts import load_prompt
-from langchain_core.messages import SystemMessage, HumanMessage
+from admission import model_gate
+from telemetry import span, traced
+from prompt_registry import prompt_registry
+from langchain_core.messages import HumanMessage
+
+logger = logging.getLogger(__name__)
 
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "4000"))
 
 class DocumentRetriever:
     def __init__(self) -> None:
@@ -36,37 +45,48 @@ class DocumentRetriever:
         }
         return await self.graph.ainvoke(state)
 
+    @traced("node", "document_retriever.analyze_query")
     async def analyze_query(self, state: SearchAgentState) -> SearchAgentState:
         query = state["query"]
-        system_prompt = load_prompt("prompts/rag_agent_clasify_intent.yaml", encoding="utf-8")
+        system_prompt = prompt_registry.get_system_message("rag_agent_classify_intent")
         user_prompt = f"""# User's query
 {query}
 """
 
-        intent = await base_llm.ainvoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ])
+        from models.llm import MODEL_NAME, get_base_llm
+        async with model_gate(MODEL_NAME).admit(), span("llm", "document_retriever.classify_intent") as llm_span:
+            intent = await get_base_llm().ainvoke([
+                system_prompt,
+                HumanMessage(content=user_prompt)
+            ])
+            llm_span.record_usage(intent)
 
         return {
-            "intent": intent
+            "intent": intent.content.strip()
         }
 
+    @traced("node", "document_retriever.retrieve")
     async def retrieve(self, state: SearchAgentState) -> SearchAgentState:
-        retriever = Worker(intent=state["intent"])
+        retriever = get_worker(state["intent"])
         retrieved_docs = await retriever(state["query"], state["topk"], state["alpha"])
         
         return {
             "retrieved_docs": retrieved_docs
         }
     
+    @traced("node", "document_retriever.generate_answer")
     async def generate_answer(self, state: SearchAgentState) -> SearchAgentState:
         user_query = state["query"]
         retrieved_docs = state["retrieved_docs"]
 
-        formatted_docs = "\n\n".join([doc.page_content for doc in retrieved_docs])
+        packed = pack_documents(retrieved_docs, token_budget=RAG_CONTEXT_TOKEN_BUDGET)
+        formatted_docs = packed.text
+        logger.info(
+            f"[DocumentRetriever] packed {len(packed.documents)}/{len(retrieved_docs)} docs, "
+            f"{packed.tokens_used} tokens (saved {packed.tokens_saved})"
+        )
 
-        system_prompt = load_prompt("prompts/rag_agent_generate_answer.yaml", encoding="utf-8")
+        system_prompt = prompt_registry.get_system_message("rag_agent_generate_answer")
         user_prompt = f"""# User's query
 {user_query}
 
@@ -75,12 +95,14 @@ class DocumentRetriever:
 """
 
         prompt = [
-            SystemMessage(content=system_prompt),
+            system_prompt,
             HumanMessage(content=user_prompt)
         ]
 
-        from models.llm import base_llm
-        generated_answer = await base_llm.ainvoke(prompt)
+        from models.llm import MODEL_NAME, get_base_llm
+        async with model_gate(MODEL_NAME).admit(), span("llm", "document_retriever.generate_answer") as llm_span:
+            generated_answer = await get_base_llm().ainvoke(prompt)
+            llm_span.record_usage(generated_answer)
 
         return {
             "generated_answer": generated_answer
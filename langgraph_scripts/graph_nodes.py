@@ -1,35 +1,124 @@
+import os
+import time
+import asyncio
 import logging
 
-from typing import Literal
+from typing import Any, List, Literal, Optional
 
-from utils import get_chat_history
-from models.llm import base_llm, tool_llm
-from langgraph_scripts.tools import tools, TOOL_MAP
-from langgraph_scripts.graph_state import AgentState
+from utils import ChatHistoryBuilder
+from prompt_registry import prompt_registry
+from admission import model_gate
+from telemetry import span, traced
+from models.llm import MODEL_NAME, get_base_llm, get_tool_llm
+from langgraph_scripts.tools import RETRIEVER_TOOL_INTENTS, TOOL_MAP
+from langgraph_scripts.speculation import SpeculativeRetrieval, query_similarity
+from langgraph_scripts.graph_state import AgentState, RetrievalRecord
+from langgraph_scripts.registry import get_router
+from langgraph_scripts.router import ORCHESTRATOR_ROUTE
+from retriever.context_packer import pack_documents
+from sessions import SessionStore, document_ref
+from telemetry import Counter, registry
 
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
-from langchain_core.prompts import load_prompt
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, ToolCall, RemoveMessage
+from langchain_core.runnables import RunnableConfig
 
 logger = logging.getLogger(__name__)
 
-async def orchestrator(state: AgentState) -> AgentState:
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+# tool_llm 에 보내는 대화 이력의 token 상한. 넘으면 오래된 tool 결과부터 줄인다
+ORCHESTRATOR_HISTORY_TOKEN_BUDGET = int(os.getenv("ORCHESTRATOR_HISTORY_TOKEN_BUDGET", "8000"))
+# 검색 tool 하나의 결과를 ToolMessage 로 만들 때의 token 상한
+TOOL_CONTEXT_TOKEN_BUDGET = int(os.getenv("TOOL_CONTEXT_TOKEN_BUDGET", "4000"))
+
+
+# pre-router 가 바로 검색 tool 로 보낼 때 쓰는 인자
+FAST_ROUTE_TOPK = int(os.getenv("FAST_ROUTE_TOPK", "10"))
+FAST_ROUTE_ALPHA = float(os.getenv("FAST_ROUTE_ALPHA", "0.75"))
+
+# follow-up turn 의 검색 질의가 이전 검색과 이 이상 비슷하면 session 에 저장된 문서를 다시 쓴다
+SESSION_REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.5"))
+SESSION_REUSE_ALPHA_TOLERANCE = 0.15
+# session 에 남기는 최근 turn 수. 더 오래된 message 는 지운다
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "10"))
+
+SESSION_REUSES = registry.register(Counter(
+    "omni_session_retrieval_reuse_total",
+    "Tool calls answered from documents stored in the session instead of a new search.",
+    ["tool"]
+))
+
+
+def _history_builder(config: RunnableConfig) -> ChatHistoryBuilder:
+    """한 번의 graph 실행 동안 node 들이 같은 builder 를 공유해서, 이미 render 한 message 를 다시 render 하지 않는다."""
+    builder = config.get("configurable", {}).get("history_builder")
+    return builder if builder is not None else ChatHistoryBuilder()
+
+
+@traced("node", "pre_router")
+async def pre_router(state: AgentState) -> AgentState:
     """
-    
+    확실한 질의는 orchestrator LLM 을 거치지 않고 바로 검색 tool 이나 generate_answer 로 보낸다.
+    검색 tool 로 보낼 때는 orchestrator 가 만든 것과 같은 형태의 tool call 을 대신 만든다.
+    """
+    router = get_router()
+    if router is None:
+        return {"route": ORCHESTRATOR_ROUTE}
+
+    decision = await router.route(state["user_input"])
+    return_state = {"route": decision.route}
+    if decision.is_fast and decision.route != "generate_answer":
+        return_state["messages"] = [AIMessage(content="", tool_calls=[{
+            "name": decision.route,
+            "args": {"query": state["user_input"], "topk": FAST_ROUTE_TOPK, "alpha": FAST_ROUTE_ALPHA},
+            "id": f"router-{state['messages'][-1].id or 'call'}"
+        }])]
+
+    logger.info(f"[pre_router] {decision.route} ({decision.method}, confidence {decision.confidence:.2f})")
+    return return_state
+
+
+async def route_after_pre_router(state: AgentState) -> Literal["tool", "answer", "orchestrator"]:
+    route = state.get("route", ORCHESTRATOR_ROUTE)
+    if route == ORCHESTRATOR_ROUTE:
+        return "orchestrator"
+    return "answer" if route == "generate_answer" else "tool"
+
+
+async def route_after_tools(state: AgentState) -> Literal["answer", "orchestrator"]:
+    """pre-router 가 보낸 검색이 성공했으면 orchestrator 를 다시 부르지 않고 답변을 만든다."""
+    last_msg = state["messages"][-1]
+    fast_routed = state.get("route", ORCHESTRATOR_ROUTE) not in (ORCHESTRATOR_ROUTE, "generate_answer")
+    if fast_routed and getattr(last_msg, "status", "success") == "success" and last_msg.content:
+        return "answer"
+    return "orchestrator"
+
+
+@traced("node", "orchestrator")
+async def orchestrator(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    대화 이력을 보고 다음에 사용할 tool 을 고른다.
     """
     msg_history = state["messages"]
-    conv_history = get_chat_history(msg_history)
+    conv_history = _history_builder(config).render(msg_history, token_budget=ORCHESTRATOR_HISTORY_TOKEN_BUDGET)
 
-    system_prompt = load_prompt("prompts/orchestrator.yaml", encoding="utf-8").template
-    # logger.info(f"[orchestrator] System prompt\n---\n{system_prompt.template}")
-    return_state = {}
+    system_prompt = prompt_registry.get_system_message("orchestrator")
+    # 검색이 실패해서 orchestrator 로 돌아온 경우, 이후 tool 결과는 orchestrator 가 다시 판단한다
+    return_state = {"route": ORCHESTRATOR_ROUTE}
+    start = time.perf_counter()
     try:
-        ai_msg = await tool_llm.ainvoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=conv_history)
-        ])
-        
+        async with model_gate(MODEL_NAME).admit(), span("llm", "orchestrator") as llm_span:
+            ai_msg = await get_tool_llm().ainvoke([
+                system_prompt,
+                HumanMessage(content=conv_history)
+            ])
+            llm_span.record_usage(ai_msg)
+
         return_state["messages"] = [ai_msg]
+        router = get_router()
+        if router is not None:
+            router.record_orchestrator_latency(time.perf_counter() - start)
 
     except Exception as e:
         logger.error(f"[orchestrator] Exception: {str(e)}")
@@ -39,67 +128,239 @@ async def orchestrator(state: AgentState) -> AgentState:
 
 async def should_continue(state: AgentState) -> Literal["tool", "next"]:
     last_msg = state["messages"][-1]
-    tool_name = getattr(last_msg, "tool_calls", None)
+    tool_calls = getattr(last_msg, "tool_calls", None) or []
+    calls_generate_answer = any(call.get("name") == "generate_answer" for call in tool_calls)
 
-    if (isinstance(last_msg, AIMessage) and tool_name == "generate_answer") or state["num_tries"] > 2:
+    if (isinstance(last_msg, AIMessage) and calls_generate_answer) or state["num_tries"] > 2:
         return "next"
     else:
         return "tool"
     
 
-async def execute_tools(state: AgentState) -> AgentState:
+@traced("node", "execute_tools")
+async def execute_tools(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    orchestrator 가 한 번에 요청한 tool call 들을 동시에 실행한다.
+
+    동시 실행 수는 ``TOOL_MAX_CONCURRENCY``, tool 별 제한 시간은 ``TOOL_TIMEOUT`` 초.
+    ToolMessage 는 tool_calls 순서대로 반환하고, 실패하거나 시간 초과된 tool 은 error ToolMessage 로 대체한다.
+    """
     last_msg = state["messages"][-1]
 
     retrieved_results = {
         "messages": [],
-        "num_tries": state["num_tries"] + 1
+        "num_tries": state["num_tries"] + 1,
+        "context_tokens_saved": 0
     }
 
-    for call in getattr(last_msg, "tool_calls", []):
-        tool_name = call.get("name")
-        args = call.get("args")
-        tool_call_id = call.get("id")
+    calls = [
+        call for call in getattr(last_msg, "tool_calls", [])
+        if call.get("name") in TOOL_MAP and call.get("id")
+    ]
+    configurable = config.get("configurable", {})
+    semaphore = asyncio.Semaphore(TOOL_MAX_CONCURRENCY)
+    speculation: SpeculativeRetrieval | None = configurable.get("speculation")
+    session: _Session | None = None
+    if configurable.get("session_store") is not None and configurable.get("thread_id"):
+        session = _Session(configurable["session_store"], configurable["thread_id"], state.get("retrievals", []))
 
-        if not (tool_name and tool_call_id and (tool_name in TOOL_MAP.keys())):
-            continue
-        
-        tool = TOOL_MAP[tool_name]
-        try:
-            result = await tool.ainvoke(args)
-            if type(result) is list:
-                tool_msg_content = "\n\n".join([doc.page_content for doc in result])
+    outcomes = await asyncio.gather(*[_run_tool(call, semaphore, speculation, session) for call in calls])
+    if speculation is not None:
+        # 이번에 쓰이지 않은 prefetch 는 더 기다리지 않는다
+        speculation.cancel_unclaimed()
 
-            elif type(result) is str:
-                tool_msg_content = result
+    retrievals: List[RetrievalRecord] = []
+    for call, (tool_msg, result, tokens_saved) in zip(calls, outcomes):
+        retrieved_results["messages"].append(tool_msg)
+        retrieved_results["context_tokens_saved"] += tokens_saved
+        if tool_msg.status == "success" and type(result) is list:
+            retrievals.append(await _record_retrieval(call, result, session))
 
-            else:
-                tool_msg_content = ""
+    if retrievals:
+        retrieved_results["retrievals"] = retrievals
+    return retrieved_results
+
+
+class _Session:
+    __slots__ = ("store", "thread_id", "retrievals")
+
+    def __init__(self, store: SessionStore, thread_id: str, retrievals: List[RetrievalRecord]) -> None:
+        self.store = store
+        self.thread_id = thread_id
+        self.retrievals = retrievals
+
+    async def reuse(self, call: ToolCall) -> Optional[List[Document]]:
+        """이전 turn 에 비슷한 질의로 같은 검색을 했으면 session 에 저장된 문서를 반환한다."""
+        args = call.get("args") or {}
+        query, topk, alpha = args.get("query", ""), args.get("topk", 10), args.get("alpha", 0.75)
+        for record in reversed(self.retrievals):
+            usable = (
+                record["tool"] == call["name"]
+                and topk <= record["topk"]
+                and abs(alpha - record["alpha"]) <= SESSION_REUSE_ALPHA_TOLERANCE
+                and query_similarity(query, record["query"]) >= SESSION_REUSE_SIMILARITY
+            )
+            if not usable:
+                continue
 
-        except Exception as e:
-            logger.error(f"[execute_tools] Exception: {str(e)}")
+            documents = await self.store.aload_documents(record["refs"][:topk])
+            # eviction 으로 문서가 지워졌으면 다시 검색한다
+            if documents is not None:
+                SESSION_REUSES.inc(tool=call["name"])
+                return documents
 
+        return None
 
-        retrieved_results["messages"].append(
-            ToolMessage(content=tool_msg_content, tool_call_id=tool_call_id)
+
+async def _record_retrieval(call: ToolCall, documents: List[Document], session: _Session | None) -> RetrievalRecord:
+    args = call.get("args") or {}
+    if session is not None:
+        refs = await session.store.astore_documents(session.thread_id, documents)
+    else:
+        refs = [document_ref(doc) for doc in documents]
+
+    return {
+        "tool": call["name"],
+        "tool_call_id": call["id"],
+        "query": args.get("query", ""),
+        "topk": args.get("topk", 10),
+        "alpha": args.get("alpha", 0.75),
+        "refs": refs,
+    }
+
+
+async def _invoke_tool(call: ToolCall, speculation: SpeculativeRetrieval | None, session: _Session | None = None) -> Any:
+    """
+    session 에 이전 turn 의 같은 검색 결과가 있으면 그 문서를, 같은 검색을 미리 시작해 둔 prefetch 가 있으면 그 결과를,
+    둘 다 없으면 tool 을 실행한 결과를 반환한다.
+    """
+    args = call.get("args") or {}
+    intent = RETRIEVER_TOOL_INTENTS.get(call["name"])
+    if session is not None and intent is not None:
+        reused = await session.reuse(call)
+        if reused is not None:
+            return reused
+
+    if speculation is not None and intent is not None:
+        prefetched = await speculation.claim(intent, args.get("query", ""), args.get("topk", 10), args.get("alpha", 0.75))
+        if prefetched is not None:
+            return prefetched
+
+    return await TOOL_MAP[call["name"]].ainvoke(args)
+
+
+async def _run_tool(
+    call: ToolCall,
+    semaphore: asyncio.Semaphore,
+    speculation: SpeculativeRetrieval | None = None,
+    session: _Session | None = None
+) -> tuple[ToolMessage, Any, int]:
+    tool_name = call["name"]
+    tool_call_id = call["id"]
+
+    try:
+        async with semaphore, span("tool", tool_name):
+            result = await asyncio.wait_for(_invoke_tool(call, speculation, session), timeout=TOOL_TIMEOUT)
+
+    except asyncio.TimeoutError:
+        logger.error(f"[execute_tools] {tool_name} timed out after {TOOL_TIMEOUT}s")
+        error_msg = ToolMessage(
+            content=f"{tool_name} timed out after {TOOL_TIMEOUT} seconds.",
+            tool_call_id=tool_call_id,
+            status="error"
         )
-        retrieved_results[f"{tool_name}_results"] = result
+        return error_msg, None, 0
 
-    return retrieved_results
+    except Exception as e:
+        logger.error(f"[execute_tools] {tool_name} Exception: {str(e)}")
+        error_msg = ToolMessage(
+            content=f"{tool_name} failed: {str(e)}",
+            tool_call_id=tool_call_id,
+            status="error"
+        )
+        return error_msg, None, 0
+
+    tokens_saved = 0
+    if type(result) is list:
+        packed = pack_documents(result, token_budget=TOOL_CONTEXT_TOKEN_BUDGET)
+        tool_msg_content = packed.text
+        tokens_saved = packed.tokens_saved
+        logger.info(
+            f"[execute_tools] {tool_name}: packed {len(packed.documents)}/{len(result)} docs, "
+            f"{packed.tokens_used} tokens (saved {tokens_saved})"
+        )
 
+    elif type(result) is str:
+        tool_msg_content = result
 
-async def generate_answer(state: AgentState) -> AgentState:
-    chat_history = get_chat_history(state["messages"])
+    else:
+        tool_msg_content = ""
+
+    return ToolMessage(content=tool_msg_content, tool_call_id=tool_call_id), result, tokens_saved
+
+
+@traced("node", "generate_answer")
+async def generate_answer(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    최종 답변을 생성하는 node.
+
+    ``config["configurable"]["token_queue"]`` 가 주어지면 LLM chunk 를 받는 즉시 queue 에 넣는다.
+    queue 가 가득 차 있으면 client 가 소비할 때까지 upstream stream 읽기도 멈춘다 (backpressure).
+    """
+    chat_history = _history_builder(config).render(state["messages"])
+    token_queue: asyncio.Queue | None = config.get("configurable", {}).get("token_queue")
     answer = ""
-    system_prompt = load_prompt("prompts/generate_answer.yaml", encoding="utf-8").template
+    system_prompt = prompt_registry.get_system_message("generate_answer")
+
+    # streaming 시간은 답변 길이에 좌우되므로 latency 는 한도 조절에 쓰지 않는다
+    async with model_gate(MODEL_NAME).admit(track_latency=False), span("llm", "generate_answer") as llm_span:
+        chunk_stream = get_base_llm().astream([
+            system_prompt,
+            HumanMessage(content=chat_history)
+        ])
+
+        async for chunk in chunk_stream:
+            # stream_usage 를 켜면 마지막 chunk 에 token 사용량이 들어 있다
+            llm_span.record_usage(chunk)
+            if not chunk.content:
+                continue
 
-    chunk_stream = base_llm.astream([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=chat_history)
-    ])
+            llm_span.first_token()
 
-    async for chunk in chunk_stream:
-        answer += chunk.content
+            answer += chunk.content
+            if token_queue is not None:
+                await token_queue.put(chunk.content)
 
     return {
         "messages": [AIMessage(content=answer)]
-    }
\ No newline at end of file
+    }
+
+
+@traced("node", "compact_session")
+async def compact_session(state: AgentState) -> AgentState:
+    """
+    session 에 저장하기 전에 검색 결과 ToolMessage 를 문서 참조 요약으로 바꾸고, ``SESSION_MAX_TURNS`` 보다 오래된 turn 을 지운다.
+    다음 turn 에서 같은 검색을 다시 부르면 ``_Session.reuse`` 가 저장된 문서로 답한다.
+    """
+    messages = state["messages"]
+    human_indexes = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+    first_kept = human_indexes[-SESSION_MAX_TURNS] if len(human_indexes) > SESSION_MAX_TURNS else 0
+    updates = [RemoveMessage(id=msg.id) for msg in messages[:first_kept]]
+
+    records = {record["tool_call_id"]: record for record in state.get("retrievals", [])}
+    for msg in messages[first_kept:]:
+        record = records.get(getattr(msg, "tool_call_id", None))
+        if not isinstance(msg, ToolMessage) or record is None or msg.additional_kwargs.get("compacted"):
+            continue
+        updates.append(ToolMessage(
+            id=msg.id,
+            tool_call_id=msg.tool_call_id,
+            status=msg.status,
+            content=(
+                f"{len(record['refs'])} documents were retrieved by {record['tool']} for '{record['query']}' in an earlier turn. "
+                f"Call {record['tool']} again with the same query to read them."
+            ),
+            additional_kwargs={"compacted": True}
+        ))
+
+    return {"messages": updates}
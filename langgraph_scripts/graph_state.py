@@ -3,9 +3,13 @@ from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 from langgraph.graph import MessagesState
 
-from typing import List, Literal
+from typing import Annotated, List, Literal, Optional
+from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 
+# session 에 남기는 검색 기록 수. 오래된 것부터 버린다
+MAX_RETRIEVAL_RECORDS = 20
+
 
 class Intent(BaseModel):
     query: str = Field(
@@ -27,12 +31,41 @@ class SearchAgentState(MessagesState):
     generated_answer: str
 
 
+class DocRef(TypedDict):
+    """검색된 Document 의 참조. 본문은 session 저장소에 있다."""
+    id: str
+    index: str
+    score: float
+
+
+class RetrievalRecord(TypedDict):
+    tool: str
+    tool_call_id: str
+    query: str
+    topk: int
+    alpha: float
+    refs: List[DocRef]
+
+
+def keep_recent_retrievals(current: List[RetrievalRecord], update: List[RetrievalRecord]) -> List[RetrievalRecord]:
+    return (current + update)[-MAX_RETRIEVAL_RECORDS:]
+
+
+def add_or_reset(current: int, update: Optional[int]) -> int:
+    """None 을 넣으면 0 부터 다시 센다. session 의 새 turn 은 입력으로 None 을 준다."""
+    return 0 if update is None else current + update
+
+
 class AgentState(MessagesState):
     user_input: str
-    hr_doc_retriever_results: List[Document]
-    wiki_doc_retriever_results: List[Document]
+    # 검색 결과는 본문 대신 참조만 둔다. follow-up turn 이 같은 검색을 하면 session 저장소에서 다시 읽는다
+    retrievals: Annotated[List[RetrievalRecord], keep_recent_retrievals]
     translator_results: str
     num_tries: int
+    # pre-router 가 고른 경로 (tool 이름, "generate_answer", 또는 "orchestrator")
+    route: str
+    # context packing 으로 줄인 token 수의 요청 (turn) 내 누적값
+    context_tokens_saved: Annotated[int, add_or_reset]
 
 
 class FinalAnswer(BaseModel):
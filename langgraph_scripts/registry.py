@@ -0,0 +1,149 @@
+import os
+import logging
+import threading
+
+from typing import Any, Callable, Dict, Iterable, Optional, TypeVar
+
+from retriever.workers import Worker, resolve_intent
+from retriever.result_cache import get_result_cache
+from retriever.reranker import Reranker, build_scoring_model
+from langgraph_scripts.router import QueryRouter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRIEVER_INTENTS = ("HR", "wiki")
+
+# "lexical" 이나 sentence-transformers CrossEncoder model 이름. 비어 있으면 rerank 하지 않는다
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+RERANKER_WORKERS = int(os.getenv("RERANKER_WORKERS", "2"))
+
+# 평가 전까지는 기본으로 끈다
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# "es" 는 Elasticsearch, "local" 은 LOCAL_INDEX_DIR 의 memmap vector index (retriever.local_index) 를 검색한다
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "es").lower()
+
+
+class ComponentRegistry:
+    """
+    key 별로 한 번만 생성되는 객체를 process 전체에서 공유하는 thread-safe registry.
+    """
+    def __init__(self) -> None:
+        self._items: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, factory: Callable[[], T]) -> T:
+        item = self._items.get(key)
+        if item is not None:
+            return item
+
+        with self._lock:
+            # lock 을 기다리는 동안 다른 thread 가 이미 만들었을 수 있다
+            item = self._items.get(key)
+            if item is None:
+                item = factory()
+                self._items[key] = item
+
+        return item
+
+    def items(self) -> Iterable[tuple[str, Any]]:
+        return list(self._items.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+graph_registry = ComponentRegistry()
+worker_registry = ComponentRegistry()
+reranker_registry = ComponentRegistry()
+router_registry = ComponentRegistry()
+
+
+def get_document_retriever():
+    """compile 된 DocumentRetriever sub-graph 를 반환한다. 최초 호출 시에만 compile 한다."""
+    from langgraph_scripts.agents.document_retriever import DocumentRetriever
+
+    return graph_registry.get("document_retriever", DocumentRetriever)
+
+
+def get_worker(intent: str) -> Worker:
+    """intent 별 Worker. 분류 LLM 의 label 도 그대로 받아서 ``resolve_intent`` 로 정규화한다."""
+    intent = resolve_intent(intent)
+    return worker_registry.get(intent, lambda: Worker(intent=intent, es_client=_search_client(), result_cache=get_result_cache()))
+
+
+def _search_client():
+    if RETRIEVER_BACKEND == "local":
+        from retriever.local_index import get_local_index_client
+        return get_local_index_client()
+    # None 이면 Worker 가 process 공유 AsyncElasticsearch 를 쓴다
+    return None
+
+
+def get_reranker() -> Optional[Reranker]:
+    if not RERANKER_MODEL:
+        return None
+
+    return reranker_registry.get(RERANKER_MODEL, lambda: Reranker(
+        build_scoring_model(RERANKER_MODEL),
+        batch_size=RERANKER_BATCH_SIZE,
+        max_workers=RERANKER_WORKERS
+    ))
+
+
+def get_router() -> Optional[QueryRouter]:
+    if not ROUTER_ENABLED:
+        return None
+
+    return router_registry.get("router", QueryRouter.from_env)
+
+
+def preload(intents: Iterable[str] = RETRIEVER_INTENTS) -> None:
+    """
+    fork 전에 부모 process 에서 부르는 동기 preload. graph compile, worker 생성, local index open 처럼
+    event loop 나 connection 없이 만들 수 있는 read-only 객체만 만들어서 worker 들이 copy-on-write 로 공유하게 한다.
+    """
+    from models.llm import get_tool_llm
+
+    get_tool_llm()
+    get_document_retriever()
+    for intent in intents:
+        worker = get_worker(intent)
+        if RETRIEVER_BACKEND == "local":
+            try:
+                worker.es_client.get_index(worker.index_name)
+            except FileNotFoundError:
+                logger.warning(f"[registry] Local index '{worker.index_name}' does not exist yet")
+
+    reranker = get_reranker()
+    if reranker is not None:
+        reranker.model.load()
+
+    logger.info(f"[registry] Preloaded graphs and retriever workers: {', '.join(intents)}")
+
+
+async def warmup(intents: Iterable[str] = RETRIEVER_INTENTS) -> None:
+    """
+    app 시작 시 LLM client, graph compile 과 retriever client 생성을 미리 끝내서, 요청마다 query 비용만 남도록 한다.
+    LLM 설정 (API key) 이 잘못되어 있으면 여기서 실패해서 app 이 뜨지 않는다.
+    """
+    from models.llm import get_tool_llm
+
+    get_tool_llm()
+    get_document_retriever()
+    for intent in intents:
+        await get_worker(intent).warmup()
+
+    reranker = get_reranker()
+    if reranker is not None:
+        await reranker.warmup()
+
+    router = get_router()
+    if router is not None:
+        await router.warmup()
+
+    logger.info(f"[registry] Warmed up graphs and retriever workers: {', '.join(intents)}")
@@ -0,0 +1,248 @@
+"""
+orchestrator LLM 호출 전에 질의를 싸게 분류하는 pre-router.
+
+1. keyword: 한 label 의 keyword 만 나오고, 질문어를 뺀 단어 중 keyword 의 비율이 ``threshold`` 이상이면 그 label 로 보낸다.
+   keyword 는 단어 전체 또는 조사 / 어미를 뗀 단어와 같아야 한다 ("연차는" 은 "연차" 와 같고 "수도권" 은 "수도" 와 다르다).
+   generate_answer 로 바로 보내는 인사말 label 은 질의 전체가 인사말일 때만 쓴다.
+2. embedding: label 별 예시 질의의 centroid 중 가장 가까운 것이 ``threshold`` 이상이고,
+   두 번째와의 차이가 ``margin`` 이상이면 그 label 로 보낸다. 검색 tool 로 보내는 label 만 쓴다.
+   embedding 으로는 질의 전체가 인사말인지 알 수 없으므로, 가장 가까운 label 이 인사말이면 orchestrator 가 결정한다.
+3. 둘 다 확신이 없으면 orchestrator (LLM) 가 결정한다.
+
+검색 tool 로 보낸 요청은 검색 후 바로 generate_answer 로 가므로 orchestrator 호출이 두 번 줄어든다.
+"""
+import os
+import asyncio
+import logging
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from langchain_core.embeddings import Embeddings
+
+from retriever.text import tokenize
+from telemetry import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+ROUTER_EXAMPLES_PATH = Path(__file__).resolve().parent / "router_examples.yaml"
+ORCHESTRATOR_ROUTE = "orchestrator"
+
+# 단어 끝에서 떼어 보는 조사 / 어미. 긴 것부터 비교한다
+_PARTICLES = tuple(sorted((
+    "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "께", "한테", "도", "만", "로", "으로",
+    "와", "과", "랑", "이랑", "까지", "부터", "보다", "처럼", "요", "이요", "인가요", "인가", "이야", "야",
+    "예요", "이에요", "입니다", "이다",
+), key=len, reverse=True))
+
+# keyword 비율을 계산할 때 빼는 질문어, 지시어
+_FILLER_WORDS = frozenset((
+    "어떻게", "어떤", "어때", "무엇", "뭐", "뭔가", "뭐예", "언제", "어디", "누구", "왜", "얼마", "며칠", "몇",
+    "알려줘", "알려주세요", "알려", "궁금해", "궁금해요", "궁금합니다", "하나요", "되나요", "있나요", "주세요",
+    "좀", "이", "그", "저", "제", "내", "what", "how", "is", "the", "a", "s",
+))
+
+ROUTER_DECISIONS = registry.register(Counter(
+    "omni_router_decisions_total",
+    "Pre-router decisions by route and method (keyword, embedding, fallback).",
+    ["route", "method"]
+))
+ROUTER_LATENCY_SAVED = registry.register(Counter(
+    "omni_router_latency_saved_seconds_total",
+    "Estimated orchestrator LLM time skipped by fast routing."
+))
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    label: Optional[str]
+    confidence: float
+    method: str
+
+    @property
+    def is_fast(self) -> bool:
+        return self.route != ORCHESTRATOR_ROUTE
+
+
+@dataclass(frozen=True)
+class _Label:
+    name: str
+    route: str
+    keywords: FrozenSet[str]
+    examples: Tuple[str, ...]
+
+
+def _strip_particle(term: str) -> str:
+    for particle in _PARTICLES:
+        if len(term) > len(particle) and term.endswith(particle):
+            return term[:-len(particle)]
+    return term
+
+
+class QueryRouter:
+    def __init__(
+        self,
+        labels: List[_Label],
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = 0.6,
+        margin: float = 0.08,
+    ) -> None:
+        self.labels = labels
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.margin = margin
+
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_lock = asyncio.Lock()
+
+        self.total = 0
+        self.fast = 0
+        # orchestrator LLM 호출 한 번의 latency (EWMA). 줄인 시간을 추정하는 데 쓴다
+        self.orchestrator_latency: Optional[float] = None
+        self.latency_saved = 0.0
+
+    @classmethod
+    def from_yaml(cls, path: Path = ROUTER_EXAMPLES_PATH, embeddings: Optional[Embeddings] = None, **kwargs) -> "QueryRouter":
+        with open(path, "r", encoding="utf-8") as f:
+            raw = yaml.safe_load(f)
+
+        labels = [
+            _Label(
+                name=name,
+                route=spec["route"],
+                keywords=frozenset(keyword.lower() for keyword in spec.get("keywords", [])),
+                examples=tuple(spec.get("examples", [])),
+            )
+            for name, spec in raw.items()
+        ]
+        return cls(labels, embeddings=embeddings, **kwargs)
+
+    @classmethod
+    def from_env(cls) -> "QueryRouter":
+        embeddings = None
+        if os.getenv("ROUTER_USE_EMBEDDINGS", "true").lower() in ("1", "true", "yes"):
+            from models.embedding import emb
+            embeddings = emb
+
+        return cls.from_yaml(
+            embeddings=embeddings,
+            threshold=float(os.getenv("ROUTER_THRESHOLD", "0.6")),
+            margin=float(os.getenv("ROUTER_MARGIN", "0.08")),
+        )
+
+    async def warmup(self) -> None:
+        await self._ensure_centroids()
+
+    async def route(self, query: str) -> RouteDecision:
+        decision = self._route_by_keywords(query)
+        if decision is None:
+            decision = await self._route_by_embedding(query)
+        if decision is None:
+            decision = RouteDecision(ORCHESTRATOR_ROUTE, None, 0.0, "fallback")
+
+        self._record(decision)
+        return decision
+
+    def record_orchestrator_latency(self, seconds: float) -> None:
+        if self.orchestrator_latency is None:
+            self.orchestrator_latency = seconds
+        else:
+            self.orchestrator_latency += 0.1 * (seconds - self.orchestrator_latency)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.total,
+            "fast_routed": self.fast,
+            "fast_ratio": self.fast / self.total if self.total else 0.0,
+            "orchestrator_latency_ewma": self.orchestrator_latency or 0.0,
+            "latency_saved_seconds": self.latency_saved,
+        }
+
+    def _route_by_keywords(self, query: str) -> Optional[RouteDecision]:
+        terms = [(term, _strip_particle(term)) for term in tokenize(query)]
+        terms = [(term, stem) for term, stem in terms if term not in _FILLER_WORDS and stem not in _FILLER_WORDS]
+        if not terms:
+            return None
+
+        hits = {
+            label.name: sum(1 for term, stem in terms if term in label.keywords or stem in label.keywords)
+            for label in self.labels
+        }
+        matched = [label for label in self.labels if hits[label.name]]
+        if len(matched) != 1:
+            return None
+
+        label = matched[0]
+        confidence = hits[label.name] / len(terms)
+        # 인사말에 다른 내용이 붙은 질의 ("안녕, 광합성이 뭐야?") 는 검색 없이 답하면 안 된다
+        if confidence < self.threshold or (label.route == "generate_answer" and confidence < 1.0):
+            return None
+        return RouteDecision(label.route, label.name, confidence, "keyword")
+
+    async def _route_by_embedding(self, query: str) -> Optional[RouteDecision]:
+        centroids = await self._ensure_centroids()
+        if centroids is None:
+            return None
+
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"[router] Embedding failed, falling back to orchestrator: {str(e)}")
+            return None
+
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        similarities = centroids @ (vector / norm)
+
+        order = np.argsort(similarities)[::-1]
+        best = float(similarities[order[0]])
+        second = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        if best < self.threshold or best - second < self.margin:
+            return None
+
+        label = self.labels[order[0]]
+        # "안녕, 연차는 며칠이야?" 처럼 인사말에 질문이 붙어도 인사말 centroid 에 가까울 수 있다
+        if label.route == "generate_answer":
+            return None
+        return RouteDecision(label.route, label.name, best, "embedding")
+
+    async def _ensure_centroids(self) -> Optional[np.ndarray]:
+        if self.embeddings is None or self._centroids is not None:
+            return self._centroids
+
+        async with self._centroid_lock:
+            if self._centroids is not None:
+                return self._centroids
+            try:
+                centroids = []
+                for label in self.labels:
+                    vectors = np.asarray(await self.embeddings.aembed_documents(list(label.examples)), dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    centroids.append(centroid / np.linalg.norm(centroid))
+                self._centroids = np.stack(centroids)
+            except Exception as e:
+                # embedding model 이 없으면 keyword 만 사용한다
+                logger.warning(f"[router] Could not build centroids, using keywords only: {str(e)}")
+                self.embeddings = None
+
+        return self._centroids
+
+    def _record(self, decision: RouteDecision) -> None:
+        self.total += 1
+        ROUTER_DECISIONS.inc(route=decision.route, method=decision.method)
+        if not decision.is_fast:
+            return
+
+        self.fast += 1
+        # 검색 후 다시 orchestrator 를 부르는 것까지 생략되므로 검색 route 는 두 번을 줄인다
+        skipped_calls = 1 if decision.route == "generate_answer" else 2
+        saved = skipped_calls * (self.orchestrator_latency or 0.0)
+        self.latency_saved += saved
+        ROUTER_LATENCY_SAVED.inc(saved)
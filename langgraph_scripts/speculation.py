@@ -0,0 +1,121 @@
+"""
+orchestrator LLM 호출과 동시에 원래 질의로 검색을 미리 시작해 두는 speculative retrieval.
+
+orchestrator 가 비슷한 질의로 같은 검색 tool 을 고르면 execute_tools 는 미리 받아둔 결과를 쓴다.
+그렇지 않으면 첫 execute_tools 나 graph 종료 시점에 남은 검색을 cancel 한다.
+hit/miss 수와 버려진 검색에 쓴 시간은 /metrics 에 기록한다.
+"""
+import time
+import asyncio
+import logging
+
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+from retriever.text import tokenize
+from telemetry import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_OUTCOMES = registry.register(Counter(
+    "omni_speculative_retrieval_total",
+    "Speculative retrievals by outcome (hit, miss, unused).",
+    ["intent", "outcome"]
+))
+SPECULATION_WASTED = registry.register(Counter(
+    "omni_speculative_retrieval_wasted_seconds_total",
+    "Time spent on speculative retrievals whose results were not used.",
+    ["intent"]
+))
+
+
+def query_similarity(a: str, b: str) -> float:
+    terms_a, terms_b = set(tokenize(a)), set(tokenize(b))
+    if not terms_a or not terms_b:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+class _Prefetch:
+    __slots__ = ("intent", "task", "start", "end", "claimed")
+
+    def __init__(self, intent: str, task: asyncio.Task) -> None:
+        self.intent = intent
+        self.task = task
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.claimed = False
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self.end = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class SpeculativeRetrieval:
+    """
+    한 번의 graph 실행 동안 쓰는 prefetch 묶음. ``config["configurable"]["speculation"]`` 으로 node 에 전달한다.
+    """
+    def __init__(
+        self,
+        query: str,
+        intents: Iterable[str],
+        topk: int = 10,
+        alpha: float = 0.75,
+        min_similarity: float = 0.5,
+        alpha_tolerance: float = 0.15,
+    ) -> None:
+        self.query = query
+        self.intents = list(intents)
+        self.topk = topk
+        self.alpha = alpha
+        self.min_similarity = min_similarity
+        self.alpha_tolerance = alpha_tolerance
+        self._prefetches: Dict[str, _Prefetch] = {}
+
+    def start(self) -> None:
+        from langgraph_scripts.tools import retrieve_and_rerank
+
+        for intent in self.intents:
+            task = asyncio.create_task(retrieve_and_rerank(intent, self.query, self.topk, self.alpha))
+            self._prefetches[intent.upper()] = _Prefetch(intent, task)
+
+    async def claim(self, intent: str, query: str, topk: int, alpha: float) -> Optional[List[Document]]:
+        """요청된 검색이 prefetch 와 충분히 비슷하면 그 결과를 반환한다. 아니면 None."""
+        prefetch = self._prefetches.get(intent.upper())
+        if prefetch is None or prefetch.claimed:
+            return None
+
+        usable = (
+            topk <= self.topk
+            and abs(alpha - self.alpha) <= self.alpha_tolerance
+            and query_similarity(query, self.query) >= self.min_similarity
+        )
+        if not usable:
+            self._discard(prefetch, "miss")
+            return None
+
+        prefetch.claimed = True
+        try:
+            documents = await prefetch.task
+        except Exception as e:
+            logger.warning(f"[speculation] Prefetch for {intent} failed, running the tool instead: {str(e)}")
+            SPECULATION_OUTCOMES.inc(intent=prefetch.intent, outcome="miss")
+            return None
+
+        SPECULATION_OUTCOMES.inc(intent=prefetch.intent, outcome="hit")
+        return documents[:topk]
+
+    def cancel_unclaimed(self) -> None:
+        for prefetch in self._prefetches.values():
+            if not prefetch.claimed:
+                self._discard(prefetch, "unused")
+
+    def _discard(self, prefetch: _Prefetch, outcome: str) -> None:
+        prefetch.claimed = True
+        prefetch.task.cancel()
+        SPECULATION_OUTCOMES.inc(intent=prefetch.intent, outcome=outcome)
+        SPECULATION_WASTED.inc(prefetch.elapsed(), intent=prefetch.intent)
@@ -1,23 +1,41 @@
+import os
+
 from typing import List
 
-from langgraph_scripts.agents.document_retriever import DocumentRetriever
-from retriever.workers import Worker
+from langgraph_scripts.registry import get_document_retriever, get_reranker, get_worker
 
 from langgraph_scripts.graph_state import DocRetrieverArgs
 
-from langchain.tools import tool
+from langchain_core.tools import tool
 
 from langchain_core.documents import Document
-from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatMessagePromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import PydanticOutputParser
+
+# rerank 를 할 때는 topk * factor 개를 검색한 뒤 topk 개로 줄인다
+RERANK_OVERFETCH_FACTOR = int(os.getenv("RERANK_OVERFETCH_FACTOR", "3"))
+
+# 검색 tool 이름 -> Worker intent
+RETRIEVER_TOOL_INTENTS = {
+    "hr_doc_retriever": "HR",
+    "wiki_doc_retriever": "wiki"
+}
+
+
+async def retrieve_and_rerank(intent: str, query: str, topk: int, alpha: float) -> List[Document]:
+    retriever = get_worker(intent)
+    reranker = get_reranker()
+    if reranker is None:
+        return await retriever(query, topk, alpha)
+
+    candidates = await retriever(query, topk * RERANK_OVERFETCH_FACTOR, alpha)
+    return await reranker.rerank(query, candidates, topk)
+
 
 @tool(args_schema=DocRetrieverArgs)
 async def call_retriever(query: str, topk: int = 10, alpha: float = 0.75):
     """
     If domain-specific knowledge is needed, retrieve relavant documents from database.
     """
-    retriever = DocumentRetriever()
+    retriever = get_document_retriever()
     return await retriever.run_graph(query=query, topk=topk, alpha=alpha)
 
 
@@ -26,14 +44,7 @@ async def hr_doc_retriever(query: str, topk: int = 10, alpha: float = 0.75):
     """
     사내 인사/복지 제도에 관한 질의를 가지고 사내 HR 문서를 검색
     """
-
-    # retriever = HRSearchWorker("HR")
-    retriever = Worker(intent="HR")
-    retrieved_docs = await retriever(query, topk, alpha)
-    return retrieved_docs
-    reranked_docs = await rrkr.rerank(query, retrieved_docs)
-
-    return reranked_docs
+    return await retrieve_and_rerank("HR", query, topk, alpha)
 
 
 @tool(args_schema=DocRetrieverArgs)
@@ -41,9 +52,7 @@ async def wiki_doc_retriever(query: str, topk: int = 10, alpha: float = 0.75):
     """
     일반 상식에 관한 질의를 가지고 Wikipedia 문서를 검색
     """
-    retriever = Worker(intent="wiki")
-    retrieved_docs = await retriever(query, topk, alpha)
-    return retrieved_docs
+    return await retrieve_and_rerank("wiki", query, topk, alpha)
     
 
 @tool
@@ -1,31 +1,84 @@
+import os
+import time
+import asyncio
 import logging
-import uvicorn
 
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from typing import Optional
 
 from pydantic import BaseModel
 from stream_generator import StreamingService
+from prompt_registry import prompt_registry
+from langgraph_scripts.registry import get_router, preload as preload_registry, warmup
+from admission import model_gate_stats, request_priority, share_limits
+from models.http_pool import close_http_pools
+from telemetry import monitor_event_loop_lag, publish_snapshots, read_snapshot, registry as metrics_registry, set_const_labels
+from serve import current_worker, metrics_path, pool_status, serve
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 요청 처리 중에 disk 를 읽지 않도록 prompt 를 미리 읽고 검증해 둔다.
+    # serve() 의 부모 process 에서 이미 읽었으면 fork 로 공유한 것을 그대로 쓴다
+    if not prompt_registry.is_loaded():
+        prompt_registry.load_all()
+    await warmup()
+    background = [asyncio.create_task(monitor_event_loop_lag())]
+
+    # 여러 worker 로 띄웠으면 admission 한도를 나눠 쓰고, /metrics 를 합칠 수 있도록 snapshot 을 내보낸다
+    worker = current_worker()
+    snapshot_path = metrics_path(worker.worker_id)
+    share_limits(worker.workers)
+    if snapshot_path is not None:
+        set_const_labels(worker=worker.worker_id)
+        background.append(asyncio.create_task(publish_snapshots(snapshot_path)))
 
-from langchain.globals import set_debug
+    yield
+    for task in background:
+        task.cancel()
+    await close_http_pools()
+    service.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 service_name = "Omni-Agent"
 
+# 전역 DEBUG logging 은 요청마다 큰 비용이 든다. 필요한 요청만 SearchRequest.debug 로 tracing 한다
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 
-set_debug(True)
-logging.getLogger("langchain").setLevel(logging.DEBUG)
-logging.getLogger("elasticsearch").setLevel(logging.DEBUG)
-logging.getLogger("langchain_community.vectorstores.elasticsearch").setLevel(logging.DEBUG)
-
 service = StreamingService()
 
+
+def preload() -> None:
+    """fork 전에 부모 process 에서 prompt, graph, read-only index 를 읽어 둔다."""
+    prompt_registry.load_all()
+    preload_registry()
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    client 연결이 끊겨 전송이 중단되어도 body generator 를 즉시 닫아, graph 실행과 upstream LLM 호출을 cancel 한다.
+    """
+    async def stream_response(self, send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            await self.body_iterator.aclose()
+
+
 class SearchRequest(BaseModel):
     query: str
+    # 이 요청의 graph 실행만 LangChain callback 과 span 단위로 log 를 남긴다
+    debug: bool = False
+    # 같은 session_id 의 요청은 이전 turn 의 대화와 검색 결과를 이어서 쓴다
+    session_id: Optional[str] = None
 
 # main window
 @app.get("/")
@@ -34,24 +87,112 @@ async def root():
 
 
 @app.post("/search/")
-async def search(request: SearchRequest):
+async def search(request: SearchRequest, x_api_key: Optional[str] = Header(None)):
     """
     사용자가 보낸 메시지를 LLM에 전송하고, 그 응답을 대화 이력에 추가하고, 응답을 return
     """
     global service
-    generator = service.stream_service(request.query)
+    rejected = service.check_admission(request.query, session_id=request.session_id)
+    if rejected is not None:
+        # queue 가 가득 찼으면 기다리게 하지 않고 바로 거절한다
+        return JSONResponse(
+            {"detail": str(rejected), "retry_after": rejected.retry_after},
+            status_code=503,
+            headers={"Retry-After": str(max(1, round(rejected.retry_after)))}
+        )
+
+    # admission queue 의 priority 는 body 가 아니라 server 에 등록된 API key 로 정한다 (ADMISSION_PRIORITY_KEYS)
+    priority = request_priority(x_api_key)
+    generator = service.stream_service(request.query, priority=priority, debug=request.debug, session_id=request.session_id)
 
     response_headers = {
         "Cache-Control": "no-cache",
         "Connection": "keep-alive",
+        # nginx 같은 reverse proxy 가 응답을 모아서 보내지 않게 한다 (coalescing 은 sse.SSEWriter 가 한다)
+        "X-Accel-Buffering": "no",
         "Access-Control-Allow-Origin": "*"
     }
-    return StreamingResponse(
-        generator, 
+    return ClosingStreamingResponse(
+        generator,
         media_type="text/event-stream",
         headers=response_headers    
     )
 
 
+@app.get("/health")
+async def health():
+    """
+    이 요청을 처리한 worker 의 상태. 여러 worker 로 띄웠으면 ``workers`` 에 supervisor 가 본 전체 worker 의
+    pid, 재시작 횟수, 마지막 exit code 가 들어간다.
+    """
+    worker = current_worker()
+    status = {
+        "status": "ok",
+        "worker_id": worker.worker_id,
+        "pid": os.getpid(),
+        "uptime": time.time() - worker.started_at,
+        "admission": service.admission.stats(),
+    }
+    workers = pool_status()
+    if workers is not None:
+        status["workers"] = workers
+    return status
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    이 요청을 처리한 worker 의 admission queue 깊이, 대기 시간, 현재 동시 실행 한도.
+    여러 worker 로 띄웠으면 한도는 worker 별 몫이고, 전체 worker 의 값은 /metrics 의 ``worker`` label 로 본다.
+    """
+    return {
+        "worker_id": current_worker().worker_id,
+        "search": service.admission.stats(),
+        "models": model_gate_stats()
+    }
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """
+    이 요청을 처리한 worker 에서 pre-router 가 orchestrator 를 건너뛴 요청 비율과 그로 인해 줄어든 시간 (추정).
+    전체 worker 의 route 별 요청 수는 /metrics 의 omni_router_decisions_total 로 본다.
+    """
+    router = get_router()
+    stats = router.stats() if router is not None else {"enabled": False}
+    return {"worker_id": current_worker().worker_id, **stats}
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    """저장된 session 수와 크기, eviction 상한"""
+    if service.session_store is None:
+        return {"enabled": False}
+    return await asyncio.to_thread(service.session_store.stats)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text format 의 node/tool/LLM/ES latency histogram 과 token counter.
+    여러 worker 로 띄웠으면 실행 중인 다른 worker 가 마지막으로 쓴 snapshot 까지 ``worker`` label 로 합친다.
+    """
+    snapshots = await asyncio.to_thread(_other_worker_snapshots)
+    return PlainTextResponse(metrics_registry.render(snapshots), media_type="text/plain; version=0.0.4")
+
+
+def _other_worker_snapshots() -> list:
+    worker_id = current_worker().worker_id
+    snapshots = []
+    for status in pool_status() or ():
+        if status["worker_id"] == worker_id or status["state"] != "running":
+            continue
+        snapshot = read_snapshot(metrics_path(status["worker_id"]))
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return snapshots
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8888)
\ No newline at end of file
+    # WORKERS 개의 process 로 띄운다 (serve.py 참고)
+    serve(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8888")), preload=preload)
@@ -1,5 +1,24 @@
+import os
+
+from pathlib import Path
+
 from langchain_ollama import OllamaEmbeddings
 
-emb = OllamaEmbeddings(
-    model="embeddinggemma"
-)
\ No newline at end of file
+from models.embedding_cache import CachedEmbeddings, SQLiteEmbeddingStore
+
+EMBEDDING_MODEL = "embeddinggemma"
+EMBEDDING_CACHE_PATH = Path(
+    os.getenv("EMBEDDING_CACHE_PATH", Path(__file__).resolve().parents[1] / ".cache" / "embeddings.sqlite3")
+)
+
+base_emb = OllamaEmbeddings(
+    model=EMBEDDING_MODEL
+)
+
+# 검색 (query) 과 적재 (documents) 가 같은 cache 파일을 쓴다. key 에 query/document 구분이 들어가서 섞이지 않는다
+emb = CachedEmbeddings(
+    base_emb,
+    model_name=EMBEDDING_MODEL,
+    store=SQLiteEmbeddingStore(EMBEDDING_CACHE_PATH),
+    max_memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000")),
+)
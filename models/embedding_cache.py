@@ -0,0 +1,233 @@
+"""
+Embedding cache.
+
+(model 이름, query/document 구분, text hash) 를 key 로 in-process LRU 와 SQLite disk cache 두 단계에 vector 를 저장한다.
+vector 는 float32 bytes 로 저장해서 disk 사용량과 (de)serialize 비용을 줄인다.
+"""
+import os
+import time
+import array
+import asyncio
+import hashlib
+import sqlite3
+import logging
+import threading
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+# query 와 document 에 다른 prompt 를 붙이는 model 이 있어서 (embeddinggemma 등) 같은 text 라도 vector 가 다르다
+EmbeddingKind = Literal["query", "document"]
+
+
+def text_key(model_name: str, text: str, kind: EmbeddingKind = "document") -> str:
+    return hashlib.blake2b(f"{model_name}\0{kind}\0{text}".encode("utf-8"), digest_size=20).hexdigest()
+
+
+def _to_bytes(vector: Sequence[float]) -> bytes:
+    return array.array("f", vector).tobytes()
+
+
+def _round_float32(vector: Sequence[float]) -> List[float]:
+    return array.array("f", vector).tolist()
+
+
+def _from_bytes(blob: bytes) -> List[float]:
+    vector = array.array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+
+class SQLiteEmbeddingStore:
+    """
+    여러 thread 에서 접근할 수 있도록 하나의 connection 을 lock 으로 보호한다.
+    connection 은 처음 쓸 때 열고, fork 된 process 에서는 부모의 connection 대신 새로 연다.
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+        self._conn, self._pid = conn, os.getpid()
+        return conn
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        # SQLite 의 bind parameter 개수 제한을 넘지 않도록 나눠서 조회한다
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update({key: _from_bytes(blob) for key, blob in rows})
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, _to_bytes(vector), now) for key, vector in items.items()],
+            )
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    ``Embeddings`` 를 감싸서 이미 계산한 vector 는 다시 계산하지 않는다.
+
+    ``embed_documents`` 는 memory -> disk 순서로 한 번에 조회한 뒤, 없는 text 만 모아서 원래 model 에 batch 로 보낸다.
+    query 는 원래 model 의 ``embed_query`` 로 계산하고 document 와 다른 key 에 저장한다.
+    """
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        store: Optional[SQLiteEmbeddingStore] = None,
+        max_memory_items: int = 10000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.max_memory_items = max_memory_items
+        self.stats = CacheStats()
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(self.model_name, text) for text in texts]
+        found = self._lookup(keys)
+
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self._store(dict(zip(missing.keys(), vectors)), found)
+
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(self.model_name, text) for text in texts]
+        found = await asyncio.to_thread(self._lookup, keys)
+
+        missing = self._missing(texts, keys, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            await asyncio.to_thread(self._store, dict(zip(missing.keys(), vectors)), found)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_key(self.model_name, text, "query")
+        found = self._lookup([key])
+        if key not in found:
+            self.stats.misses += 1
+            self._store({key: self.embeddings.embed_query(text)}, found)
+        return found[key]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = text_key(self.model_name, text, "query")
+        # 자주 묻는 질의는 memory 에서 바로 반환해서 thread 전환 비용도 없앤다
+        vector = self._get_memory(key)
+        if vector is not None:
+            self.stats.memory_hits += 1
+            return vector
+
+        found = await asyncio.to_thread(self._lookup, [key])
+        if key not in found:
+            self.stats.misses += 1
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._store, {key: vector}, found)
+        return found[key]
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            vector = self._get_memory(key)
+            if vector is not None:
+                found[key] = vector
+        self.stats.memory_hits += len(found)
+
+        remaining = [key for key in dict.fromkeys(keys) if key not in found]
+        if remaining and self.store is not None:
+            from_disk = self.store.get_many(remaining)
+            self.stats.disk_hits += len(from_disk)
+            for key, vector in from_disk.items():
+                self._put_memory(key, vector)
+            found.update(from_disk)
+
+        return found
+
+    def _missing(self, texts: List[str], keys: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        # 같은 batch 안의 중복 text 는 한 번만 계산한다
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.stats.misses += len(missing)
+        return missing
+
+    def _store(self, computed: Dict[str, List[float]], found: Dict[str, List[float]]) -> None:
+        # disk 에서 읽은 vector 와 같은 값이 되도록 memory 에 넣기 전에 float32 로 맞춘다
+        computed = {key: _round_float32(vector) for key, vector in computed.items()}
+        for key, vector in computed.items():
+            self._put_memory(key, vector)
+        found.update(computed)
+        if self.store is not None:
+            self.store.put_many(computed)
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _put_memory(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
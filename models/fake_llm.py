@@ -0,0 +1,151 @@
+"""
+network 없이 graph 를 실행하기 위한 결정적 (deterministic) fake chat model.
+
+``LLM_BACKEND=fake`` 이면 ``models.llm`` 이 ChatOpenAI 대신 이 model 을 사용한다.
+같은 prompt 에는 항상 같은 답변을 만들고, 첫 token 까지의 지연과 초당 token 수를 조절할 수 있다.
+
+tool 이 bind 된 경우 (orchestrator) 대화 이력에 tool 결과가 ``tool_rounds`` 개 모일 때까지 검색 tool 을 호출하고,
+그 다음에는 ``generate_answer`` 를 호출한다.
+
+Environment variables:
+    FAKE_LLM_LATENCY            -> 첫 token 까지의 지연 초 (default 0.2)
+    FAKE_LLM_TOKENS_PER_SECOND  -> streaming 속도 (default 50)
+    FAKE_LLM_ANSWER_TOKENS      -> 답변 단어 수 (default 40)
+    FAKE_LLM_TOOL_ROUNDS        -> generate_answer 전에 호출할 검색 tool 횟수 (default 1)
+    FAKE_LLM_TOOL               -> 호출할 검색 tool 이름 (default hr_doc_retriever)
+"""
+import os
+import random
+import asyncio
+import hashlib
+
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from utils import estimate_tokens
+
+_WORDS = (
+    "연차 휴가 신청 규정 복지 제도 사내 문서 검색 결과 기준 경우 직원 회사 확인 필요 가능 "
+    "policy employee leave benefit document search result answer request approval"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    first_token_latency: float = 0.2
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 40
+    tool_rounds: int = 1
+    tool_name: str = "hr_doc_retriever"
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        return cls(
+            first_token_latency=float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+            answer_tokens=int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "40")),
+            tool_rounds=int(os.getenv("FAKE_LLM_TOOL_ROUNDS", "1")),
+            tool_name=os.getenv("FAKE_LLM_TOOL", "hr_doc_retriever"),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any):
+        return self.bind(tool_names=[getattr(tool, "name", str(tool)) for tool in tools])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, kwargs.get("tool_names")))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tool_names"))
+        await asyncio.sleep(self.first_token_latency + self._generation_time(message.content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._respond(messages, kwargs.get("tool_names"))
+        for piece in self._pieces(message.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._respond(messages, kwargs.get("tool_names"))
+        await asyncio.sleep(self.first_token_latency)
+        for piece in self._pieces(message.content):
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(piece)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            await asyncio.sleep(1 / self.tokens_per_second)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    def _respond(self, messages: List[BaseMessage], tool_names: Optional[List[str]]) -> AIMessage:
+        prompt = "\n".join(str(message.content) for message in messages)
+        prompt_tokens = estimate_tokens(prompt)
+
+        if tool_names:
+            content = ""
+            tool_calls = [self._next_tool_call(prompt, tool_names)]
+        else:
+            seed = int.from_bytes(hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest(), "big")
+            rng = random.Random(seed)
+            content = " ".join(rng.choice(_WORDS) for _ in range(self.answer_tokens))
+            tool_calls = []
+
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": self.answer_tokens if content else 1,
+                "total_tokens": prompt_tokens + (self.answer_tokens if content else 1),
+            },
+        )
+
+    def _next_tool_call(self, prompt: str, tool_names: List[str]) -> dict:
+        call_id = hashlib.blake2b(prompt.encode("utf-8"), digest_size=6).hexdigest()
+        if prompt.count("- Tool use:") >= self.tool_rounds or self.tool_name not in tool_names:
+            return {"name": "generate_answer", "args": {}, "id": f"call-{call_id}"}
+
+        user_lines = [line for line in prompt.splitlines() if line.startswith("- User: ")]
+        query = user_lines[-1][len("- User: "):] if user_lines else prompt[-200:]
+        return {
+            "name": self.tool_name,
+            "args": {"query": query, "topk": 10, "alpha": 0.75},
+            "id": f"call-{call_id}",
+        }
+
+    def _generation_time(self, content: str) -> float:
+        return len(content.split()) / self.tokens_per_second
+
+    @staticmethod
+    def _pieces(content: str) -> List[str]:
+        words = content.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)] if content else []
@@ -0,0 +1,161 @@
+"""
+OpenAI 호환 LLM gateway 를 호출하는 async client.
+
+공유 connection pool (``models.http_pool``) 위에서 동시 요청 수를 semaphore 로 제한하고,
+429/5xx 와 연결 오류는 jitter 를 섞은 exponential backoff 로 재시도한다.
+
+Environment variables:
+    LLM_GATEWAY_URL            -> gateway endpoint (``/v1/chat/completions`` 앞부분, 필수)
+    LLM_GATEWAY_TOKEN          -> Bearer token (필수)
+    LLM_GATEWAY_MODEL          -> model 이름
+    LLM_GATEWAY_CONCURRENCY    -> 동시 요청 수 (default 8)
+    LLM_GATEWAY_MAX_RETRIES    -> 재시도 횟수 (default 3)
+    LLM_GATEWAY_TIMEOUT        -> 요청 하나의 timeout 초 (default 120)
+"""
+import os
+import json
+import random
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from models.http_pool import get_http_client
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+RETRYABLE_ERRORS = (httpx.TransportError,)
+
+
+class GatewayError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMGatewayClient:
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        model: str,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        timeout: float = 120.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.url = f"{base_url.rstrip('/')}/v1/chat/completions"
+        self.model = model
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+        self._http_client = http_client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "LLMGatewayClient":
+        base_url = os.getenv("LLM_GATEWAY_URL")
+        token = os.getenv("LLM_GATEWAY_TOKEN")
+        missing = [name for name, value in (("LLM_GATEWAY_URL", base_url), ("LLM_GATEWAY_TOKEN", token)) if not value]
+        if missing:
+            raise ValueError(f"{' and '.join(missing)} must be set to call the LLM gateway")
+
+        return cls(
+            base_url=base_url,
+            token=token,
+            model=os.getenv("LLM_GATEWAY_MODEL", "google/gemini-2.5-pro-preview"),
+            max_concurrency=int(os.getenv("LLM_GATEWAY_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_GATEWAY_MAX_RETRIES", "3")),
+            timeout=float(os.getenv("LLM_GATEWAY_TIMEOUT", "120")),
+        )
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
+
+    async def chat(self, messages: List[Dict[str, str]], **params: Any) -> Dict[str, Any]:
+        """chat completion 응답 (JSON) 전체를 반환한다."""
+        async with self._request(messages, stream=False, **params) as response:
+            await response.aread()
+            return response.json()
+
+    async def stream_chat(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        """응답 token (delta content) 을 도착하는 대로 yield 한다."""
+        async with self._request(messages, stream=True, **params) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                for choice in json.loads(data).get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+    @asynccontextmanager
+    async def _request(self, messages: List[Dict[str, str]], stream: bool, **params: Any) -> AsyncIterator[httpx.Response]:
+        """
+        응답 header 를 받을 때까지 재시도한다. streaming 은 body 를 받기 시작한 뒤에는 재시도하지 않는다.
+        """
+        payload = {"model": self.model, "messages": messages, "stream": stream, **params}
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                request = self.http_client.build_request(
+                    "POST", self.url, headers=self.headers, json=payload, timeout=self.timeout
+                )
+                try:
+                    response = await self.http_client.send(request, stream=True)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise GatewayError(f"LLM gateway request failed: {e!r}") from e
+                    await self._backoff(attempt, reason=repr(e))
+                    continue
+
+                if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                    await response.aclose()
+                    await self._backoff(attempt, reason=f"HTTP {response.status_code}", retry_after=response.headers.get("Retry-After"))
+                    continue
+
+                try:
+                    if response.is_error:
+                        await response.aread()
+                        raise GatewayError(
+                            f"LLM gateway returned HTTP {response.status_code}: {response.text[:200]}",
+                            status_code=response.status_code,
+                        )
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+
+    async def _backoff(self, attempt: int, reason: str, retry_after: Optional[str] = None) -> None:
+        # full jitter: 동시에 실패한 요청들이 같은 시각에 몰리지 않도록 한다
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        logger.warning(f"[gateway] {reason}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+        await asyncio.sleep(delay)
+
+
+_gateway_client: Optional[LLMGatewayClient] = None
+
+
+def get_gateway_client() -> LLMGatewayClient:
+    global _gateway_client
+    if _gateway_client is None:
+        _gateway_client = LLMGatewayClient.from_env()
+    return _gateway_client
@@ -0,0 +1,66 @@
+"""
+Process 전체에서 공유하는 outbound HTTP connection pool.
+
+LLM (ChatOpenAI, gateway client) 호출은 하나의 httpx.AsyncClient 를 공유해서 keep-alive connection 을 재사용한다.
+``h2`` 가 설치되어 있으면 HTTP/2 로 하나의 connection 에서 여러 요청을 multiplexing 한다.
+Elasticsearch client 도 ``close_http_pools`` 로 함께 정리해서 pool 의 lifecycle 을 한 곳에서 관리한다.
+
+Environment variables:
+    HTTP_MAX_CONNECTIONS     -> 최대 connection 수 (default 100)
+    HTTP_MAX_KEEPALIVE       -> 유지할 idle connection 수 (default 20)
+    HTTP_KEEPALIVE_EXPIRY    -> idle connection 유지 시간 초 (default 30)
+    HTTP_CONNECT_TIMEOUT     -> connect timeout 초 (default 5)
+    HTTP_READ_TIMEOUT        -> read timeout 초 (default 120)
+    HTTP2_ENABLED            -> "false" 이면 h2 가 있어도 HTTP/1.1 만 사용
+"""
+import os
+import logging
+import importlib.util
+
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def http2_available() -> bool:
+    if os.getenv("HTTP2_ENABLED", "true").lower() != "true":
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def build_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("HTTP_READ_TIMEOUT", "120")),
+        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    )
+    http2 = http2_available()
+    logger.info(f"[http_pool] Creating shared HTTP client (http2={http2})")
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """connection pool 을 재사용하도록 httpx.AsyncClient 를 한 번만 만든다."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
+
+
+async def close_http_pools() -> None:
+    """공유 HTTP client 와 Elasticsearch client 의 connection 을 모두 닫는다. app/script 종료 시 호출한다."""
+    from retriever.es_client import close_async_es_client
+
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await close_async_es_client()
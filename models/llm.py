@@ -1,39 +1,63 @@
-from collections.abc import AsyncIterator
 import os
-from uuid import uuid1
 
-from langchain_openai import ChatOpenAI
-from langgraph_scripts.tools import *
-# from langchain.schema.runnable import Runnable
+from typing import TYPE_CHECKING, Optional
+
+from models.http_pool import get_http_client
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.runnables import Runnable
 
 BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
-MODEL_NAME="gemini-2.5-flash"
-API_KEY = os.environ["GEMINI_API_KEY"]
-
-# class FakeLLM(Runnable):
-#     def invoke(self, text: str):
-#         return text
-
-#     def stream(self, text: str):
-#         for chunk in text.split():
-#             yield chunk
-
-#     async def ainvoke(self, text: str):
-#         return text
-
-#     async def astream(self, text: str) -> AsyncIterator:
-#         for chunk in text.split():
-#             yield chunk
-
-    
-base_llm = ChatOpenAI(
-    api_key=API_KEY,
-    base_url=BASE_URL,
-    model=MODEL_NAME,
-    temperature=0,
-    max_completion_tokens=8000,
-    verbose=True,
-    streaming=True
-)
-
-tool_llm = base_llm.bind_tools(tools=tools, tool_choice="required", strict=True)
\ No newline at end of file
+# "fake" 이면 network 없이 models.fake_llm.FakeChatModel 을 사용한다 (benchmark, 부하 테스트용)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+MODEL_NAME = "fake" if LLM_BACKEND == "fake" else "gemini-2.5-flash"
+
+_base_llm: Optional["BaseChatModel"] = None
+_tool_llm: Optional["Runnable"] = None
+
+
+def get_base_llm() -> "BaseChatModel":
+    """
+    chat model 을 처음 쓸 때 한 번만 만든다. langchain_openai import 와 API key 확인은 import 시점이 아니라
+    여기서 일어나므로, model 을 쓰지 않는 script 나 test 는 비용을 내지 않는다. app 은 warmup 에서 미리 부른다.
+    """
+    global _base_llm
+    if _base_llm is None:
+        _base_llm = _build_base_llm()
+    return _base_llm
+
+
+def get_tool_llm() -> "Runnable":
+    """검색 tool 을 bind 한 orchestrator 용 model."""
+    global _tool_llm
+    if _tool_llm is None:
+        from langgraph_scripts.tools import tools
+        _tool_llm = get_base_llm().bind_tools(tools=tools, tool_choice="required", strict=True)
+    return _tool_llm
+
+
+def _build_base_llm() -> "BaseChatModel":
+    if LLM_BACKEND == "fake":
+        from models.fake_llm import FakeChatModel
+        return FakeChatModel.from_env()
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY is not set. Set it or use LLM_BACKEND=fake")
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        api_key=api_key,
+        base_url=BASE_URL,
+        model=MODEL_NAME,
+        temperature=0,
+        max_completion_tokens=8000,
+        verbose=True,
+        streaming=True,
+        # streaming 응답의 마지막 chunk 에 token 사용량을 받아서 /metrics 에 기록한다
+        stream_usage=True,
+        # gateway client, Elasticsearch 와 같은 lifecycle 로 관리되는 공유 connection pool
+        http_async_client=get_http_client()
+    )
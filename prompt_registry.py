@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import threading
+
+import yaml
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict
+
+from langchain_core.messages import SystemMessage
+
+logger = logging.getLogger(__name__)
+
+PROMPT_DIR = Path(__file__).resolve().parent / "prompts"
+
+
+@dataclass(frozen=True)
+class PromptEntry:
+    name: str
+    path: Path
+    template: str
+    system_message: SystemMessage
+    mtime: float
+
+
+class PromptRegistry:
+    """
+    prompts/ 아래의 yaml prompt 를 한 번만 읽고 검증해서 ``SystemMessage`` 로 만들어 두는 registry.
+
+    graph node 는 요청마다 disk 를 읽지 않고 미리 만들어진 ``SystemMessage`` 를 재사용한다.
+    ``auto_reload`` 가 켜져 있으면 ``reload_interval`` 초마다 파일 mtime 을 확인해서 바뀐 prompt 만 다시 읽는다.
+    """
+    def __init__(self, prompt_dir: Path = PROMPT_DIR, auto_reload: bool = False, reload_interval: float = 2.0) -> None:
+        self.prompt_dir = Path(prompt_dir)
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
+
+        self._entries: Dict[str, PromptEntry] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def is_loaded(self) -> bool:
+        return bool(self._entries)
+
+    def load_all(self) -> None:
+        """모든 prompt 파일을 읽고 검증한다. 하나라도 잘못되어 있으면 ValueError."""
+        paths = sorted(self.prompt_dir.glob("*.yaml"))
+        if not paths:
+            raise ValueError(f"No prompt files found in {self.prompt_dir}")
+
+        entries = {path.stem: self._load_entry(path) for path in paths}
+        with self._lock:
+            self._entries = entries
+            self._last_checked = {name: time.monotonic() for name in entries}
+
+        logger.info(f"[PromptRegistry] Loaded {len(entries)} prompts from {self.prompt_dir}")
+
+    def get_template(self, name: str) -> str:
+        return self._get_entry(name).template
+
+    def get_system_message(self, name: str) -> SystemMessage:
+        return self._get_entry(name).system_message
+
+    def _get_entry(self, name: str) -> PromptEntry:
+        if not self._entries:
+            self.load_all()
+
+        try:
+            entry = self._entries[name]
+        except KeyError:
+            raise KeyError(f"Unknown prompt '{name}'. Available: {', '.join(sorted(self._entries))}") from None
+
+        if self.auto_reload:
+            entry = self._maybe_reload(entry)
+
+        return entry
+
+    def _maybe_reload(self, entry: PromptEntry) -> PromptEntry:
+        now = time.monotonic()
+        if now - self._last_checked.get(entry.name, 0.0) < self.reload_interval:
+            return entry
+
+        self._last_checked[entry.name] = now
+        try:
+            mtime = entry.path.stat().st_mtime
+        except OSError as e:
+            logger.warning(f"[PromptRegistry] Cannot stat {entry.path}: {str(e)}")
+            return entry
+
+        if mtime == entry.mtime:
+            return entry
+
+        try:
+            new_entry = self._load_entry(entry.path)
+        except ValueError as e:
+            # 수정 중인 파일이 잘못되어 있으면 이전 prompt 를 계속 사용한다
+            logger.error(f"[PromptRegistry] Reload failed, keeping previous prompt: {str(e)}")
+            return entry
+
+        with self._lock:
+            self._entries[entry.name] = new_entry
+
+        logger.info(f"[PromptRegistry] Reloaded prompt '{entry.name}'")
+        return new_entry
+
+    @staticmethod
+    def _load_entry(path: Path) -> PromptEntry:
+        mtime = path.stat().st_mtime
+        try:
+            config = yaml.safe_load(path.read_text(encoding="utf-8"))
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML in {path}: {str(e)}") from e
+
+        if not isinstance(config, dict) or config.get("_type", "prompt") != "prompt":
+            raise ValueError(f"{path} is not a prompt file (expected '_type: prompt')")
+
+        template = config.get("template")
+        if not isinstance(template, str) or not template.strip():
+            raise ValueError(f"{path} has an empty or missing 'template'")
+
+        return PromptEntry(
+            name=path.stem,
+            path=path,
+            template=template,
+            system_message=SystemMessage(content=template),
+            mtime=mtime
+        )
+
+
+prompt_registry = PromptRegistry(
+    auto_reload=os.getenv("PROMPT_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+)
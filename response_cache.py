@@ -0,0 +1,188 @@
+"""
+/search/ 응답 cache.
+
+정규화한 query 로 먼저 exact match 를 찾고, ``similarity_threshold`` 가 있으면 query embedding 의 cosine similarity 가
+그 이상인 이전 응답을 찾는다. 항목은 TTL 이 지나면 만료되고, 개수가 넘치면 LRU 로 밀려난다.
+저장소는 ``ResponseCacheBackend`` 를 구현해서 바꿀 수 있다.
+
+기본값은 꺼져 있다 (``RESPONSE_CACHE_ENABLED=true`` 로 켠다). 켜도 exact match 만 쓰고, semantic lookup 은
+``RESPONSE_CACHE_SIMILARITY`` 를 줄 때만 한다. semantic lookup 은 miss 마다 embedding 호출이 하나 늘고,
+"연차" 와 "반차" 처럼 가까운 다른 질문에 이전 답변을 돌려줄 수 있다.
+"""
+import os
+import re
+import time
+import logging
+import unicodedata
+
+import numpy as np
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.。？！~]+$")
+
+
+def normalize_query(query: str) -> str:
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = _WHITESPACE.sub(" ", query).strip()
+    return _TRAILING_PUNCT.sub("", query)
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    answer: str
+    # L2 정규화된 query embedding. semantic lookup 을 하지 않으면 None
+    embedding: Optional[np.ndarray]
+    created_at: float
+
+
+@dataclass
+class CacheHit:
+    answer: str
+    similarity: float
+    exact: bool
+
+
+class ResponseCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    @abstractmethod
+    async def search(self, embedding: np.ndarray, threshold: float) -> Optional[Tuple[CachedResponse, float]]:
+        """similarity 가 threshold 이상인 항목 중 가장 가까운 것."""
+        ...
+
+    @abstractmethod
+    async def put(self, key: str, entry: CachedResponse) -> None:
+        ...
+
+
+class InMemoryResponseCacheBackend(ResponseCacheBackend):
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        # semantic search 용 embedding 행렬. 항목이 바뀌면 다음 검색 때 다시 만든다
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    async def search(self, embedding: np.ndarray, threshold: float) -> Optional[Tuple[CachedResponse, float]]:
+        if self._matrix is None:
+            self._build_matrix()
+        if not self._matrix_keys:
+            return None
+
+        similarities = self._matrix @ embedding
+        for index in np.argsort(-similarities):
+            similarity = float(similarities[index])
+            if similarity < threshold:
+                return None
+
+            key = self._matrix_keys[index]
+            entry = await self.get(key)
+            if entry is not None:
+                return entry, similarity
+
+        return None
+
+    async def put(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def _expired(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.created_at > self.ttl
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _build_matrix(self) -> None:
+        keys = [key for key, entry in self._entries.items() if entry.embedding is not None]
+        self._matrix_keys = keys
+        self._matrix = np.stack([self._entries[key].embedding for key in keys]) if keys else np.empty((0, 0))
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        backend: Optional[ResponseCacheBackend] = None,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: Optional[float] = None,
+    ) -> None:
+        """
+        similarity_threshold 가 None 이면 exact match 만 사용한다 (query embedding 계산도 하지 않는다).
+        """
+        self.backend = backend or InMemoryResponseCacheBackend()
+        self.similarity_threshold = similarity_threshold
+        self._embeddings = embeddings
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        if os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+
+        # 비어 있으면 exact match 만 쓴다. semantic lookup 을 쓰려면 0.95 같은 값을 준다
+        threshold = os.getenv("RESPONSE_CACHE_SIMILARITY", "")
+        backend = InMemoryResponseCacheBackend(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        )
+        return cls(backend=backend, similarity_threshold=float(threshold) if threshold else None)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            from models.embedding import emb
+            self._embeddings = emb
+        return self._embeddings
+
+    async def lookup(self, query: str) -> Optional[CacheHit]:
+        key = normalize_query(query)
+        entry = await self.backend.get(key)
+        if entry is not None:
+            return CacheHit(answer=entry.answer, similarity=1.0, exact=True)
+
+        if self.similarity_threshold is None:
+            return None
+
+        result = await self.backend.search(await self._embed(key), self.similarity_threshold)
+        if result is None:
+            return None
+
+        entry, similarity = result
+        logger.info(f"[ResponseCache] Semantic hit ({similarity:.3f}): '{query}' ~ '{entry.query}'")
+        return CacheHit(answer=entry.answer, similarity=similarity, exact=False)
+
+    async def store(self, query: str, answer: str) -> None:
+        key = normalize_query(query)
+        embedding = await self._embed(key) if self.similarity_threshold is not None else None
+        await self.backend.put(key, CachedResponse(query=query, answer=answer, embedding=embedding, created_at=time.time()))
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
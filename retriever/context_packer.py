@@ -0,0 +1,127 @@
+"""
+검색된 chunk 를 token budget 안에 맞춰 LLM prompt 용 context 로 만든다.
+
+1. score 순으로 정렬하고, 최고 score 대비 ``min_score_ratio`` 미만인 chunk 는 버린다.
+2. 같은 source 의 이웃 chunk 와 ``chunk_overlap`` 만큼 겹치는 부분은 잘라내고, 거의 같은 chunk 는 버린다.
+3. score 가 높은 chunk 부터 budget 이 허락하는 만큼 담는다.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from utils import estimate_tokens
+
+SHINGLE_SIZE = 5
+
+
+@dataclass
+class PackedContext:
+    text: str
+    documents: List[Document] = field(default_factory=list)
+    tokens_used: int = 0
+    # 모든 chunk 를 그대로 이어붙였을 때의 token 수
+    tokens_original: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_original - self.tokens_used
+
+
+def _shingles(text: str) -> Set[str]:
+    text = " ".join(text.split())
+    return {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _span(doc: Document) -> Optional[Tuple[str, int, int]]:
+    start = doc.metadata.get("start_index")
+    source = doc.metadata.get("source")
+    if start is None or source is None:
+        return None
+    return source, start, start + len(doc.page_content)
+
+
+def _trim_overlap(doc: Document, accepted_spans: List[Tuple[str, int, int]]) -> Optional[str]:
+    """이미 담은 같은 source 의 chunk 와 겹치는 앞/뒤 부분을 잘라낸다. 전부 겹치면 None."""
+    span = _span(doc)
+    if span is None:
+        return doc.page_content
+
+    source, start, end = span
+    text = doc.page_content
+    for other_source, other_start, other_end in accepted_spans:
+        if other_source != source or other_end <= start or end <= other_start:
+            continue
+        if other_start <= start and end <= other_end:
+            return None
+        if other_start <= start < other_end:
+            text = text[other_end - start:]
+            start = other_end
+        elif start < other_start < end:
+            text = text[:other_start - start]
+            end = other_start
+
+    return text
+
+
+def pack_documents(
+    documents: List[Document],
+    token_budget: Optional[int] = None,
+    min_score_ratio: float = 0.0,
+    dedup_threshold: float = 0.9,
+    separator: str = "\n\n",
+) -> PackedContext:
+    tokens_original = estimate_tokens(separator.join(doc.page_content for doc in documents))
+    packed = PackedContext(text="", tokens_original=tokens_original)
+    if not documents:
+        return packed
+
+    ranked = sorted(documents, key=lambda doc: doc.metadata.get("score", 0.0), reverse=True)
+    top_score = ranked[0].metadata.get("score")
+    if top_score and min_score_ratio > 0:
+        kept = [doc for doc in ranked if doc.metadata.get("score", 0.0) >= top_score * min_score_ratio]
+        packed.dropped += len(ranked) - len(kept)
+        ranked = kept
+
+    texts: List[str] = []
+    accepted_spans: List[Tuple[str, int, int]] = []
+    accepted_shingles: List[Set[str]] = []
+    separator_tokens = estimate_tokens(separator)
+
+    for doc in ranked:
+        text = _trim_overlap(doc, accepted_spans)
+        if not text or not text.strip():
+            packed.duplicates += 1
+            continue
+
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, other) >= dedup_threshold for other in accepted_shingles):
+            packed.duplicates += 1
+            continue
+
+        tokens = estimate_tokens(text) + (separator_tokens if texts else 0)
+        if token_budget is not None and packed.tokens_used + tokens > token_budget:
+            # 더 작은 chunk 는 아직 들어갈 수 있으므로 계속 본다
+            packed.dropped += 1
+            continue
+
+        texts.append(text)
+        packed.documents.append(doc)
+        packed.tokens_used += tokens
+        accepted_shingles.append(shingles)
+        span = _span(doc)
+        if span is not None:
+            accepted_spans.append(span)
+
+    packed.text = separator.join(texts)
+    # budget 확인에는 chunk 별 추정치의 합 (올림 오차만큼 보수적) 을 쓰고, 결과는 tokens_original 과 같은 방식으로 센다
+    packed.tokens_used = estimate_tokens(packed.text)
+    return packed
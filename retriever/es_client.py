@@ -0,0 +1,67 @@
+"""
+Process 전체에서 공유하는 AsyncElasticsearch client.
+
+Environment variables:
+    ELASTICSEARCH_URL              -> HTTP endpoint, e.g. http://localhost:9200
+    ELASTICSEARCH_API_KEY          -> API key (basic auth 대신 사용)
+    ELASTICSEARCH_USERNAME         -> Basic auth username
+    ELASTICSEARCH_PASSWORD         -> Basic auth password
+    ELASTICSEARCH_VERIFY_CERTS     -> "true" 이면 인증서 검증
+    ELASTICSEARCH_CONNECTIONS      -> node 당 connection pool 크기 (default 32)
+    ELASTICSEARCH_REQUEST_TIMEOUT  -> 요청 timeout 초 (default 10)
+    ELASTICSEARCH_NODE_CLASS       -> elastic-transport async node (default "httpxasync").
+                                      "aiohttp" 는 ``elasticsearch[async]`` 를 따로 설치해야 한다
+"""
+import os
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from elasticsearch import AsyncElasticsearch
+
+_async_client: Optional["AsyncElasticsearch"] = None
+
+
+def build_async_es_client() -> "AsyncElasticsearch":
+    # elasticsearch client 는 import 가 무거워서 (수백 ms) 실제로 client 를 만들 때 import 한다
+    from elasticsearch import AsyncElasticsearch
+
+    es_url = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
+    api_key = os.getenv("ELASTICSEARCH_API_KEY")
+    username = os.getenv("ELASTICSEARCH_USERNAME", "elastic")
+    password = os.getenv("ELASTICSEARCH_PASSWORD")
+
+    if api_key:
+        auth = {"api_key": api_key}
+    elif password:
+        auth = {"basic_auth": (username, password)}
+    else:
+        # 보안을 끈 local cluster
+        auth = {}
+
+    # AsyncElasticsearch 의 기본 node 는 aiohttp 이지만 의존성에 없으므로 이미 쓰고 있는 httpx 를 쓴다
+    return AsyncElasticsearch(
+        es_url,
+        node_class=os.getenv("ELASTICSEARCH_NODE_CLASS", "httpxasync"),
+        verify_certs=os.getenv("ELASTICSEARCH_VERIFY_CERTS", "false").lower() == "true",
+        connections_per_node=int(os.getenv("ELASTICSEARCH_CONNECTIONS", "32")),
+        request_timeout=float(os.getenv("ELASTICSEARCH_REQUEST_TIMEOUT", "10")),
+        retry_on_timeout=True,
+        max_retries=2,
+        **auth
+    )
+
+
+def get_async_es_client() -> "AsyncElasticsearch":
+    """connection pool 을 재사용하도록 AsyncElasticsearch 를 한 번만 만든다."""
+    global _async_client
+    if _async_client is None:
+        _async_client = build_async_es_client()
+    return _async_client
+
+
+async def close_async_es_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
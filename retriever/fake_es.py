@@ -0,0 +1,125 @@
+"""
+offline 테스트와 benchmark 용 in-memory Elasticsearch.
+
+``Worker`` 가 사용하는 ``ping`` / ``msearch`` 와 문서 적재용 ``index`` / ``delete`` / ``bulk`` 만 흉내낸다.
+keyword 검색은 BM25, kNN 검색은 cosine similarity 로 계산한다.
+"""
+import math
+import asyncio
+
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from retriever.text import tokenize
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class FakeAsyncElasticsearch:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, latency: float = 0.0) -> None:
+        self.k1 = k1
+        self.b = b
+        # msearch 한 번의 network/검색 지연을 흉내낸다
+        self.latency = latency
+        self.indices: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self.num_msearch_calls = 0
+        # 문서가 바뀔 때마다 올라가는 index 별 generation (retriever.result_cache 무효화용)
+        self.generations: Dict[str, int] = defaultdict(int)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def index(self, index: str, document: Dict[str, Any], id: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        doc_id = id or str(len(self.indices[index]))
+        self.indices[index][doc_id] = document
+        self.generations[index] += 1
+        return {"_index": index, "_id": doc_id, "result": "created"}
+
+    async def delete(self, index: str, id: str, **kwargs: Any) -> Dict[str, Any]:
+        found = self.indices[index].pop(id, None) is not None
+        self.generations[index] += found
+        return {"_index": index, "_id": id, "result": "deleted" if found else "not_found"}
+
+    async def bulk(self, operations: List[Dict[str, Any]], index: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        items = []
+        ops = iter(operations)
+        for action in ops:
+            op_type, meta = next(iter(action.items()))
+            target = meta.get("_index", index)
+            if op_type == "delete":
+                result = await self.delete(target, meta["_id"])
+            else:
+                result = await self.index(target, next(ops), id=meta.get("_id"))
+            items.append({op_type: {**result, "status": 200}})
+        return {"errors": False, "items": items}
+
+    async def index_generation(self, index: str) -> int:
+        return self.generations[index]
+
+    async def msearch(self, searches: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        self.num_msearch_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2]):
+            docs = self.indices.get(header["index"], {})
+            if "knn" in body:
+                hits = self._knn(docs, body["knn"])
+            else:
+                hits = self._match(docs, body["query"]["match"])
+            responses.append({"hits": {"hits": self._format_hits(hits[:body.get("size", 10)], docs, body)}})
+
+        return {"responses": responses}
+
+    def _match(self, docs: Dict[str, Dict[str, Any]], match: Dict[str, Any]) -> List[tuple]:
+        field, query = next(iter(match.items()))
+        query_terms = tokenize(query if isinstance(query, str) else query["query"])
+        doc_terms = {doc_id: tokenize(doc.get(field, "")) for doc_id, doc in docs.items()}
+        if not doc_terms:
+            return []
+
+        avg_len = sum(len(terms) for terms in doc_terms.values()) / len(doc_terms)
+        doc_freq = Counter(term for terms in doc_terms.values() for term in set(terms))
+
+        scored = []
+        for doc_id, terms in doc_terms.items():
+            tf = Counter(terms)
+            score = 0.0
+            for term in query_terms:
+                if term not in tf:
+                    continue
+                idf = math.log(1 + (len(doc_terms) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf[term] + self.k1 * (1 - self.b + self.b * len(terms) / (avg_len or 1))
+                score += idf * tf[term] * (self.k1 + 1) / norm
+            if score > 0:
+                scored.append((doc_id, score))
+
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+    def _knn(self, docs: Dict[str, Dict[str, Any]], knn: Dict[str, Any]) -> List[tuple]:
+        field = knn["field"]
+        scored = [
+            # ES cosine similarity 와 같이 (1 + cos) / 2 로 score 를 양수로 만든다
+            (doc_id, (1 + _cosine(knn["query_vector"], doc[field])) / 2)
+            for doc_id, doc in docs.items() if doc.get(field)
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:knn.get("k", 10)]
+
+    def _format_hits(self, hits: List[tuple], docs: Dict[str, Dict[str, Any]], body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        excludes = set(body.get("_source", {}).get("excludes", []))
+        return [
+            {
+                "_id": doc_id,
+                "_score": score,
+                "_source": {key: value for key, value in docs[doc_id].items() if key not in excludes},
+            }
+            for doc_id, score in hits
+        ]
@@ -0,0 +1,43 @@
+from typing import Dict, List, Tuple
+
+# (doc id, score) 목록. score 가 높은 순서로 정렬되어 있다고 가정한다.
+RankedHits = List[Tuple[str, float]]
+
+
+def _min_max_normalize(hits: RankedHits) -> Dict[str, float]:
+    if not hits:
+        return {}
+
+    scores = [score for _, score in hits]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return {doc_id: 1.0 for doc_id, _ in hits}
+
+    return {doc_id: (score - low) / (high - low) for doc_id, score in hits}
+
+
+def alpha_fusion(keyword_hits: RankedHits, vector_hits: RankedHits, alpha: float) -> RankedHits:
+    """
+    keyword / vector score 를 각각 min-max 정규화한 뒤 ``alpha * vector + (1 - alpha) * keyword`` 로 합친다.
+    """
+    keyword_scores = _min_max_normalize(keyword_hits)
+    vector_scores = _min_max_normalize(vector_hits)
+
+    fused = {
+        doc_id: alpha * vector_scores.get(doc_id, 0.0) + (1 - alpha) * keyword_scores.get(doc_id, 0.0)
+        for doc_id in keyword_scores.keys() | vector_scores.keys()
+    }
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def rrf_fusion(keyword_hits: RankedHits, vector_hits: RankedHits, alpha: float, k: int = 60) -> RankedHits:
+    """
+    Reciprocal Rank Fusion. 순위만 사용하므로 score scale 차이에 영향을 받지 않는다.
+    keyword / vector 순위 기여도는 alpha 로 가중한다.
+    """
+    fused: Dict[str, float] = {}
+    for weight, hits in ((1 - alpha, keyword_hits), (alpha, vector_hits)):
+        for rank, (doc_id, _) in enumerate(hits, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
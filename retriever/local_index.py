@@ -0,0 +1,339 @@
+"""
+Elasticsearch 없이 process 안에서 검색하는 local vector index.
+
+디렉터리 하나가 index 하나이다.
+
+    index.json          현재 generation, 차원, 문서 수, IVF list 수
+    vectors-<gen>.npy   L2 정규화된 chunk embedding (float32, N x dim). 읽기 전용 memmap 으로 연다
+    chunks-<gen>.jsonl  vector 행 순서대로 {"id", "text", "metadata"}
+    ivf-<gen>.npz       (IVF 를 쓸 때만) list 별 centroid 와 행 범위. 행은 list 순서로 정렬되어 있다
+
+vector 는 memmap 이므로 같은 파일을 여는 uvicorn worker process 들이 OS page cache 를 공유한다.
+공유되는 것은 vector 뿐이다. chunk 본문과 BM25 역색인은 process 마다 memory 에 만들고, 새 generation 을 열 때마다 다시 만든다.
+kNN 은 전체 행렬과의 dot product, 또는 IVF 에서 가장 가까운 ``nprobe`` 개 list 의 연속된 행과의 dot product 로 계산한다.
+keyword 검색은 sidecar 본문으로 만든 BM25 역색인으로 한다.
+
+새 generation 의 파일을 모두 쓴 뒤 index.json 을 교체하고 직전 generation 의 파일은 한 번 더 남겨 두므로,
+교체 직전에 index.json 을 읽은 process 도 그 generation 을 열 수 있다.
+``LocalIndexClient`` 는 ``Worker`` 가 쓰는 ``ping`` / ``msearch`` 를 구현하므로 AsyncElasticsearch 대신 넣을 수 있다.
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from retriever.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+LOCAL_INDEX_DIR = Path(os.getenv("LOCAL_INDEX_DIR", Path(__file__).resolve().parents[1] / ".local_index"))
+# 이 행 수 이상이면 IVF 를 만든다 (nlist = sqrt(N)). 그보다 작은 corpus 는 전체 dot product 로도 충분히 빠르고 recall 이 정확하다
+IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "50000"))
+# IVF 검색 시 살펴볼 list 수. 0 이면 nlist 의 10% (최소 8)
+IVF_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "0"))
+# 행 수가 이보다 많은 index 는 event loop 를 막지 않도록 thread 에서 검색한다
+INLINE_SEARCH_ROWS = int(os.getenv("LOCAL_INDEX_INLINE_SEARCH_ROWS", "50000"))
+
+Hits = List[Tuple[int, float]]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class LocalVectorIndex:
+    """한 generation 의 읽기 전용 index."""
+    def __init__(
+        self,
+        path: Path,
+        generation: int,
+        vectors: np.ndarray,
+        chunks: List[Dict[str, Any]],
+        centroids: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.path = path
+        self.generation = generation
+        self.vectors = vectors
+        self.chunks = chunks
+        self.centroids = centroids
+        self.offsets = offsets
+        self.k1 = k1
+        self.b = b
+        self._build_postings()
+
+    @classmethod
+    def open(cls, path: Path) -> "LocalVectorIndex":
+        path = Path(path)
+        header = json.loads((path / INDEX_FILE).read_text(encoding="utf-8"))
+        generation = header["generation"]
+
+        vectors = np.load(path / f"vectors-{generation}.npy", mmap_mode="r")
+        with open(path / f"chunks-{generation}.jsonl", "r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+
+        centroids = offsets = None
+        if header.get("nlist"):
+            with np.load(path / f"ivf-{generation}.npz") as ivf:
+                centroids, offsets = ivf["centroids"], ivf["offsets"]
+
+        return cls(path, generation, vectors, chunks, centroids, offsets)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def knn(self, query_vector: List[float], k: int, nprobe: int = IVF_NPROBE) -> Hits:
+        """cosine similarity 가 높은 k 개의 (행 번호, score). score 는 ES 와 같이 (1 + cos) / 2 이다."""
+        if not len(self):
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+
+        if self.centroids is None:
+            scores = self.vectors @ query
+            rows = _top_k(scores, k)
+            return [(int(row), (1.0 + float(scores[row])) / 2) for row in rows]
+
+        nprobe = nprobe or max(8, len(self.centroids) // 10)
+        probes = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        hits: Hits = []
+        for probe in probes:
+            start, end = int(self.offsets[probe]), int(self.offsets[probe + 1])
+            scores = self.vectors[start:end] @ query
+            hits += [(start + int(row), float(scores[row])) for row in _top_k(scores, k)]
+
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return [(row, (1.0 + score) / 2) for row, score in hits[:k]]
+
+    def match(self, query: str, k: int) -> Hits:
+        """BM25 score 가 높은 k 개의 (행 번호, score)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tf = posting
+            idf = math.log(1 + (len(self) - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[rows] / self._avg_length)
+            scores[rows] += idf * tf * (self.k1 + 1) / norm
+
+        rows = _top_k(scores, k)
+        return [(int(row), float(scores[row])) for row in rows if scores[row] > 0]
+
+    def _build_postings(self) -> None:
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(len(self), dtype=np.float32)
+        for row, chunk in enumerate(self.chunks):
+            terms = tokenize(chunk["text"])
+            lengths[row] = len(terms)
+            for term, count in Counter(terms).items():
+                rows, tf = postings.setdefault(term, ([], []))
+                rows.append(row)
+                tf.append(count)
+
+        self._postings = {
+            term: (np.asarray(rows, dtype=np.int64), np.asarray(tf, dtype=np.float32))
+            for term, (rows, tf) in postings.items()
+        }
+        self._lengths = lengths
+        self._avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() else 1.0
+
+
+class LocalIndexWriter:
+    """
+    기존 index 를 읽어 upsert / delete 를 반영한 뒤, ``commit`` 에서 새 generation 으로 통째로 다시 쓴다.
+    작은 corpus 용이라 전체 vector 를 memory 에 올린다.
+    """
+    def __init__(self, path: Path, ivf_min_rows: int = IVF_MIN_ROWS, kmeans_iterations: int = 10) -> None:
+        self.path = Path(path)
+        self.ivf_min_rows = ivf_min_rows
+        self.kmeans_iterations = kmeans_iterations
+        self.generation = 0
+        # chunk ID -> (본문, metadata, vector)
+        self._rows: Dict[str, Tuple[str, Dict[str, Any], np.ndarray]] = {}
+
+        if (self.path / INDEX_FILE).exists():
+            index = LocalVectorIndex.open(self.path)
+            self.generation = index.generation
+            for chunk, vector in zip(index.chunks, index.vectors):
+                self._rows[chunk["id"]] = (chunk["text"], chunk["metadata"], np.array(vector))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, chunk_id: str, text: str, metadata: Dict[str, Any], vector: Iterable[float]) -> None:
+        self._rows[chunk_id] = (text, metadata, np.asarray(vector, dtype=np.float32))
+
+    def delete(self, chunk_id: str) -> bool:
+        return self._rows.pop(chunk_id, None) is not None
+
+    def commit(self) -> int:
+        """새 generation 을 쓰고 index.json 을 교체한다. 직전 generation 보다 오래된 파일은 지운다."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        generation = self.generation + 1
+
+        ids = list(self._rows)
+        dim = len(next(iter(self._rows.values()))[2]) if ids else 0
+        vectors = _normalize(np.stack([self._rows[chunk_id][2] for chunk_id in ids])) if ids else np.zeros((0, 0), np.float32)
+        vectors = vectors.astype(np.float32)
+
+        nlist = int(math.sqrt(len(ids))) if len(ids) >= self.ivf_min_rows else 0
+        if nlist:
+            centroids, order, offsets = self._build_ivf(vectors, nlist)
+            ids = [ids[row] for row in order]
+            vectors = vectors[order]
+            np.savez(self.path / f"ivf-{generation}.npz", centroids=centroids, offsets=offsets)
+
+        np.save(self.path / f"vectors-{generation}.npy", vectors)
+        with open(self.path / f"chunks-{generation}.jsonl", "w", encoding="utf-8") as f:
+            for chunk_id in ids:
+                text, metadata, _ = self._rows[chunk_id]
+                f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+        header = {"generation": generation, "dim": dim, "count": len(ids), "nlist": nlist, "updated_at": time.time()}
+        tmp_path = self.path / f"{INDEX_FILE}.tmp"
+        tmp_path.write_text(json.dumps(header), encoding="utf-8")
+        os.replace(tmp_path, self.path / INDEX_FILE)
+
+        # 교체 직전에 index.json 을 읽은 reader 가 열 수 있도록 직전 generation (self.generation) 은 남기고 그 이전 것만 지운다.
+        # 이미 열린 memmap 은 지운 파일도 계속 읽을 수 있다
+        for old in self.path.glob("*-*.*"):
+            old_generation = old.name.split(".")[0].rsplit("-", 1)[-1]
+            if old_generation.isdigit() and int(old_generation) < self.generation:
+                old.unlink()
+        self.generation = generation
+        logger.info(f"[LocalIndexWriter] Wrote generation {generation} of {self.path} ({len(ids)} chunks, nlist={nlist})")
+        return generation
+
+    def _build_ivf(self, vectors: np.ndarray, nlist: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """spherical k-means 로 list 를 나누고, (centroid, list 순서로 정렬한 행 번호, list 별 시작 offset) 을 반환한다."""
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = vectors[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+        return centroids.astype(np.float32), order, offsets
+
+
+class LocalIndexClient:
+    """
+    ``root/<index 이름>`` 디렉터리의 local index 를 검색하는 AsyncElasticsearch 대체 client.
+    ``Worker`` 가 보내는 BM25 match / kNN ``msearch`` 만 지원한다.
+
+    index.json 은 ``reload_interval`` 초마다 확인해서 generation 이 바뀌면 새 파일을 연다.
+    """
+    def __init__(self, root: Path, reload_interval: float = 5.0) -> None:
+        self.root = Path(root)
+        self.reload_interval = reload_interval
+        # index 이름 -> (index, 마지막 확인 시각)
+        self._indices: Dict[str, Tuple[LocalVectorIndex, float]] = {}
+
+    async def ping(self) -> bool:
+        return self.root.is_dir()
+
+    async def close(self) -> None:
+        self._indices.clear()
+
+    def get_index(self, name: str) -> LocalVectorIndex:
+        cached = self._indices.get(name)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < self.reload_interval:
+            return cached[0]
+
+        path = self.root / name
+        if cached is not None:
+            generation = json.loads((path / INDEX_FILE).read_text(encoding="utf-8"))["generation"]
+            if generation == cached[0].generation:
+                self._indices[name] = (cached[0], now)
+                return cached[0]
+
+        index = LocalVectorIndex.open(path)
+        self._indices[name] = (index, now)
+        return index
+
+    async def index_generation(self, name: str) -> int:
+        """지금 검색에 쓰고 있는 generation (``retriever.result_cache`` 의 무효화 기준)."""
+        if self._is_fresh(name):
+            return self._indices[name][0].generation
+        return (await asyncio.to_thread(self.get_index, name)).generation
+
+    async def msearch(self, searches: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        pairs = list(zip(searches[::2], searches[1::2]))
+        # 처음 열거나 generation 을 다시 확인할 index 는 chunk 본문을 읽고 BM25 역색인을 만들 수 있으므로 thread 에서 검색한다
+        blocking = any(
+            not self._is_fresh(name) or len(self._indices[name][0]) > INLINE_SEARCH_ROWS
+            for name in {header["index"] for header, _ in pairs}
+        )
+        if blocking:
+            return await asyncio.to_thread(self._msearch, pairs)
+        return self._msearch(pairs)
+
+    def _is_fresh(self, name: str) -> bool:
+        cached = self._indices.get(name)
+        return cached is not None and time.monotonic() - cached[1] < self.reload_interval
+
+    def _msearch(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[str, Any]:
+        from retriever.workers import METADATA_FIELD, TEXT_FIELD
+
+        responses = []
+        for header, body in pairs:
+            try:
+                index = self.get_index(header["index"])
+            except FileNotFoundError:
+                responses.append({"error": {"type": "index_not_found_exception", "index": header["index"]}})
+                continue
+
+            size = body.get("size", 10)
+            if "knn" in body:
+                hits = index.knn(body["knn"]["query_vector"], body["knn"].get("k", size))
+            else:
+                query = next(iter(body["query"]["match"].values()))
+                hits = index.match(query if isinstance(query, str) else query["query"], size)
+
+            responses.append({"hits": {"hits": [
+                {
+                    "_id": index.chunks[row]["id"],
+                    "_score": score,
+                    "_source": {TEXT_FIELD: index.chunks[row]["text"], METADATA_FIELD: index.chunks[row]["metadata"]},
+                }
+                for row, score in hits[:size]
+            ]}})
+
+        return {"responses": responses}
+
+
+_local_client: Optional[LocalIndexClient] = None
+
+
+def get_local_index_client() -> LocalIndexClient:
+    """``LOCAL_INDEX_DIR`` (default <repo>/.local_index) 아래 index 들을 검색하는 client 를 한 번만 만든다."""
+    global _local_client
+    if _local_client is None:
+        _local_client = LocalIndexClient(LOCAL_INDEX_DIR)
+    return _local_client
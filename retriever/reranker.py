@@ -0,0 +1,152 @@
+"""
+검색 결과 reranker.
+
+(query, chunk) 쌍을 batch 로 나눠 thread pool 에서 점수를 매기므로 CPU 연산이 event loop 를 막지 않는다.
+점수는 (model, query hash, chunk 본문 hash) 단위로 cache 한다.
+chunk ID 는 위치로 정해져서 (source, start_index) 다시 적재해도 바뀌지 않으므로 key 로 쓰지 않는다.
+점수 모델은 ``ScoringModel`` 을 구현해서 바꿀 수 있고, 테스트에서는 ``LexicalScorer`` 를 쓸 수 있다.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from retriever.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringModel(ABC):
+    name: str
+
+    @abstractmethod
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        """(query, passage) 쌍의 관련도 점수. 높을수록 관련이 있다. CPU 를 쓰는 동기 함수."""
+        ...
+
+    def load(self) -> None:
+        """model weight 등을 미리 읽어둔다."""
+        pass
+
+
+class LexicalScorer(ScoringModel):
+    """query 단어가 passage 에 얼마나 포함되는지로 점수를 매기는 가벼운 scorer."""
+    name = "lexical"
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        scores = []
+        for query, passage in pairs:
+            query_terms = set(tokenize(query))
+            passage_terms = set(tokenize(passage))
+            scores.append(len(query_terms & passage_terms) / len(query_terms) if query_terms else 0.0)
+        return scores
+
+
+class CrossEncoderScorer(ScoringModel):
+    """sentence-transformers CrossEncoder 기반 local reranker (optional dependency)."""
+    def __init__(self, model_name: str, device: str = "cpu", max_length: int = 512) -> None:
+        self.name = model_name
+        self.device = device
+        self.max_length = max_length
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        with self._lock:
+            if self._model is not None:
+                return
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError as e:
+                raise ImportError(
+                    "CrossEncoderScorer requires sentence-transformers: pip install sentence-transformers"
+                ) from e
+            self._model = CrossEncoder(self.name, device=self.device, max_length=self.max_length)
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        self.load()
+        return [float(score) for score in self._model.predict(list(pairs), show_progress_bar=False)]
+
+
+def _chunk_key(doc: Document) -> str:
+    return hashlib.blake2b(doc.page_content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Reranker:
+    def __init__(
+        self,
+        model: ScoringModel,
+        batch_size: int = 16,
+        max_workers: int = 2,
+        cache_size: int = 10000,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        self.model = model
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reranker")
+
+        self._cache: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+
+    async def warmup(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.model.load)
+
+    async def rerank(self, query: str, documents: List[Document], topk: Optional[int] = None) -> List[Document]:
+        """점수 높은 순서로 topk 개를 반환한다. metadata 의 score 는 rerank 점수로 바뀌고 원래 값은 retrieval_score 에 남는다."""
+        if not documents:
+            return []
+
+        query_hash = hashlib.blake2b(query.encode("utf-8"), digest_size=16).hexdigest()
+        keys = [(self.model.name, query_hash, _chunk_key(doc)) for doc in documents]
+
+        scores = {key: self._cache[key] for key in keys if key in self._cache}
+        for key in scores:
+            self._cache.move_to_end(key)
+
+        missing = [(key, doc) for key, doc in zip(keys, documents) if key not in scores]
+        # 같은 chunk 가 여러 번 들어와도 한 번만 점수를 매긴다
+        missing = list(dict(missing).items())
+        if missing:
+            scores.update(await self._score(query, missing))
+
+        ranked = sorted(zip(keys, documents), key=lambda item: scores[item[0]], reverse=True)
+        return [self._with_score(doc, scores[key]) for key, doc in ranked[:topk]]
+
+    async def _score(self, query: str, items: List[Tuple[tuple, Document]]) -> dict:
+        loop = asyncio.get_running_loop()
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self.model.score, [(query, doc.page_content) for _, doc in batch])
+            for batch in batches
+        ])
+
+        scores = {}
+        for batch, batch_scores in zip(batches, results):
+            for (key, _), score in zip(batch, batch_scores):
+                scores[key] = score
+                self._cache[key] = score
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return scores
+
+    @staticmethod
+    def _with_score(doc: Document, score: float) -> Document:
+        metadata = dict(doc.metadata)
+        if "score" in metadata:
+            metadata["retrieval_score"] = metadata["score"]
+        metadata["score"] = score
+        return Document(id=doc.id, page_content=doc.page_content, metadata=metadata)
+
+
+def build_scoring_model(name: str) -> ScoringModel:
+    if name == LexicalScorer.name:
+        return LexicalScorer()
+    return CrossEncoderScorer(name)
@@ -0,0 +1,235 @@
+"""
+hybrid 검색 결과 cache.
+
+orchestrator 는 ``should_continue`` loop 의 재시도나 여러 사용자의 비슷한 질문에서 같은 ``hr_doc_retriever`` 호출
+(query, topk, alpha) 을 반복한다. ``Worker`` 는 fusion 까지 끝난 결과를 (index, 정규화한 query, topk, alpha) 로 저장해 두고,
+hit 이면 query embedding 과 ``msearch`` 를 모두 건너뛴다.
+
+항목에는 chunk ID tuple 과 score (double array) 만 두고, chunk 본문과 metadata 는 index 별로 한 번만 저장해서 참조 수로 관리한다.
+항목 수가 ``max_entries`` 를 넘으면 LRU 로 밀려난다.
+
+적재 (``upsert_documents``) 는 쓸 때마다 index 의 generation 을 올린다. cache 는 ``generation_check_interval`` 초마다
+generation 을 다시 읽고, 바뀌었으면 그 index 의 항목을 모두 버린다. 적재 직후 최대 그 시간만큼만 이전 결과가 나갈 수 있다.
+generation 을 읽지 못하면 (mapping 을 읽을 권한이 없는 API key 등) 다음 확인까지 그 index 는 cache 를 쓰지 않는다.
+
+Environment variables:
+    RETRIEVAL_CACHE_ENABLED                  -> "false" 이면 cache 하지 않는다 (default true)
+    RETRIEVAL_CACHE_MAX_ENTRIES              -> 저장할 검색 결과 수 (default 2048)
+    RETRIEVAL_CACHE_GENERATION_CHECK_INTERVAL -> index generation 을 다시 읽는 간격 초 (default 1)
+"""
+import os
+import time
+import logging
+
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from response_cache import normalize_query
+from telemetry import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))
+RETRIEVAL_CACHE_GENERATION_CHECK_INTERVAL = float(os.getenv("RETRIEVAL_CACHE_GENERATION_CHECK_INTERVAL", "1"))
+
+# Elasticsearch index mapping 의 _meta 에 두는 generation 값의 key
+GENERATION_META_KEY = "generation"
+
+RETRIEVAL_CACHE_LOOKUPS = registry.register(Counter(
+    "omni_retrieval_cache_lookups_total",
+    "Retrieval result cache lookups by index and result (hit, miss).",
+    ["index", "result"]
+))
+RETRIEVAL_CACHE_INVALIDATIONS = registry.register(Counter(
+    "omni_retrieval_cache_invalidations_total",
+    "Times the retrieval result cache of an index was dropped because its generation changed.",
+    ["index"]
+))
+
+# (index, 정규화한 query, topk, alpha)
+CacheKey = Tuple[str, str, int, float]
+# (chunk ID, score, {"text": ..., "metadata": ...})
+CachedHit = Tuple[str, float, Dict[str, Any]]
+
+
+@dataclass
+class _Entry:
+    ids: Tuple[str, ...]
+    scores: array
+
+
+@dataclass
+class _Chunk:
+    source: Dict[str, Any]
+    refs: int = 0
+
+
+async def read_index_generation(es_client: Any, index: str) -> int:
+    """
+    index 의 현재 generation. ``index_generation`` 을 구현한 client (``LocalIndexClient``, ``FakeAsyncElasticsearch``)
+    는 그 값을, Elasticsearch 는 mapping ``_meta`` 의 값을 읽는다. 한 번도 적재 표시가 없으면 0 이다.
+    """
+    reader = getattr(es_client, "index_generation", None)
+    if reader is not None:
+        return await reader(index)
+
+    response = await es_client.indices.get_mapping(index=index)
+    # alias 면 여러 index 가 올 수 있다
+    return max(
+        int((response[name]["mappings"].get("_meta") or {}).get(GENERATION_META_KEY, 0))
+        for name in response
+    )
+
+
+async def bump_index_generation(es_client: Any, index: str) -> int:
+    """
+    Elasticsearch index 의 mapping ``_meta`` generation 을 1 올린다.
+    새로 쓴 chunk 가 검색되도록 먼저 refresh 한다. 순서가 반대면 cache 가 새 generation 으로 이전 결과를 다시 채울 수 있다.
+
+    ``_meta`` 를 읽고 다시 쓰는 것은 atomic 하지 않다. 같은 index 에 적재를 동시에 돌리면 둘 다 같은 값으로 올려서
+    한쪽의 변경이 cache 에 반영되지 않을 수 있으므로, index 하나에는 적재를 한 번에 하나만 돌린다
+    (증분 적재 manifest 도 같은 가정을 한다).
+    """
+    await es_client.indices.refresh(index=index)
+    response = await es_client.indices.get_mapping(index=index)
+    meta = dict(next(iter(response[name]["mappings"].get("_meta") or {} for name in response)))
+    generation = int(meta.get(GENERATION_META_KEY, 0)) + 1
+    meta[GENERATION_META_KEY] = generation
+    await es_client.indices.put_mapping(index=index, meta=meta)
+    return generation
+
+
+class RetrievalResultCache:
+    """
+    index generation 으로 무효화되는 검색 결과 LRU cache. 한 event loop 안에서만 쓴다 (lock 이 없다).
+
+    ``Worker`` 는 검색마다 ``current_generation`` 으로 generation 을 받아서 ``get`` / ``put`` 에 넘긴다.
+    generation 을 읽는 동안 적재가 끝나면, 이전 generation 으로 검색한 결과는 ``put`` 에서 버려진다.
+    """
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        generation_check_interval: float = RETRIEVAL_CACHE_GENERATION_CHECK_INTERVAL,
+    ) -> None:
+        self.max_entries = max_entries
+        self.generation_check_interval = generation_check_interval
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        # (index, chunk ID) -> chunk 본문. 여러 항목이 같은 chunk 를 가리킨다
+        self._chunks: Dict[Tuple[str, str], _Chunk] = {}
+        # index -> (generation, 마지막 확인 시각). generation 을 읽지 못했으면 None
+        self._generations: Dict[str, Tuple[Optional[int], float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(index: str, query: str, topk: int, alpha: float) -> CacheKey:
+        return index, normalize_query(query), topk, round(alpha, 3)
+
+    async def current_generation(self, index: str, read: Callable[[], Awaitable[int]]) -> Optional[int]:
+        """
+        index 의 generation. ``generation_check_interval`` 안에서는 마지막으로 읽은 값을 쓴다.
+        읽지 못하면 None 을 반환하고, 그 검색은 cache 를 쓰지 않는다.
+        """
+        now = time.monotonic()
+        state = self._generations.get(index)
+        if state is not None and now - state[1] < self.generation_check_interval:
+            return state[0]
+
+        try:
+            generation = await read()
+        except Exception as e:
+            # 실패도 interval 동안 기억해서 (권한이 없는 API key 등) 검색마다 다시 읽지 않는다.
+            # 실패하는 동안 generation 이 바뀌었을 수 있으므로 남은 항목도 버린다
+            if state is None or state[0] is not None:
+                logger.warning(f"[RetrievalResultCache] Could not read generation of '{index}', bypassing cache: {e}")
+            self.invalidate(index)
+            self._generations[index] = (None, now)
+            return None
+
+        if state is not None and state[0] is not None and state[0] != generation:
+            dropped = self.invalidate(index)
+            RETRIEVAL_CACHE_INVALIDATIONS.inc(index=index)
+            logger.info(f"[RetrievalResultCache] '{index}' generation {state[0]} -> {generation}, dropped {dropped} entries")
+        self._generations[index] = (generation, now)
+        return generation
+
+    def get(self, key: CacheKey, generation: Optional[int]) -> Optional[List[CachedHit]]:
+        index = key[0]
+        entry = self._entries.get(key) if self._is_current(index, generation) else None
+        if entry is None:
+            self.misses += 1
+            RETRIEVAL_CACHE_LOOKUPS.inc(index=index, result="miss")
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        RETRIEVAL_CACHE_LOOKUPS.inc(index=index, result="hit")
+        return [
+            (doc_id, score, self._chunks[index, doc_id].source)
+            for doc_id, score in zip(entry.ids, entry.scores)
+        ]
+
+    def put(self, key: CacheKey, generation: Optional[int], hits: List[CachedHit]) -> None:
+        index = key[0]
+        if not self._is_current(index, generation):
+            return
+
+        if key in self._entries:
+            self._release(index, self._entries.pop(key))
+        for doc_id, _, source in hits:
+            chunk = self._chunks.get((index, doc_id))
+            if chunk is None:
+                chunk = self._chunks[index, doc_id] = _Chunk(source)
+            chunk.refs += 1
+
+        self._entries[key] = _Entry(
+            ids=tuple(doc_id for doc_id, _, _ in hits),
+            scores=array("d", (score for _, score, _ in hits)),
+        )
+        while len(self._entries) > self.max_entries:
+            old_key, old_entry = self._entries.popitem(last=False)
+            self._release(old_key[0], old_entry)
+
+    def invalidate(self, index: str) -> int:
+        """index 의 항목과 chunk 본문을 모두 버리고 버린 항목 수를 반환한다."""
+        keys = [key for key in self._entries if key[0] == index]
+        for key in keys:
+            del self._entries[key]
+        for chunk_key in [chunk_key for chunk_key in self._chunks if chunk_key[0] == index]:
+            del self._chunks[chunk_key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._chunks.clear()
+        self._generations.clear()
+
+    def _is_current(self, index: str, generation: Optional[int]) -> bool:
+        state = self._generations.get(index)
+        return generation is not None and state is not None and state[0] == generation
+
+    def _release(self, index: str, entry: _Entry) -> None:
+        for doc_id in entry.ids:
+            chunk = self._chunks[index, doc_id]
+            chunk.refs -= 1
+            if chunk.refs == 0:
+                del self._chunks[index, doc_id]
+
+
+_cache: Optional[RetrievalResultCache] = None
+
+
+def get_result_cache() -> Optional[RetrievalResultCache]:
+    """process 공유 cache. RETRIEVAL_CACHE_ENABLED 가 false 이면 None."""
+    global _cache
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = RetrievalResultCache()
+    return _cache
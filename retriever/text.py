@@ -0,0 +1,13 @@
+"""
+검색, rerank, routing 이 같이 쓰는 가벼운 text 처리.
+"""
+import re
+
+from typing import List
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """소문자로 바꾸고 단어 문자 (한글 포함) 연속 구간으로 나눈다."""
+    return _TOKEN_PATTERN.findall(text.lower())
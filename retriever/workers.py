@@ -1,10 +1,180 @@
-from typing import Any
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import PydanticOutputParser
+import os
+import logging
+
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from retriever.es_client import get_async_es_client
+from retriever.fusion import RankedHits, alpha_fusion, rrf_fusion
+from retriever.result_cache import CachedHit, RetrievalResultCache, read_index_generation
+from telemetry import span
+
+if TYPE_CHECKING:
+    from elasticsearch import AsyncElasticsearch
+
+logger = logging.getLogger(__name__)
+
+# intent -> Elasticsearch index
+INTENT_INDEX_MAP = {
+    "HR": os.getenv("HR_INDEX", "omni-agent-hr"),
+    "WIKI": os.getenv("WIKI_INDEX", "omni-agent-wiki"),
+}
+
+# intent 분류 prompt (rag_agent_classify_intent) 의 label 중 index 가 따로 없는 것 -> 대신 검색할 intent
+INTENT_ALIASES = {
+    "LAW": "HR",
+    "FINANCE": "HR",
+    "IT": "WIKI",
+}
+# 분류 결과를 알 수 없을 때 검색할 intent
+DEFAULT_RETRIEVER_INTENT = os.getenv("DEFAULT_RETRIEVER_INTENT", "WIKI").upper()
+
+# index document 구조: {"text": str, "vector": List[float], "metadata": dict}
+TEXT_FIELD = "text"
+VECTOR_FIELD = "vector"
+METADATA_FIELD = "metadata"
+
+
+def resolve_intent(label: str) -> str:
+    """
+    intent 분류 LLM 의 출력 (``LAW``, ``"hr"``, ``Wiki.`` 등) 을 INTENT_INDEX_MAP 의 intent 로 바꾼다.
+    index 가 없는 label 은 INTENT_ALIASES 로, 알 수 없는 label 은 DEFAULT_RETRIEVER_INTENT 로 보낸다.
+    """
+    intent = label.strip().strip("\"'`.[] ").upper()
+    intent = INTENT_ALIASES.get(intent, intent)
+    if intent in INTENT_INDEX_MAP:
+        return intent
+
+    logger.warning(f"[Worker] Unknown retriever intent '{label}', falling back to '{DEFAULT_RETRIEVER_INTENT}'")
+    return DEFAULT_RETRIEVER_INTENT
+
+
+def resolve_index(intent: str) -> str:
+    try:
+        return INTENT_INDEX_MAP[intent.strip().upper()]
+    except KeyError:
+        raise ValueError(f"Unknown retriever intent '{intent}'. Available: {', '.join(INTENT_INDEX_MAP)}") from None
+
 
 class Worker:
-    def __init__(self, intent: str) -> None:
+    """
+    BM25 와 kNN 검색을 한 번의 ``_msearch`` 로 보내고, 두 결과를 alpha 가중합 또는 RRF 로 합치는 hybrid retriever.
+
+    alpha 는 vector 검색 비중이다. 1 이면 vector 검색만, 0 이면 keyword 검색만 수행한다.
+    es_client 에는 같은 ``msearch`` 를 구현한 ``retriever.local_index.LocalIndexClient`` 를 넣을 수도 있다.
+    result_cache 가 주어지면 같은 (query, topk, alpha) 검색은 index generation 이 바뀔 때까지 embedding 과 검색 없이 돌려준다.
+    """
+    def __init__(
+        self,
+        intent: str,
+        es_client: Optional["AsyncElasticsearch"] = None,
+        embeddings: Optional[Embeddings] = None,
+        fusion: Literal["alpha", "rrf"] = "alpha",
+        num_candidates_factor: int = 10,
+        result_cache: Optional[RetrievalResultCache] = None,
+    ) -> None:
         self.intent = intent
+        self.index_name = resolve_index(intent)
+        self.fusion = fusion
+        self.num_candidates_factor = num_candidates_factor
+        self.result_cache = result_cache
+        self._es_client = es_client
+        self._embeddings = embeddings
+
+    @property
+    def es_client(self) -> "AsyncElasticsearch":
+        if self._es_client is None:
+            self._es_client = get_async_es_client()
+        return self._es_client
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            from models.embedding import emb
+            self._embeddings = emb
+        return self._embeddings
+
+    async def warmup(self) -> None:
+        """검색에 필요한 embedding model 과 ES connection pool 을 첫 요청 전에 준비한다."""
+        _ = self.embeddings
+        if not await self.es_client.ping():
+            logger.warning(f"[Worker] Elasticsearch is not reachable for index '{self.index_name}'")
+
+    async def index_generation(self) -> int:
+        return await read_index_generation(self.es_client, self.index_name)
+
+    async def __call__(self, query: str, topk: int = 10, alpha: float = 0.75) -> List[Document]:
+        alpha = min(max(alpha, 0.0), 1.0)
+        if self.result_cache is None:
+            hits = await self._search(query, topk, alpha)
+        else:
+            key = self.result_cache.make_key(self.index_name, query, topk, alpha)
+            generation = await self.result_cache.current_generation(self.index_name, self.index_generation)
+            hits = self.result_cache.get(key, generation)
+            if hits is None:
+                hits = await self._search(query, topk, alpha)
+                self.result_cache.put(key, generation, hits)
+
+        return [self._to_document(doc_id, score, source) for doc_id, score, source in hits]
+
+    async def _search(self, query: str, topk: int, alpha: float) -> List[CachedHit]:
+        use_keyword = alpha < 1.0
+        use_vector = alpha > 0.0
+
+        searches: List[Dict[str, Any]] = []
+        if use_keyword:
+            searches += [{"index": self.index_name}, self._keyword_query(query, topk)]
+        if use_vector:
+            query_vector = await self.embeddings.aembed_query(query)
+            searches += [{"index": self.index_name}, self._vector_query(query_vector, topk)]
+
+        async with span("es", self.index_name, searches=len(searches) // 2):
+            response = await self.es_client.msearch(searches=searches)
+        responses = iter(response["responses"])
+
+        sources: Dict[str, Dict[str, Any]] = {}
+        keyword_hits = self._parse_hits(next(responses), sources) if use_keyword else []
+        vector_hits = self._parse_hits(next(responses), sources) if use_vector else []
+
+        if self.fusion == "rrf":
+            fused = rrf_fusion(keyword_hits, vector_hits, alpha)
+        else:
+            fused = alpha_fusion(keyword_hits, vector_hits, alpha)
+
+        return [(doc_id, score, sources[doc_id]) for doc_id, score in fused[:topk]]
+
+    def _keyword_query(self, query: str, topk: int) -> Dict[str, Any]:
+        return {
+            "size": topk,
+            "query": {"match": {TEXT_FIELD: query}},
+            "_source": {"excludes": [VECTOR_FIELD]},
+        }
+
+    def _vector_query(self, query_vector: List[float], topk: int) -> Dict[str, Any]:
+        return {
+            "size": topk,
+            "knn": {
+                "field": VECTOR_FIELD,
+                "query_vector": query_vector,
+                "k": topk,
+                "num_candidates": topk * self.num_candidates_factor,
+            },
+            "_source": {"excludes": [VECTOR_FIELD]},
+        }
+
+    def _parse_hits(self, result: Dict[str, Any], sources: Dict[str, Dict[str, Any]]) -> RankedHits:
+        if "error" in result:
+            raise RuntimeError(f"Search on '{self.index_name}' failed: {result['error']}")
+
+        hits = []
+        for hit in result["hits"]["hits"]:
+            sources[hit["_id"]] = hit["_source"]
+            hits.append((hit["_id"], hit["_score"]))
+        return hits
 
-    async def __call__(self, *args: Any, **kwds: Any) -> Any:
-        pass
+    def _to_document(self, doc_id: str, score: float, source: Dict[str, Any]) -> Document:
+        metadata = dict(source.get(METADATA_FIELD) or {})
+        metadata.update({"id": doc_id, "index": self.index_name, "score": score})
+        return Document(id=doc_id, page_content=source.get(TEXT_FIELD, ""), metadata=metadata)
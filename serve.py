@@ -0,0 +1,283 @@
+"""
+app 을 N 개의 worker process 로 띄우는 prefork launcher.
+
+부모 process 가 app 을 import 하고 ``preload`` 로 graph compile, prompt, read-only index 를 미리 읽은 뒤
+listen socket 을 열고 fork 한다. worker 는 부모의 memory 를 copy-on-write 로 공유하므로 process 수만큼 늘지 않고,
+``gc.freeze()`` 로 preload 된 객체를 GC 대상에서 빼서 GC 가 shared page 를 건드리지 않게 한다.
+부모는 요청을 받지 않고 worker 를 감시만 한다. 죽은 worker 는 ``WORKER_RESTART_DELAY`` 초 뒤 다시 띄우고, 연달아 죽으면
+대기 시간을 두 배씩 ``WORKER_RESTART_MAX_DELAY`` 초까지 늘린다. SIGTERM/SIGINT 를 받으면 worker 에 SIGTERM 을 보내
+진행 중인 stream 을 ``GRACEFUL_SHUTDOWN_TIMEOUT`` 초까지 기다린다. uvicorn 은 SIGTERM 을 받자마자 listen socket 과
+idle keep-alive 연결을 닫으므로, 종료 중인 worker 는 /health 요청을 받지 않는다.
+
+부모는 pool directory (``$TMPDIR/omni-serve-<pid>``) 의 status 파일에 worker 별 pid, 재시작 횟수, 마지막 exit code 를
+쓰고, 어느 worker 의 /health 든 ``pool_status`` 로 전체 worker 상태를 보여준다. 요청은 아무 worker 에나 가므로 process 별
+상태는 이렇게 합친다.
+
+- /metrics: worker 마다 자기 metric snapshot 을 pool directory 에 쓰고 (``metrics_path``), 요청을 받은 worker 가
+  실행 중인 모든 worker 의 것을 ``worker`` label 을 붙여 합친다.
+- admission 한도: worker 마다 설정값을 worker 수로 나눈 만큼만 쓴다 (``admission.share_limits``). AIMD 조절은 worker 별이다.
+- response cache, single-flight, /admission/stats, /router/stats 는 worker 별이다.
+
+fork 전에는 event loop, socket connection, thread 를 만들면 안 된다. HTTP/ES client 와 SQLite connection 은
+worker 안에서 처음 쓸 때 만들어진다.
+
+    WORKERS=4 python main.py
+
+Environment variables:
+    WORKERS                    -> worker process 수 (default 1, 0 이면 CPU core 수)
+    GRACEFUL_SHUTDOWN_TIMEOUT  -> 종료 시 진행 중인 요청을 기다리는 초 (default 30)
+    WORKER_RESTART_DELAY       -> 죽은 worker 를 다시 띄우기 전 대기 초 (default 1)
+    WORKER_RESTART_MAX_DELAY   -> 연달아 죽을 때 늘어나는 대기 시간의 상한 초 (default 60)
+"""
+import os
+import gc
+import json
+import time
+import shutil
+import signal
+import socket
+import logging
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+GRACEFUL_SHUTDOWN_TIMEOUT = float(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+WORKER_RESTART_MAX_DELAY = float(os.getenv("WORKER_RESTART_MAX_DELAY", "60"))
+# 이보다 오래 살아 있던 worker 가 죽으면 backoff 를 처음부터 다시 센다
+WORKER_STABLE_SECONDS = 60.0
+
+
+def worker_count() -> int:
+    workers = int(os.getenv("WORKERS", "1"))
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+@dataclass
+class WorkerInfo:
+    worker_id: int
+    started_at: float
+    server: Optional[uvicorn.Server] = None
+    # 같은 pool 의 worker 수
+    workers: int = 1
+
+
+@dataclass
+class WorkerStatus:
+    """supervisor 가 status 파일에 쓰는 worker 하나의 상태."""
+    worker_id: int
+    pid: Optional[int] = None
+    # "running" 또는 "restarting"
+    state: str = "running"
+    started_at: float = 0.0
+    restarts: int = 0
+    # 연달아 죽은 횟수. backoff 계산에 쓴다
+    failures: int = 0
+    last_exit_code: Optional[int] = None
+    restart_at: Optional[float] = None
+
+
+# serve() 밖 (uvicorn CLI 등) 에서 app 을 띄우면 worker 0 으로 보인다
+_worker = WorkerInfo(worker_id=0, started_at=time.time())
+# Supervisor 가 fork 전에 정한다. worker 는 여기서 전체 worker 상태와 다른 worker 의 metric 을 읽는다
+_pool_dir: Optional[Path] = None
+
+
+def current_worker() -> WorkerInfo:
+    return _worker
+
+
+def pool_dir() -> Optional[Path]:
+    """여러 worker 로 띄웠을 때 worker 들이 상태를 주고받는 directory. 한 process 면 None."""
+    return _pool_dir
+
+
+def metrics_path(worker_id: int) -> Optional[Path]:
+    """worker 가 자기 metric snapshot 을 쓰는 파일. 한 process 면 None."""
+    return _pool_dir / f"metrics-{worker_id}.json" if _pool_dir is not None else None
+
+
+def pool_status() -> Optional[List[Dict[str, Any]]]:
+    """supervisor 가 쓴 worker 별 상태. 한 process 로 띄웠거나 읽지 못하면 None."""
+    if _pool_dir is None:
+        return None
+    try:
+        return json.loads((_pool_dir / "status.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app: Any, sock: socket.socket, worker_id: int, config: Dict[str, Any], workers: int = 1) -> None:
+    global _worker
+    server = uvicorn.Server(uvicorn.Config(app, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT, **config))
+    _worker = WorkerInfo(worker_id=worker_id, started_at=time.time(), server=server, workers=workers)
+    # uvicorn 이 SIGTERM/SIGINT 를 받으면 새 연결을 멈추고 진행 중인 요청을 기다린 뒤 lifespan shutdown 을 실행한다
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+    """worker process 를 fork 하고, 죽으면 다시 띄우고, 종료 signal 을 worker 에 전달한다."""
+    def __init__(self, app: Any, sock: socket.socket, workers: int, config: Dict[str, Any]) -> None:
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.config = config
+
+        # pid -> worker_id
+        self._children: Dict[int, int] = {}
+        self._status = {worker_id: WorkerStatus(worker_id) for worker_id in range(workers)}
+        # worker_id -> 다시 띄울 시각
+        self._restarts: Dict[int, float] = {}
+        self._stopping = False
+        self.pool_dir = Path(os.getenv("TMPDIR", "/tmp")) / f"omni-serve-{os.getpid()}"
+        self.status_path = self.pool_dir / "status.json"
+
+    def run(self) -> None:
+        global _pool_dir
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+        _pool_dir = self.pool_dir
+
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        self._write_status()
+        logger.info(f"[serve] Started {self.workers} workers on {self.sock.getsockname()}")
+
+        while not self._stopping:
+            self._reap()
+            now = time.monotonic()
+            for worker_id, due in list(self._restarts.items()):
+                if due <= now:
+                    del self._restarts[worker_id]
+                    self._spawn(worker_id)
+                    self._write_status()
+            time.sleep(0.2)
+
+        self._shutdown()
+
+    def _handle_exit(self, signum: int, frame: Any) -> None:
+        self._stopping = True
+
+    def _spawn(self, worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(self.app, self.sock, worker_id, self.config, workers=self.workers)
+            except BaseException:
+                logger.exception(f"[serve] Worker {worker_id} crashed")
+                code = 1
+            finally:
+                # 부모에서 물려받은 atexit handler 와 buffer 를 다시 실행하지 않는다
+                os._exit(code)
+
+        self._children[pid] = worker_id
+        status = self._status[worker_id]
+        status.pid = pid
+        status.state = "running"
+        status.started_at = time.time()
+        status.restart_at = None
+
+    def _reap(self) -> None:
+        while self._children:
+            pid, wait_status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            worker_id = self._children.pop(pid, None)
+            if worker_id is None or self._stopping:
+                continue
+
+            status = self._status[worker_id]
+            status.last_exit_code = os.waitstatus_to_exitcode(wait_status)
+            status.failures = 1 if time.time() - status.started_at >= WORKER_STABLE_SECONDS else status.failures + 1
+            delay = min(WORKER_RESTART_MAX_DELAY, WORKER_RESTART_DELAY * 2 ** (status.failures - 1))
+            logger.warning(
+                f"[serve] Worker {worker_id} (pid {pid}) exited with code {status.last_exit_code}, "
+                f"restarting in {delay:g}s (failure {status.failures} in a row)"
+            )
+            status.pid = None
+            status.state = "restarting"
+            status.restarts += 1
+            status.restart_at = time.time() + delay
+            self._restarts[worker_id] = time.monotonic() + delay
+            self._write_status()
+
+    def _write_status(self) -> None:
+        tmp_path = self.status_path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps([asdict(status) for status in self._status.values()]), encoding="utf-8")
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.warning(f"[serve] Could not write worker status to {self.status_path}: {e}")
+
+    def _shutdown(self) -> None:
+        logger.info(f"[serve] Draining {len(self._children)} workers")
+        for pid in self._children:
+            self._signal(pid, signal.SIGTERM)
+
+        # uvicorn 의 graceful timeout 뒤 lifespan shutdown 까지 기다리고, 그래도 남아 있으면 강제로 끝낸다
+        deadline = time.monotonic() + GRACEFUL_SHUTDOWN_TIMEOUT + 5.0
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        for pid in self._children:
+            logger.warning(f"[serve] Killing worker pid {pid} after graceful timeout")
+            self._signal(pid, signal.SIGKILL)
+        for pid in list(self._children):
+            os.waitpid(pid, 0)
+        self._children.clear()
+        self.sock.close()
+        shutil.rmtree(self.pool_dir, ignore_errors=True)
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def serve(
+    app: Any,
+    host: str = "0.0.0.0",
+    port: int = 8888,
+    workers: Optional[int] = None,
+    preload: Optional[Callable[[], None]] = None,
+    **config: Any,
+) -> None:
+    """
+    ``preload`` 를 부모 process 에서 실행한 뒤 ``workers`` 개의 process 로 app 을 띄운다.
+    ``config`` 는 ``uvicorn.Config`` 에 그대로 전달한다 (log_level 등).
+    """
+    workers = worker_count() if workers is None else workers
+    if preload is not None:
+        preload()
+
+    sock = bind_socket(host, port)
+    if workers <= 1:
+        _run_worker(app, sock, 0, config)
+        return
+
+    # preload 된 객체를 GC 대상에서 빼서, worker 의 GC 가 refcount 외에는 shared page 를 쓰지 않게 한다
+    gc.collect()
+    gc.freeze()
+    Supervisor(app, sock, workers, config).run()
@@ -0,0 +1,543 @@
+"""
+대화 session 저장소. LangGraph checkpointer 와 검색 문서 저장소를 하나의 local SQLite 파일로 제공한다.
+
+- checkpoint 는 session (= LangGraph thread) 마다 최신 것 하나만 남긴다. 이전 turn 의 상태는 최신 checkpoint 에 누적되어 있다.
+- 검색된 Document 는 (index, id) 마다 한 번만 저장하고, graph state 에는 ``DocRef`` 만 둔다.
+  follow-up turn 은 이 참조로 문서를 다시 읽으므로 Elasticsearch 를 다시 부르지 않는다.
+- session 이 ``ttl`` 초 동안 쓰이지 않았거나, session 수가 ``max_sessions`` 를 넘거나,
+  저장된 크기가 ``max_bytes`` 를 넘으면 오래된 session 부터 지운다. 어느 session 도 참조하지 않는 문서도 함께 지운다.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import logging
+import threading
+
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+from langgraph_scripts.graph_state import DocRef
+from telemetry import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+SESSION_EVICTIONS = registry.register(Counter(
+    "omni_session_evictions_total",
+    "Sessions removed from the session store by reason (ttl, count, size).",
+    ["reason"]
+))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+CREATE TABLE IF NOT EXISTS documents (
+    doc_key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_documents (
+    thread_id TEXT NOT NULL,
+    doc_key TEXT NOT NULL,
+    PRIMARY KEY (thread_id, doc_key)
+);
+CREATE INDEX IF NOT EXISTS session_documents_doc_key ON session_documents (doc_key);
+"""
+
+
+def document_ref(doc: Document) -> DocRef:
+    """Document 를 state 에 남길 참조로 바꾼다. id 가 없는 문서는 본문 hash 를 id 로 쓴다."""
+    doc_id = doc.id or doc.metadata.get("id") or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+    return {
+        "id": str(doc_id),
+        "index": str(doc.metadata.get("index", "")),
+        "score": float(doc.metadata.get("score", 0.0)),
+    }
+
+
+def _doc_key(ref: DocRef) -> str:
+    return f"{ref['index']}/{ref['id']}"
+
+
+class SessionStore(BaseCheckpointSaver):
+    """
+    SQLite 기반 LangGraph checkpointer 겸 session 문서 저장소.
+
+    connection 하나를 lock 으로 보호하고, async method 는 thread 에서 실행해 event loop 를 막지 않는다.
+    WAL mode 라서 같은 파일을 여는 다른 process 와도 함께 쓸 수 있다.
+    connection 은 처음 쓸 때 열고, fork 된 process 에서는 새로 연다 (SQLite connection 은 fork 를 넘어 쓸 수 없다).
+    """
+    def __init__(
+        self,
+        path: str = "sessions.sqlite3",
+        max_bytes: int = 256 * 1024 * 1024,
+        max_sessions: int = 10000,
+        ttl: float = 86400.0,
+        cache_kb: int = 8192,
+        eviction_interval: float = 30.0,
+        **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.eviction_interval = eviction_interval
+        self.cache_kb = cache_kb
+        self._last_eviction = 0.0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["SessionStore"]:
+        if os.getenv("SESSIONS_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+
+        return cls(
+            path=os.getenv("SESSION_DB_PATH", "sessions.sqlite3"),
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+            ttl=float(os.getenv("SESSION_TTL", "86400")),
+            cache_kb=int(os.getenv("SESSION_CACHE_KB", "8192")),
+            eviction_interval=float(os.getenv("SESSION_EVICTION_INTERVAL", "30")),
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                yield conn
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # auto_vacuum 은 table 을 만들기 전에 정해야 한다. 지운 session 의 page 는 incremental_vacuum 으로 돌려준다
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        # page cache 가 쓰는 memory 상한 (음수는 KiB 단위)
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_kb)}")
+        with conn:
+            conn.executescript(_SCHEMA)
+
+        self._conn, self._pid = conn, os.getpid()
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    # ---- checkpointer ----
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        with self._transaction() as conn:
+            if checkpoint_id:
+                row = conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                return None
+
+            writes = conn.execute(
+                "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, row[0])
+            ).fetchall()
+
+        return self._to_tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                f"FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+
+        count = 0
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and count >= limit:
+                return
+            with self._transaction() as conn:
+                writes = conn.execute(
+                    "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, row[0])
+                ).fetchall()
+
+            checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, row, writes)
+            if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            count += 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 checkpoint_type, serialized, metadata_type, serialized_metadata)
+            )
+            # checkpoint 에는 모든 channel 값이 들어 있으므로 이전 checkpoint 와 그 writes 는 필요 없다
+            conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                (thread_id, checkpoint_ns, checkpoint["id"])
+            )
+            self._touch(conn, thread_id)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        # 특수 channel (error, interrupt 등) 은 덮어쓰고, 일반 write 는 처음 저장한 것을 유지한다
+        replaced, kept = [], []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, serialized = self.serde.dumps_typed(value)
+            row = (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                   channel, value_type, serialized, task_path)
+            (replaced if channel in WRITES_IDX_MAP else kept).append(row)
+
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", replaced)
+            conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", kept)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._transaction() as conn:
+            self._delete_sessions(conn, [thread_id])
+            self._delete_orphan_documents(conn)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: Sequence[Any], writes: List[Sequence[Any]]) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = sorted(writes, key=lambda write: writes_sort_key(write[5], write[0], write[1]))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, _, channel, value_type, value, _ in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    # ---- 검색 문서 ----
+
+    def store_documents(self, thread_id: str, documents: Sequence[Document]) -> List[DocRef]:
+        refs = [document_ref(doc) for doc in documents]
+        rows = []
+        for ref, doc in zip(refs, documents):
+            # score 는 질의마다 다르므로 DocRef 에만 둔다
+            metadata = json.dumps({key: value for key, value in doc.metadata.items() if key != "score"},
+                                  ensure_ascii=False, default=str)
+            rows.append((_doc_key(ref), doc.page_content, metadata, len(doc.page_content.encode("utf-8")) + len(metadata)))
+
+        with self._transaction() as conn:
+            # chunk ID 는 위치 기반이라 재적재 후에도 같으므로, 방금 검색된 본문으로 덮어쓴다
+            conn.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?) ON CONFLICT(doc_key) DO UPDATE SET "
+                "content = excluded.content, metadata = excluded.metadata, bytes = excluded.bytes",
+                rows
+            )
+            # checkpoint 를 저장하기 전에 실패한 session 의 문서도 eviction 대상이 되도록 session 을 먼저 등록한다
+            conn.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, 0)", (thread_id, time.time()))
+            conn.executemany(
+                "INSERT OR IGNORE INTO session_documents VALUES (?, ?)",
+                [(thread_id, row[0]) for row in rows]
+            )
+        return refs
+
+    def load_documents(self, refs: Sequence[DocRef]) -> Optional[List[Document]]:
+        """참조한 문서를 순서대로 반환한다. 하나라도 지워졌으면 None."""
+        keys = [_doc_key(ref) for ref in refs]
+        if not keys:
+            return []
+
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT doc_key, content, metadata FROM documents WHERE doc_key IN ({', '.join('?' * len(keys))})",
+                keys
+            ).fetchall()
+
+        found = {doc_key: (content, metadata) for doc_key, content, metadata in rows}
+        if len(found) < len(set(keys)):
+            return None
+
+        documents = []
+        for key, ref in zip(keys, refs):
+            content, metadata = found[key]
+            documents.append(Document(id=ref["id"], page_content=content, metadata={**json.loads(metadata), "score": ref["score"]}))
+        return documents
+
+    async def astore_documents(self, thread_id: str, documents: Sequence[Document]) -> List[DocRef]:
+        return await asyncio.to_thread(self.store_documents, thread_id, documents)
+
+    async def aload_documents(self, refs: Sequence[DocRef]) -> Optional[List[Document]]:
+        return await asyncio.to_thread(self.load_documents, refs)
+
+    # ---- eviction ----
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """ttl, session 수, 저장 크기 상한을 넘는 오래된 session 을 지우고, 지운 session 수를 반환한다."""
+        now = time.time() if now is None else now
+        evicted = 0
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT thread_id FROM sessions WHERE updated_at < ?", (now - self.ttl,)
+            )]
+            evicted += self._evict(conn, expired, "ttl")
+
+            (count,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            if count > self.max_sessions:
+                oldest = [row[0] for row in conn.execute(
+                    "SELECT thread_id FROM sessions ORDER BY updated_at LIMIT ?", (count - self.max_sessions,)
+                )]
+                evicted += self._evict(conn, oldest, "count")
+
+            self._delete_orphan_documents(conn)
+            excess = self._total_bytes(conn) - self.max_bytes
+            while excess > 0:
+                # 지울 session 의 크기 합이 초과분을 넘을 때까지 오래된 것부터 고른다. session 크기에는 checkpoint 와
+                # 참조하는 문서가 들어간다. 공유 문서는 참조하는 session 마다 세므로 크게 잡히고, 지운 뒤에 다시 계산한다
+                victims, freed = [], 0
+                for thread_id, size in conn.execute(
+                    "SELECT s.thread_id, s.bytes + COALESCE(SUM(d.bytes), 0) FROM sessions s "
+                    "LEFT JOIN session_documents sd ON sd.thread_id = s.thread_id "
+                    "LEFT JOIN documents d ON d.doc_key = sd.doc_key "
+                    "GROUP BY s.thread_id ORDER BY s.updated_at"
+                ):
+                    victims.append(thread_id)
+                    freed += size
+                    if freed >= excess:
+                        break
+                if not victims:
+                    break
+
+                evicted += self._evict(conn, victims, "size")
+                self._delete_orphan_documents(conn)
+                excess = self._total_bytes(conn) - self.max_bytes
+
+        if evicted:
+            with self._lock:
+                self._connection().execute("PRAGMA incremental_vacuum")
+            logger.info(f"[SessionStore] Evicted {evicted} sessions")
+        return evicted
+
+    async def maybe_evict(self) -> int:
+        """마지막 eviction 후 ``eviction_interval`` 초가 지났을 때만 evict 한다."""
+        now = time.time()
+        if now - self._last_eviction < self.eviction_interval:
+            return 0
+        self._last_eviction = now
+        return await asyncio.to_thread(self.evict, now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            (sessions,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            (documents,) = conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            total_bytes = self._total_bytes(conn)
+        return {
+            "sessions": sessions,
+            "documents": documents,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+        }
+
+    def _touch(self, conn: sqlite3.Connection, thread_id: str) -> None:
+        (size,) = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints WHERE thread_id = ?",
+            (thread_id,)
+        ).fetchone()
+        (writes_size,) = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (thread_id, time.time(), size + writes_size)
+        )
+
+    def _evict(self, conn: sqlite3.Connection, thread_ids: List[str], reason: str) -> int:
+        if thread_ids:
+            self._delete_sessions(conn, thread_ids)
+            SESSION_EVICTIONS.inc(len(thread_ids), reason=reason)
+        return len(thread_ids)
+
+    def _delete_sessions(self, conn: sqlite3.Connection, thread_ids: List[str]) -> None:
+        rows = [(thread_id,) for thread_id in thread_ids]
+        for table in ("checkpoints", "writes", "session_documents", "sessions"):
+            conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", rows)
+
+    def _delete_orphan_documents(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM documents WHERE doc_key NOT IN (SELECT doc_key FROM session_documents)")
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        (session_bytes,) = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+        (document_bytes,) = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM documents").fetchone()
+        return session_bytes + document_bytes
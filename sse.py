@@ -0,0 +1,234 @@
+"""
+``/search/`` 의 SSE frame encoder.
+
+event 를 bytes frame 으로 만들어 보내고, ``stream`` event (답변 token) 는 바로 보내지 않고 모아서 한 frame 으로 보낸다.
+첫 token 과 ``stream`` 이 아닌 event 는 바로 보내고, 이후 token 은 ``SSE_COALESCE_MS`` 가 지나거나
+``SSE_COALESCE_BYTES`` 만큼 쌓이면 ``{"data": "<이어붙인 token>"}`` 하나로 보낸다. token 마다 하던 JSON encoding 과
+socket write 가 flush 마다 한 번으로 줄어든다. client 는 지금처럼 ``data`` 를 이어붙이면 된다.
+
+보낼 것이 없는 동안에는 ``SSE_HEARTBEAT_INTERVAL`` 초마다 comment (``: ping``) 를 보내서 proxy 가 idle stream 을 끊지 않게 한다.
+``orjson`` 이 설치되어 있으면 (``pip install omni-agent[orjson]``) JSON encoding 에 쓴다.
+
+Environment variables:
+    SSE_COALESCE_MS           -> token 을 모으는 최대 시간 ms (default 15, 0 이면 event loop 가 한 바퀴 도는 동안 쌓인 것만 모은다)
+    SSE_COALESCE_BYTES        -> 이만큼 쌓이면 시간과 관계없이 보낸다 (default 1024)
+    SSE_MAX_BUFFERED_BYTES    -> client 가 느릴 때 보내지 못하고 쌓아두는 상한. 넘으면 graph 쪽 읽기를 멈춘다 (default 65536)
+    SSE_HEARTBEAT_INTERVAL    -> heartbeat 간격 초 (default 15, 0 이면 보내지 않는다)
+    SSE_ORJSON_ENABLED        -> "false" 이면 orjson 이 있어도 json 모듈을 쓴다
+"""
+import os
+import json
+import asyncio
+
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "15"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+SSE_MAX_BUFFERED_BYTES = int(os.getenv("SSE_MAX_BUFFERED_BYTES", "65536"))
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+SSE_ORJSON_ENABLED = os.getenv("SSE_ORJSON_ENABLED", "true").lower() in ("1", "true", "yes")
+
+HEARTBEAT = b": ping\n\n"
+
+# (event type, data)
+SSEEvent = Tuple[str, Dict[str, Any]]
+
+
+def _json_encoder() -> Callable[[Any], bytes]:
+    if SSE_ORJSON_ENABLED:
+        try:
+            import orjson
+            return orjson.dumps
+        except ImportError:
+            pass
+
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    return lambda data: encoder.encode(data).encode("utf-8")
+
+
+dumps_json = _json_encoder()
+
+
+def encode_event(type: str, data: Dict[str, Any]) -> bytes:
+    return b"event: " + type.encode("ascii") + b"\ndata: " + dumps_json(data) + b"\n\n"
+
+
+class _FrameBuffer:
+    """
+    pump task 가 채우고 SSEWriter.frames 가 비우는 보낼 frame 들.
+
+    token 은 list 에 쌓기만 하고, 비어 있던 buffer 에 처음 들어올 때 flush timer 하나를 건다.
+    frames 쪽은 flush 할 때만 깨어나므로 token 수가 아니라 flush 수만큼만 비용이 든다.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, coalesce_seconds: float, coalesce_bytes: int) -> None:
+        self.loop = loop
+        self.coalesce_seconds = coalesce_seconds
+        self.coalesce_bytes = coalesce_bytes
+
+        self.frames: List[bytes] = []
+        self.tokens: List[str] = []
+        self.size = 0
+        # 지금 보낼 것이 있다 (flush timer 가 지났거나, 바로 보내야 하는 event 가 들어왔다)
+        self.flush_due = False
+        self.sent_token = False
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # client 가 가져가서 buffer 가 비었다 (max_buffered_bytes 를 넘었을 때만 기다린다)
+        self.drained = asyncio.Event()
+
+        self._waiter: Optional[asyncio.Future] = None
+        self._flush_timer: Optional[asyncio.Handle] = None
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.frames or self.tokens)
+
+    def add_token(self, token: str) -> None:
+        self.tokens.append(token)
+        self.size += len(token.encode("utf-8"))
+        if not self.sent_token or self.size >= self.coalesce_bytes:
+            # 첫 token 은 ttft 를 늦추지 않도록 바로 보낸다
+            self._due()
+        elif self._flush_timer is None and not self.flush_due:
+            if self.coalesce_seconds > 0:
+                self._flush_timer = self.loop.call_later(self.coalesce_seconds, self._due)
+            else:
+                # 같은 loop iteration 에 들어온 token 까지 모아서 보낸다
+                self._flush_timer = self.loop.call_soon(self._due)
+
+    def add_frame(self, frame: bytes) -> None:
+        self._seal_tokens()
+        self.frames.append(frame)
+        self.size += len(frame)
+        self._due()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._due()
+
+    def take(self) -> bytes:
+        self._seal_tokens()
+        chunk = b"".join(self.frames)
+        self.frames.clear()
+        self.size = 0
+        self.flush_due = False
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self.drained.set()
+        return chunk
+
+    async def wait(self) -> None:
+        """flush 할 때가 되거나 wake() 가 불릴 때까지 기다린다."""
+        self._waiter = self.loop.create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+    def wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _due(self) -> None:
+        self._flush_timer = None
+        self.flush_due = True
+        self.wake()
+
+    def _seal_tokens(self) -> None:
+        if self.tokens:
+            self.frames.append(encode_event("stream", {"data": "".join(self.tokens)}))
+            self.tokens.clear()
+            self.sent_token = True
+
+
+class SSEWriter:
+    """
+    ``SSEEvent`` stream 을 SSE bytes frame stream 으로 바꾼다.
+
+    event 는 별도 task 가 읽어서 buffer 에 넣고, ``frames`` 는 flush 시점마다 buffer 를 한 번에 꺼내 보낸다.
+    client 가 느려서 buffer 가 ``max_buffered_bytes`` 를 넘으면 event 를 더 읽지 않으므로 graph 쪽 backpressure 는 유지된다.
+    ``frames`` generator 가 닫히면 event generator 도 닫힌다 (graph 실행 cancel).
+    """
+    def __init__(
+        self,
+        coalesce_ms: float = SSE_COALESCE_MS,
+        coalesce_bytes: int = SSE_COALESCE_BYTES,
+        max_buffered_bytes: int = SSE_MAX_BUFFERED_BYTES,
+        heartbeat_interval: float = SSE_HEARTBEAT_INTERVAL,
+    ) -> None:
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.coalesce_bytes = coalesce_bytes
+        self.max_buffered_bytes = max_buffered_bytes
+        self.heartbeat_interval = heartbeat_interval
+
+    async def frames(self, events: AsyncIterator[SSEEvent]) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        buffer = _FrameBuffer(loop, self.coalesce_seconds, self.coalesce_bytes)
+        pump = asyncio.create_task(self._pump(events, buffer))
+        last_sent = loop.time()
+        heartbeat = None
+
+        def check_heartbeat() -> None:
+            # flush 마다 timer 를 다시 걸지 않고, 마지막 전송 후 interval 이 지났는지만 확인한다
+            nonlocal heartbeat
+            delay = last_sent + self.heartbeat_interval - loop.time()
+            if delay > 0:
+                heartbeat = loop.call_later(delay, check_heartbeat)
+            else:
+                heartbeat = None
+                buffer.wake()
+
+        if self.heartbeat_interval > 0:
+            heartbeat = loop.call_later(self.heartbeat_interval, check_heartbeat)
+        try:
+            while True:
+                if not buffer.flush_due:
+                    await buffer.wait()
+
+                if buffer.flush_due:
+                    chunk = buffer.take()
+                    if chunk:
+                        yield chunk
+                else:
+                    # flush 가 아닌데 깨어났으면 heartbeat 시각이다
+                    yield HEARTBEAT
+                last_sent = loop.time()
+                if heartbeat is None and self.heartbeat_interval > 0:
+                    heartbeat = loop.call_later(self.heartbeat_interval, check_heartbeat)
+
+                if buffer.done and not buffer.pending:
+                    if buffer.error is not None:
+                        raise buffer.error
+                    return
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if not pump.done():
+                pump.cancel()
+            try:
+                await pump
+            except asyncio.CancelledError:
+                # pump 를 cancel 한 것이 아니라 이 task 자체가 cancel 된 경우에는 전파한다
+                if asyncio.current_task().cancelling():
+                    raise
+
+    async def _pump(self, events: AsyncIterator[SSEEvent], buffer: _FrameBuffer) -> None:
+        error = None
+        try:
+            async with aclosing(events):
+                async for type, data in events:
+                    if type == "stream":
+                        buffer.add_token(data["data"])
+                    else:
+                        buffer.add_frame(encode_event(type, data))
+
+                    if buffer.size >= self.max_buffered_bytes:
+                        buffer.drained.clear()
+                        await buffer.drained.wait()
+        except Exception as e:
+            error = e
+        finally:
+            buffer.finish(error)
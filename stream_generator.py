@@ -1,74 +1,412 @@
-import json
+import os
+import re
+import asyncio
 import time
+import weakref
 import logging
 
-from langchain_core.tools import Tool, StructuredTool
-from langchain_core.messages import AIMessageChunk
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tracers.stdout import ConsoleCallbackHandler
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
-from langgraph_scripts.graph_nodes import *
+from langgraph_scripts.graph_nodes import (
+    compact_session,
+    execute_tools,
+    generate_answer,
+    orchestrator,
+    pre_router,
+    route_after_pre_router,
+    route_after_tools,
+    should_continue,
+)
 from langgraph_scripts.graph_state import AgentState
+from langgraph_scripts.speculation import SpeculativeRetrieval
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from utils import ChatHistoryBuilder
+from sse import SSEEvent, SSEWriter
+from sessions import SessionStore
+from response_cache import CacheHit, ResponseCache, normalize_query
+from admission import AdmissionGate, AdmissionRejected, build_request_gate, is_rate_limited
+from telemetry import REQUEST_DURATION, REQUEST_TTFT, enable_debug_tracing
 
 logger = logging.getLogger(__name__)
 
+# orchestrator 호출과 동시에 원래 질의로 검색을 미리 시작한다 (LLM latency 와 검색 latency 를 겹친다)
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_INTENTS = [intent.strip() for intent in os.getenv("SPECULATIVE_INTENTS", "HR,wiki").split(",") if intent.strip()]
+
+_END_OF_STREAM = object()
+
+# cache 된 답변을 재생할 때 단어 (와 뒤따르는 공백) 단위로 나눠 보낸다
+_REPLAY_CHUNK = re.compile(r"\S+\s*|\s+")
+
+class _Flight:
+    """
+    하나의 graph 실행 결과를 여러 client 가 구독한다.
+    발생한 event 를 모두 보관하므로 늦게 구독한 client 도 처음부터 받는다.
+    """
+    def __init__(self) -> None:
+        self.events: List[SSEEvent] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def publish(self, event: SSEEvent) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def subscribe(self) -> AsyncIterator[SSEEvent]:
+        index = 0
+        while True:
+            if index < len(self.events):
+                yield self.events[index]
+                index += 1
+            elif self.done:
+                return
+            else:
+                await self._updated.wait()
+
+
 class StreamingService:
-    def __init__(self):
+    def __init__(
+        self,
+        max_buffered_chunks: int = 32,
+        response_cache: Optional[ResponseCache] = None,
+        coalesce_queries: bool = True,
+        admission: Optional[AdmissionGate] = None,
+        speculative_retrieval: Optional[bool] = None,
+        session_store: Optional[SessionStore] = None,
+        sse_writer: Optional[SSEWriter] = None
+    ):
+        # generate_answer node 와 SSE client 사이의 queue 크기.
+        # client 가 느리면 queue 가 차고, node 는 LLM stream 읽기를 멈춘다.
+        # single-flight 로 실행할 때는 event 를 _Flight 에 모아두므로 client 속도와 무관하게 진행된다.
+        self.max_buffered_chunks = max_buffered_chunks
+        self.coalesce_queries = coalesce_queries
+        # 정규화된 query -> 진행 중인 graph 실행
+        self._flights: Dict[str, _Flight] = {}
+        self.response_cache = response_cache if response_cache is not None else ResponseCache.from_env()
+        # graph 실행 (= LLM 호출을 하는 요청) 의 동시 실행 수를 제한한다. cache hit 과 single-flight 합류는 slot 을 쓰지 않는다
+        self.admission = admission if admission is not None else build_request_gate()
+        self.speculative_retrieval = SPECULATIVE_RETRIEVAL if speculative_retrieval is None else speculative_retrieval
         self.graph = self.compile_graph()
+        # session_id 가 있는 요청은 이전 turn 의 state 를 이어받는 checkpointer graph 로 실행한다
+        self.session_store = session_store if session_store is not None else SessionStore.from_env()
+        self.session_graph = self.compile_graph(self.session_store) if self.session_store is not None else None
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # token event 를 모아서 bytes frame 으로 보내고, idle stream 에는 heartbeat 를 보낸다
+        self.sse_writer = sse_writer if sse_writer is not None else SSEWriter()
+        # 응답을 막지 않도록 cache 저장은 background task 로 실행한다
+        self._background_tasks: set[asyncio.Task] = set()
         
-    def compile_graph(self) -> CompiledStateGraph:
+    def compile_graph(self, checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
         graph = StateGraph(AgentState)
 
         # Define nodes
+        graph.add_node("pre_router", pre_router)
         graph.add_node("orchestrator", orchestrator)
         graph.add_node("execute_tools", execute_tools)
         graph.add_node("generate_answer", generate_answer)
 
         # define edge
-        graph.set_entry_point("orchestrator")
+        # pre_router 가 확실한 질의는 orchestrator 를 건너뛰는 fast path 로 보낸다
+        graph.set_entry_point("pre_router")
+        graph.add_conditional_edges("pre_router", route_after_pre_router, {
+            "tool": "execute_tools",
+            "answer": "generate_answer",
+            "orchestrator": "orchestrator"
+        })
         graph.add_conditional_edges("orchestrator", should_continue, {
             "tool": "execute_tools",
             "next": "generate_answer"
         })
-        graph.add_edge("execute_tools", "orchestrator")
-        agent_graph = graph.compile()
+        graph.add_conditional_edges("execute_tools", route_after_tools, {
+            "answer": "generate_answer",
+            "orchestrator": "orchestrator"
+        })
+        if checkpointer is not None:
+            # session 에 저장하기 전에 검색 결과를 참조로 줄인다
+            graph.add_node("compact_session", compact_session)
+            graph.add_edge("generate_answer", "compact_session")
+            graph.add_edge("compact_session", END)
+        agent_graph = graph.compile(checkpointer=checkpointer)
 
         return agent_graph
     
-    async def stream_service(self, query: str):
+    def check_admission(self, query: str, session_id: Optional[str] = None) -> Optional[AdmissionRejected]:
+        """
+        queue 가 가득 차 있어 graph 를 실행할 수 없으면 AdmissionRejected 를 반환한다. (SSE 를 시작하기 전에 503 을 보내기 위함)
+        진행 중인 같은 질의에 합류할 수 있으면 거절하지 않는다.
+        """
+        if self.coalesce_queries and not self._uses_session(session_id) and normalize_query(query) in self._flights:
+            return None
+        if self.admission.is_saturated():
+            self.admission.rejected += 1
+            return AdmissionRejected(self.admission.name, "queue full", retry_after=self.admission.retry_after())
+        return None
+
+    async def stream_service(self, query: str, priority: int = 0, debug: bool = False, session_id: Optional[str] = None):
+        """
+        graph 를 background task 로 실행하고, generate_answer node 가 queue 에 넣는 token 을 바로 SSE 로 내보낸다.
+
+        client 연결이 끊겨 generator 가 닫히거나 cancel 되면 graph task 도 cancel 되어 upstream LLM 호출이 중단된다.
+        response cache 에 같은 (또는 충분히 비슷한) 질의의 답변이 있으면 graph 를 실행하지 않고 그 답변을 재생한다.
+
+        같은 (정규화된) 질의가 동시에 들어오면 graph 실행 하나를 공유한다 (single-flight).
+        늦게 합류한 client 는 이미 나간 token 부터 다시 받고, 모든 client 가 떠났을 때만 실행을 cancel 한다.
+
+        graph 실행은 admission gate 의 slot 을 받은 뒤에 시작한다. priority 가 높은 요청이 먼저 slot 을 받고,
+        queue 가 가득 차거나 deadline 안에 slot 을 받지 못하면 "busy" event 로 끝난다.
+
+        debug 가 켜진 요청은 자기 graph 를 따로 실행하고, 그 실행에서만 LangChain callback 과 span log 를 남긴다.
+
+        session_id 가 있으면 그 session 의 이전 turn 상태에 이어서 실행한다. 답변이 대화 맥락에 따라 달라지므로
+        response cache 와 single-flight 는 쓰지 않고, 같은 session 의 turn 은 하나씩 실행한다.
+        """
+        start_time = time.time()
+        if self._uses_session(session_id):
+            async with self._session_lock(session_id):
+                async with aclosing(self._emit(self._stream_graph(query, priority, debug, session_id), start_time)) as frames:
+                    async for frame in frames:
+                        yield frame
+            return
+
+        cache_hit = await self._lookup_cache(query)
+        if cache_hit is not None:
+            async with aclosing(self._emit(self._replay(cache_hit), start_time)) as frames:
+                async for frame in frames:
+                    yield frame
+            return
+
+        if debug or not self.coalesce_queries:
+            # generator 를 명시적으로 닫아야 client 가 떠났을 때 graph task 가 바로 cancel 된다
+            async with aclosing(self._emit(self._stream_graph(query, priority, debug), start_time)) as frames:
+                async for frame in frames:
+                    yield frame
+            return
+
+        key = normalize_query(query)
+        flight = self._flights.get(key)
+        joined = flight is not None and not flight.task.cancelling()
+        if not joined:
+            flight = self._start_flight(key, query, priority)
+
+        flight.subscribers += 1
+        try:
+            async with aclosing(self._emit(flight.subscribe(), start_time, coalesced=joined)) as frames:
+                async for frame in frames:
+                    yield frame
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _start_flight(self, key: str, query: str, priority: int) -> "_Flight":
+        flight = _Flight()
+        self._flights[key] = flight
+        flight.task = asyncio.create_task(self._run_flight(key, query, priority, flight))
+        return flight
+
+    async def _run_flight(self, key: str, query: str, priority: int, flight: "_Flight") -> None:
+        try:
+            async for event in self._stream_graph(query, priority):
+                flight.publish(event)
+        finally:
+            flight.close()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _emit(self, events: AsyncIterator[SSEEvent], start_time: float, **finished_extra) -> AsyncIterator[bytes]:
+        """event 를 SSE frame 으로 변환한다."""
+        return self.sse_writer.frames(self._timed(events, start_time, **finished_extra))
+
+    async def _timed(self, events: AsyncIterator[SSEEvent], start_time: float, **finished_extra) -> AsyncIterator[SSEEvent]:
+        """finished event 에 ttft/e2el 을 붙인다. client 마다 자기 요청 시작 시각 기준으로 계산한다."""
+        first_token_time = None
+        async with aclosing(events):
+            async for type, data in events:
+                if type == "stream" and first_token_time is None:
+                    first_token_time = time.time()
+
+                if type == "finished":
+                    data = {**data, **finished_extra}
+                    end_time = time.time()
+                    cache_hit = "true" if data.get("cache_hit") else "false"
+                    REQUEST_DURATION.observe(end_time - start_time, status=data["status"], cache_hit=cache_hit)
+                    if data["status"] == "done":
+                        data["ttft"] = (first_token_time or end_time) - start_time
+                        data["e2el"] = end_time - start_time
+                        REQUEST_TTFT.observe(data["ttft"], cache_hit=cache_hit)
+
+                yield type, data
+
+    def _uses_session(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and self.session_graph is not None
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+
+    async def _stream_graph(
+        self,
+        query: str,
+        priority: int = 0,
+        debug: bool = False,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[SSEEvent]:
+        try:
+            permit = await self.admission.acquire(priority)
+        except AdmissionRejected as e:
+            logger.warning(f"[stream_service] Rejected: {str(e)}")
+            yield "busy", {"data": str(e), "retry_after": e.retry_after}
+            yield "finished", {"status": "busy", "cache_hit": False}
+            return
+        # permit 은 stream 을 다 보낸 뒤에 놓으므로 걸린 시간에 답변 길이와 client 읽기 속도가 섞인다.
+        # generate_answer 와 같이 latency 는 한도 조절에 쓰지 않고 429 만 반영한다
+        permit.track_latency = False
+
         input_state = {
             "user_input": query,
             "messages": [HumanMessage(content=query)],
-            "num_tries": 0
+            "num_tries": 0,
+            # session 에 남은 이전 turn 의 값을 지운다
+            "context_tokens_saved": None
         }
 
-        is_first_token = True
-        start_time = time.time()
-        return_data = {"status": "done"}
+        token_queue = asyncio.Queue(maxsize=self.max_buffered_chunks)
+        config = {
+            "configurable": {
+                "token_queue": token_queue,
+                "history_builder": ChatHistoryBuilder()
+            }
+        }
+        if debug:
+            config["callbacks"] = [ConsoleCallbackHandler()]
 
-        try:
-            async for chunk, meta in self.graph.astream(input_state, stream_mode="messages"):
-                node = meta.get("langgraph_node", "")
-                if node != "generate_answer": continue
+        graph = self.graph
+        if self._uses_session(session_id):
+            graph = self.session_graph
+            config["configurable"]["thread_id"] = session_id
+            config["configurable"]["session_store"] = self.session_store
 
-                if is_first_token:
-                    is_first_token = not is_first_token
-                    first_token_time = time.time()
+        speculation = None
+        if self.speculative_retrieval:
+            speculation = SpeculativeRetrieval(query, SPECULATIVE_INTENTS)
+            config["configurable"]["speculation"] = speculation
 
-                yield self._format_sse("stream", {"data": chunk.content})
+        answer_parts = []
+        return_data = {"status": "done", "cache_hit": False}
+        throttled = False
 
-            end_time = time.time()
-            return_data["ttft"] = first_token_time - start_time
-            return_data["e2el"] = end_time - start_time
+        graph_task = asyncio.create_task(self._run_graph(graph, input_state, config, token_queue, debug))
+        if speculation is not None:
+            speculation.start()
+        try:
+            while True:
+                token = await token_queue.get()
+                if token is _END_OF_STREAM:
+                    break
+
+                answer_parts.append(token)
+                yield "stream", {"data": token}
+
+            # graph 에서 발생한 exception 은 여기서 다시 raise 된다
+            final_state = await graph_task
+            return_data["context_tokens_saved"] = final_state.get("context_tokens_saved", 0)
+            return_data["route"] = final_state.get("route")
+            if graph is self.session_graph:
+                self._run_background(self.session_store.maybe_evict(), "Session eviction")
+            else:
+                self._store_cache(query, "".join(answer_parts))
 
         except Exception as e:
-            ...
-            yield self._format_sse("error", {"data": str(e)})
+            logger.error(f"[stream_service] Exception: {str(e)}")
+            throttled = is_rate_limited(e)
+            return_data["status"] = "error"
+            yield "error", {"data": str(e)}
 
         finally:
-            yield self._format_sse("finished", return_data)
+            if not graph_task.done():
+                graph_task.cancel()
+                try:
+                    await graph_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            if speculation is not None:
+                speculation.cancel_unclaimed()
+            permit.release(throttled)
+
+        yield "finished", return_data
+
+    async def _lookup_cache(self, query: str) -> Optional[CacheHit]:
+        if self.response_cache is None:
+            return None
+        try:
+            return await self.response_cache.lookup(query)
+        except Exception as e:
+            # cache 장애로 검색이 실패하지 않도록 miss 로 처리한다
+            logger.error(f"[stream_service] Response cache lookup failed: {str(e)}")
+            return None
+
+    def _store_cache(self, query: str, answer: str) -> None:
+        if self.response_cache is None or not answer:
+            return
 
+        self._run_background(self.response_cache.store(query, answer), "Response cache store")
 
+    def _run_background(self, coro, description: str) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
 
-    def _format_sse(self, type: str, data: dict) -> str:
-        return f"event: {type}\ndata: {json.dumps(data)}\n\n"
\ No newline at end of file
+        def on_done(task: asyncio.Task) -> None:
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"[stream_service] {description} failed: {str(task.exception())}")
+
+        task.add_done_callback(on_done)
+
+    def close(self) -> None:
+        if self.session_store is not None:
+            self.session_store.close()
+
+    async def _replay(self, cache_hit: CacheHit) -> AsyncIterator[SSEEvent]:
+        for piece in _REPLAY_CHUNK.findall(cache_hit.answer):
+            yield "stream", {"data": piece}
+
+        yield "finished", {"status": "done", "cache_hit": True, "cache_similarity": cache_hit.similarity}
+
+    async def _run_graph(
+        self,
+        graph: CompiledStateGraph,
+        input_state: dict,
+        config: dict,
+        token_queue: asyncio.Queue,
+        debug: bool = False
+    ) -> dict:
+        if debug:
+            enable_debug_tracing()
+        try:
+            if graph.checkpointer is None:
+                return await graph.ainvoke(input_state, config=config)
+            # session 은 turn 이 끝날 때의 state 만 있으면 되므로 checkpoint 도 마지막에 한 번만 저장한다
+            return await graph.ainvoke(input_state, config=config, durability="exit")
+        finally:
+            # 이 task 가 cancel 된 경우에는 queue 를 기다리는 consumer 도 이미 종료된 상태
+            if not asyncio.current_task().cancelling():
+                await token_queue.put(_END_OF_STREAM)
@@ -0,0 +1,330 @@
+"""
+Graph node, tool, LLM, Elasticsearch 호출의 latency 와 LLM token 수를 모아 Prometheus text format 으로 내보낸다.
+
+    async with span("tool", "hr_doc_retriever"):
+        ...
+
+    @traced("node", "orchestrator")
+    async def orchestrator(state, config): ...
+
+요청 단위 debug tracing (``debug_tracing``) 이 켜져 있으면 span 마다 INFO log 를 남긴다.
+꺼져 있을 때의 비용은 histogram 에 값을 하나 더하는 정도다.
+
+prefork 로 여러 worker 를 띄우면 값은 process 별로 쌓인다. worker 는 ``set_const_labels(worker=...)`` 로 모든 sample 에
+자기 label 을 붙이고 ``publish_snapshots`` 로 snapshot 을 파일에 써서, /metrics 를 받은 worker 가
+``registry.render(snapshots)`` 로 다른 worker 의 값까지 합쳐 내보낸다.
+"""
+import os
+import json
+import time
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# LLM 호출처럼 느린 구간도 구분할 수 있도록 60초까지 둔다
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_debug_tracing: ContextVar[bool] = ContextVar("debug_tracing", default=False)
+
+# 이 process 의 모든 sample 에 붙는 label (prefork worker 의 worker="N")
+_const_labels: Tuple[Tuple[str, str], ...] = ()
+
+
+def set_const_labels(**labels: Any) -> None:
+    global _const_labels
+    _const_labels = tuple((name, str(value)) for name, value in labels.items())
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*_const_labels, *zip(names, values))]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return self.header() + self._samples()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """render 할 때 callback 으로 현재 값을 읽는 gauge."""
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]]
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self.collect().items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label 값 -> (bucket 별 count, sum, count)
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """metric 이름 -> 현재 sample line. 다른 process 의 ``render`` 에 넘겨서 합친다."""
+        return {name: metric._samples() for name, metric in self._metrics.items()}
+
+    def render(self, snapshots: Sequence[Dict[str, List[str]]] = ()) -> str:
+        """
+        Prometheus text format. ``snapshots`` (다른 worker 의 ``snapshot``) 의 sample 은 같은 metric 의 header 아래에 붙인다.
+        worker 들은 같은 code 를 import 하므로 metric 구성이 같다.
+        """
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render())
+            for snapshot in snapshots:
+                lines.extend(snapshot.get(name, ()))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+SPAN_DURATION = registry.register(Histogram(
+    "omni_span_duration_seconds",
+    "Duration of graph nodes, tool calls, LLM calls and Elasticsearch queries.",
+    ["kind", "name", "status"]
+))
+LLM_TTFT = registry.register(Histogram(
+    "omni_llm_time_to_first_token_seconds",
+    "Time until the first streamed token of an LLM call.",
+    ["name"]
+))
+LLM_TOKENS = registry.register(Counter(
+    "omni_llm_tokens_total",
+    "LLM tokens by call site and type (prompt/completion).",
+    ["name", "type"]
+))
+REQUEST_DURATION = registry.register(Histogram(
+    "omni_request_duration_seconds",
+    "End-to-end latency of /search/ streams.",
+    ["status", "cache_hit"]
+))
+REQUEST_TTFT = registry.register(Histogram(
+    "omni_request_time_to_first_token_seconds",
+    "Time until the first token of a /search/ stream.",
+    ["cache_hit"]
+))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "omni_event_loop_lag_seconds",
+    "How late the event loop woke up a periodic timer. Large values mean blocking work on the loop.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+
+
+def debug_tracing() -> bool:
+    return _debug_tracing.get()
+
+
+def enable_debug_tracing() -> None:
+    """현재 context 에서만 debug tracing 을 켠다. graph 를 실행하는 task 안에서 호출하면 그 요청에만 적용된다."""
+    _debug_tracing.set(True)
+
+
+class Span:
+    __slots__ = ("kind", "name", "attributes", "status", "start", "first_token_time")
+
+    def __init__(self, kind: str, name: str, attributes: Dict[str, Any]) -> None:
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.status = "ok"
+        self.start = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def first_token(self) -> None:
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+            LLM_TTFT.observe(self.first_token_time - self.start, name=self.name)
+
+    def record_usage(self, message: Any) -> None:
+        """AIMessage(Chunk) 의 usage_metadata 로 prompt/completion token 수를 기록한다."""
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+        LLM_TOKENS.inc(prompt_tokens, name=self.name, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, name=self.name, type="completion")
+        self.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def _finish(self) -> None:
+        duration = time.perf_counter() - self.start
+        SPAN_DURATION.observe(duration, kind=self.kind, name=self.name, status=self.status)
+        if _debug_tracing.get():
+            extra = "".join(f" {key}={value}" for key, value in self.attributes.items())
+            if self.first_token_time is not None:
+                extra += f" ttft={self.first_token_time - self.start:.3f}s"
+            logger.info(f"[trace] {self.kind}:{self.name} {self.status} {duration * 1e3:.1f}ms{extra}")
+
+
+@asynccontextmanager
+async def span(kind: str, name: str, **attributes: Any) -> AsyncIterator[Span]:
+    current = Span(kind, name, attributes)
+    try:
+        yield current
+    except asyncio.CancelledError:
+        current.status = "cancelled"
+        raise
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current._finish()
+
+
+async def monitor_event_loop_lag(interval: float = 0.05, samples: Optional[List[float]] = None) -> None:
+    """cancel 될 때까지 interval 마다 timer 가 얼마나 늦게 깨어났는지 기록한다."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        if samples is not None:
+            samples.append(lag)
+
+
+def write_snapshot(path: Path, data: str) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(data, encoding="utf-8")
+    # 읽는 쪽이 쓰다 만 파일을 보지 않도록 rename 으로 바꾼다
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path) -> Optional[Dict[str, List[str]]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+async def publish_snapshots(path: Path, interval: float = 1.0) -> None:
+    """cancel 될 때까지 interval 마다 이 process 의 snapshot 을 path 에 쓴다. 다른 worker 의 /metrics 는 최대 interval 만큼 늦다."""
+    while True:
+        data = json.dumps(registry.snapshot())
+        try:
+            await asyncio.to_thread(write_snapshot, path, data)
+        except OSError as e:
+            logger.warning(f"[telemetry] Could not write metrics snapshot to {path}: {e}")
+        await asyncio.sleep(interval)
+
+
+def traced(kind: str, name: str) -> Callable:
+    """async 함수 (graph node 등) 전체를 span 으로 감싼다. signature 는 그대로 유지된다."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with span(kind, name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
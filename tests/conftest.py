@@ -0,0 +1,10 @@
+"""
+test 는 network 없이 돈다. 대부분의 설정은 module import 시점에 환경변수에서 읽으므로 import 전에 여기서 정한다.
+"""
+import os
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("SESSIONS_ENABLED", "false")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+# 아무것도 listen 하지 않는 port. Elasticsearch 연결은 바로 실패한다
+os.environ.setdefault("ELASTICSEARCH_URL", "http://127.0.0.1:9")
@@ -0,0 +1,149 @@
+import json
+import asyncio
+
+from typing import Callable, List
+
+import httpx
+import pytest
+
+from models import gateway
+from models.gateway import GatewayError, LLMGatewayClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "hello"}}]}
+
+
+def make_client(handler: Callable[[httpx.Request], httpx.Response], **kwargs) -> LLMGatewayClient:
+    return LLMGatewayClient(
+        base_url="http://gateway.test",
+        token="secret",
+        model="test-model",
+        backoff_base=0.001,
+        backoff_max=0.01,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        **kwargs,
+    )
+
+
+def scripted(responses: List[Callable[[], httpx.Response]]):
+    """호출마다 다음 응답을 돌려주는 handler 와, 받은 request 목록."""
+    requests: List[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses[len(requests) - 1]()
+
+    return handler, requests
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+    """backoff 대기 시간을 기록하고 실제로는 기다리지 않는다."""
+    delays: List[float] = []
+
+    async def fake_sleep(delay: float) -> None:
+        delays.append(delay)
+
+    monkeypatch.setattr(gateway.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_retries_retryable_status_then_succeeds(sleeps):
+    handler, requests = scripted([
+        lambda: httpx.Response(503),
+        lambda: httpx.Response(429),
+        lambda: httpx.Response(200, json=COMPLETION),
+    ])
+    client = make_client(handler, max_retries=3)
+
+    response = asyncio.run(client.chat(MESSAGES, temperature=0))
+
+    assert response == COMPLETION
+    assert len(requests) == 3
+    assert len(sleeps) == 2
+    body = json.loads(requests[0].content)
+    assert body == {"model": "test-model", "messages": MESSAGES, "stream": False, "temperature": 0}
+    assert requests[0].headers["Authorization"] == "Bearer secret"
+
+
+def test_gives_up_after_max_retries(sleeps):
+    handler, requests = scripted([lambda: httpx.Response(429, text="slow down")] * 3)
+    client = make_client(handler, max_retries=2)
+
+    with pytest.raises(GatewayError) as error:
+        asyncio.run(client.chat(MESSAGES))
+
+    assert error.value.status_code == 429
+    assert len(requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_does_not_retry_client_errors(sleeps):
+    handler, requests = scripted([lambda: httpx.Response(400, text="bad request")])
+    client = make_client(handler)
+
+    with pytest.raises(GatewayError) as error:
+        asyncio.run(client.chat(MESSAGES))
+
+    assert error.value.status_code == 400
+    assert len(requests) == 1
+    assert sleeps == []
+
+
+def test_retries_transport_errors(sleeps):
+    def refuse() -> httpx.Response:
+        raise httpx.ConnectError("connection refused")
+
+    handler, requests = scripted([refuse, lambda: httpx.Response(200, json=COMPLETION)])
+    client = make_client(handler)
+
+    assert asyncio.run(client.chat(MESSAGES)) == COMPLETION
+    assert len(requests) == 2
+
+
+def test_backoff_is_capped_and_honors_retry_after(sleeps):
+    handler, _ = scripted([
+        lambda: httpx.Response(503),
+        lambda: httpx.Response(503),
+        lambda: httpx.Response(429, headers={"Retry-After": "5"}),
+        lambda: httpx.Response(200, json=COMPLETION),
+    ])
+    client = make_client(handler, max_retries=3)
+    client.backoff_base, client.backoff_max = 0.1, 1.0
+
+    asyncio.run(client.chat(MESSAGES))
+
+    # full jitter: [0, min(max, base * 2^attempt)]
+    assert 0 <= sleeps[0] <= 0.1
+    assert 0 <= sleeps[1] <= 0.2
+    # Retry-After 는 backoff_max 까지만 따른다
+    assert sleeps[2] == 1.0
+
+
+def test_stream_chat_yields_delta_content(sleeps):
+    lines = [
+        {"choices": [{"delta": {"role": "assistant"}}]},
+        {"choices": [{"delta": {"content": "hel"}}]},
+        {"choices": [{"delta": {"content": "lo"}}]},
+    ]
+    body = "".join(f"data: {json.dumps(line)}\n\n" for line in lines) + "data: [DONE]\n\n"
+    handler, requests = scripted([
+        lambda: httpx.Response(502),
+        lambda: httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"}),
+    ])
+    client = make_client(handler)
+
+    async def collect() -> List[str]:
+        return [token async for token in client.stream_chat(MESSAGES)]
+
+    assert asyncio.run(collect()) == ["hel", "lo"]
+    assert len(requests) == 2
+    assert json.loads(requests[1].content)["stream"] is True
+
+
+def test_from_env_requires_url_and_token(monkeypatch):
+    monkeypatch.delenv("LLM_GATEWAY_URL", raising=False)
+    monkeypatch.setenv("LLM_GATEWAY_TOKEN", "secret")
+
+    with pytest.raises(ValueError, match="LLM_GATEWAY_URL"):
+        LLMGatewayClient.from_env()
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from retriever.result_cache import RetrievalResultCache
+
+INDEX = "hr"
+
+
+class GenerationReader:
+    """호출 수를 세는 generation 읽기 함수. ``error`` 가 있으면 그것을 raise 한다."""
+    def __init__(self, generation: int = 1) -> None:
+        self.generation = generation
+        self.error = None
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.generation
+
+
+def hits(*doc_ids: str):
+    return [(doc_id, 1.0 / (rank + 1), {"text": doc_id, "metadata": {}}) for rank, doc_id in enumerate(doc_ids)]
+
+
+def generation(cache: RetrievalResultCache, read: GenerationReader):
+    return asyncio.run(cache.current_generation(INDEX, read))
+
+
+def test_hit_within_same_generation():
+    cache = RetrievalResultCache(generation_check_interval=0)
+    read = GenerationReader()
+    key = cache.make_key(INDEX, "연차  휴가", 3, 0.5)
+
+    current = generation(cache, read)
+    assert cache.get(key, current) is None
+    cache.put(key, current, hits("a", "b"))
+
+    # 공백만 다른 query 는 같은 key 다
+    cached = cache.get(cache.make_key(INDEX, " 연차 휴가 ", 3, 0.5), generation(cache, read))
+    assert [(doc_id, score) for doc_id, score, _ in cached] == [("a", 1.0), ("b", 0.5)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_generation_change_drops_index_entries():
+    cache = RetrievalResultCache(generation_check_interval=0)
+    read = GenerationReader()
+    key = cache.make_key(INDEX, "q", 3, 0.5)
+    other = cache.make_key("wiki", "q", 3, 0.5)
+
+    cache.put(key, generation(cache, read), hits("a"))
+    wiki_generation = asyncio.run(cache.current_generation("wiki", GenerationReader(7)))
+    cache.put(other, wiki_generation, hits("x"))
+
+    read.generation = 2
+    current = generation(cache, read)
+    assert current == 2
+    assert cache.get(key, current) is None
+    # 다른 index 의 항목은 남는다
+    assert cache.get(other, wiki_generation) is not None
+    assert len(cache) == 1
+
+
+def test_put_with_stale_generation_is_dropped():
+    cache = RetrievalResultCache(generation_check_interval=0)
+    read = GenerationReader()
+    key = cache.make_key(INDEX, "q", 3, 0.5)
+
+    stale = generation(cache, read)
+    # 검색하는 동안 적재가 끝났다
+    read.generation = 2
+    current = generation(cache, read)
+    cache.put(key, stale, hits("a"))
+
+    assert len(cache) == 0
+    assert cache.get(key, current) is None
+
+
+def test_generation_is_reread_only_after_interval():
+    cache = RetrievalResultCache(generation_check_interval=60)
+    read = GenerationReader()
+
+    assert generation(cache, read) == 1
+    read.generation = 2
+    assert generation(cache, read) == 1
+    assert read.calls == 1
+
+    cache.generation_check_interval = 0
+    assert generation(cache, read) == 2
+    assert read.calls == 2
+
+
+def test_read_failure_bypasses_cache():
+    cache = RetrievalResultCache(generation_check_interval=0)
+    read = GenerationReader()
+    key = cache.make_key(INDEX, "q", 3, 0.5)
+    cache.put(key, generation(cache, read), hits("a"))
+
+    read.error = PermissionError("mapping is not readable")
+    current = generation(cache, read)
+    assert current is None
+    assert len(cache) == 0
+
+    cache.put(key, current, hits("a"))
+    assert cache.get(key, current) is None
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("max_entries", [1, 2])
+def test_lru_eviction_releases_chunks(max_entries):
+    cache = RetrievalResultCache(max_entries=max_entries, generation_check_interval=0)
+    current = generation(cache, GenerationReader())
+    first = cache.make_key(INDEX, "first", 3, 0.5)
+    second = cache.make_key(INDEX, "second", 3, 0.5)
+    third = cache.make_key(INDEX, "third", 3, 0.5)
+
+    cache.put(first, current, hits("a", "shared"))
+    cache.put(second, current, hits("b", "shared"))
+    cache.put(third, current, hits("c"))
+
+    assert len(cache) == max_entries
+    assert cache.get(first, current) is None
+    # 남은 항목이 참조하는 chunk 만 남는다
+    remaining = {doc_id for key in [second, third][-max_entries:] for doc_id, _, _ in cache.get(key, current)}
+    assert {doc_id for _, doc_id in cache._chunks} == remaining
+
+    cache.invalidate(INDEX)
+    assert cache._chunks == {}
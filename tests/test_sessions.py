@@ -0,0 +1,85 @@
+import pytest
+
+from langchain_core.documents import Document
+
+import sessions
+from sessions import SessionStore
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, "time", clock)
+    return clock
+
+
+def make_store(tmp_path, **kwargs) -> SessionStore:
+    return SessionStore(path=str(tmp_path / "sessions.sqlite3"), **kwargs)
+
+
+def doc(doc_id: str, size: int = 100) -> Document:
+    return Document(id=doc_id, page_content="가" * (size // 3), metadata={"index": "hr", "score": 1.0})
+
+
+def test_evicts_sessions_past_ttl(tmp_path, clock):
+    store = make_store(tmp_path, ttl=60)
+    old_refs = store.store_documents("old", [doc("a")])
+    clock.now += 30
+    new_refs = store.store_documents("new", [doc("b")])
+
+    clock.now += 40
+    assert store.evict(clock.now) == 1
+
+    assert store.load_documents(old_refs) is None
+    assert [d.id for d in store.load_documents(new_refs)] == ["b"]
+    assert store.stats()["sessions"] == 1
+
+
+def test_evicts_oldest_sessions_over_count(tmp_path, clock):
+    store = make_store(tmp_path, max_sessions=2)
+    for i, thread_id in enumerate(["s1", "s2", "s3"]):
+        clock.now += 1
+        store.store_documents(thread_id, [doc(f"d{i}")])
+
+    assert store.evict(clock.now) == 1
+
+    stats = store.stats()
+    assert stats["sessions"] == 2
+    # s1 만 참조하던 문서도 지워진다
+    assert stats["documents"] == 2
+    assert store.load_documents([{"id": "d0", "index": "hr", "score": 0.0}]) is None
+
+
+def test_evicts_oldest_sessions_over_size_and_keeps_shared_documents(tmp_path, clock):
+    store = make_store(tmp_path, max_bytes=2000)
+    shared = doc("shared", 600)
+    for thread_id in ["s1", "s2", "s3"]:
+        clock.now += 1
+        store.store_documents(thread_id, [shared, doc(f"own-{thread_id}", 600)])
+    assert store.stats()["bytes"] > 2000
+
+    assert store.evict(clock.now) == 1
+    stats = store.stats()
+    assert stats["bytes"] <= 2000
+    # 가장 최근 session 과 그 session 이 참조하는 공유 문서는 남는다
+    refs = [{"id": "shared", "index": "hr", "score": 0.5}, {"id": "own-s3", "index": "hr", "score": 0.4}]
+    documents = store.load_documents(refs)
+    assert [d.id for d in documents] == ["shared", "own-s3"]
+    assert documents[0].metadata["score"] == 0.5
+    assert store.load_documents([{"id": "own-s1", "index": "hr", "score": 0.0}]) is None
+
+
+def test_nothing_to_evict(tmp_path, clock):
+    store = make_store(tmp_path)
+    store.store_documents("s1", [doc("a")])
+
+    assert store.evict(clock.now) == 0
+    assert store.stats()["sessions"] == 1
@@ -0,0 +1,92 @@
+import json
+import asyncio
+
+from typing import List, Tuple
+
+import pytest
+
+from sse import HEARTBEAT, SSEWriter
+
+
+def parse(chunks: List[bytes]) -> List[Tuple[str, dict]]:
+    """frame bytes 를 (event type, data) 목록으로 되돌린다. heartbeat 는 ("ping", {}) 로 둔다."""
+    events = []
+    for frame in b"".join(chunks).split(b"\n\n"):
+        if not frame:
+            continue
+        if frame == HEARTBEAT.rstrip(b"\n"):
+            events.append(("ping", {}))
+            continue
+        type_line, data_line = frame.decode("utf-8").split("\n")
+        events.append((type_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))))
+    return events
+
+
+def collect(writer: SSEWriter, events) -> List[bytes]:
+    async def run() -> List[bytes]:
+        return [chunk async for chunk in writer.frames(events)]
+
+    return asyncio.run(run())
+
+
+async def tokens(*items, delay: float = 0.0):
+    """graph 처럼 event 사이마다 event loop 에 제어를 넘긴다."""
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item if isinstance(item, tuple) else ("stream", {"data": item})
+
+
+def test_first_token_alone_then_coalesced():
+    writer = SSEWriter(coalesce_ms=50, heartbeat_interval=0)
+    events = parse(collect(writer, tokens(
+        ("metadata", {"route": "hr"}), "안녕", "하세요", ", ", "반갑", "습니다", ("end", {}),
+    )))
+
+    assert events[0] == ("metadata", {"route": "hr"})
+    assert events[1] == ("stream", {"data": "안녕"})
+    # 나머지 token 은 end 전에 한 frame 으로 나간다
+    assert events[2:] == [("stream", {"data": "하세요, 반갑습니다"}), ("end", {})]
+
+
+def test_coalesce_bytes_flushes_early():
+    writer = SSEWriter(coalesce_ms=10_000, coalesce_bytes=4, heartbeat_interval=0)
+    chunks = collect(writer, tokens("a", "bb", "cc", "d", "eeee", ("end", {})))
+    events = parse(chunks)
+
+    streamed = [data["data"] for type, data in events if type == "stream"]
+    assert "".join(streamed) == "abbccdeeee"
+    assert streamed == ["a", "bbcc", "deeee"]
+    assert events[-1] == ("end", {})
+
+
+def test_heartbeat_while_idle():
+    writer = SSEWriter(coalesce_ms=0, heartbeat_interval=0.05)
+    events = parse(collect(writer, tokens("a", "b", delay=0.2)))
+
+    assert ("ping", {}) in events
+    assert "".join(data["data"] for type, data in events if type == "stream") == "ab"
+
+
+def test_no_heartbeat_when_disabled():
+    writer = SSEWriter(coalesce_ms=0, heartbeat_interval=0)
+    events = parse(collect(writer, tokens("a", "b", delay=0.1)))
+
+    assert ("ping", {}) not in events
+
+
+def test_event_error_is_raised_after_flushing():
+    async def failing():
+        yield "stream", {"data": "partial"}
+        yield "metadata", {"route": "hr"}
+        raise RuntimeError("graph failed")
+
+    writer = SSEWriter(heartbeat_interval=0)
+    chunks: List[bytes] = []
+
+    async def run() -> None:
+        async for chunk in writer.frames(failing()):
+            chunks.append(chunk)
+
+    with pytest.raises(RuntimeError, match="graph failed"):
+        asyncio.run(run())
+    assert parse(chunks) == [("stream", {"data": "partial"}), ("metadata", {"route": "hr"})]
@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+
+def test_app_starts_with_default_elasticsearch_backend():
+    """
+    lifespan 의 warmup 은 Worker 마다 AsyncElasticsearch 를 만들고 ping 한다.
+    선언하지 않은 transport 의존성 (aiohttp 등) 이 필요하면 여기서 import 오류로 app 이 뜨지 않는다.
+    """
+    import main
+    from langgraph_scripts.registry import RETRIEVER_BACKEND
+
+    assert RETRIEVER_BACKEND == "es"
+    with TestClient(main.app) as client:
+        response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
@@ -0,0 +1,96 @@
+import asyncio
+
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from retriever.fake_es import FakeAsyncElasticsearch
+from retriever.result_cache import RetrievalResultCache
+from retriever.workers import METADATA_FIELD, TEXT_FIELD, VECTOR_FIELD, Worker, resolve_index
+
+QUERY = "연차 휴가"
+# keyword 로는 a > c 이고 b 는 나오지 않는다. vector 로는 query 가 b 쪽을 향한다 (b > c > a)
+DOCS = {
+    "a": ("연차 휴가 규정", [1.0, 0.0]),
+    "b": ("출장 경비 정산", [0.0, 1.0]),
+    "c": ("휴가 신청 절차", [0.7, 0.7]),
+}
+
+
+class TableEmbeddings(Embeddings):
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self.vectors[text]
+
+
+def make_worker(fusion: str = "alpha", result_cache: RetrievalResultCache = None):
+    es_client = FakeAsyncElasticsearch()
+    index = resolve_index("HR")
+    for doc_id, (text, vector) in DOCS.items():
+        es_client.indices[index][doc_id] = {TEXT_FIELD: text, VECTOR_FIELD: vector, METADATA_FIELD: {"source": f"{doc_id}.txt"}}
+    embeddings = TableEmbeddings({QUERY: [0.0, 1.0]})
+    worker = Worker("HR", es_client=es_client, embeddings=embeddings, fusion=fusion, result_cache=result_cache)
+    return worker, es_client, embeddings
+
+
+def test_keyword_only_skips_embedding():
+    worker, es_client, embeddings = make_worker()
+    docs = asyncio.run(worker(QUERY, topk=3, alpha=0.0))
+
+    assert [doc.id for doc in docs] == ["a", "c"]
+    assert embeddings.calls == 0
+    assert es_client.num_msearch_calls == 1
+
+
+def test_vector_only():
+    worker, _, _ = make_worker()
+    docs = asyncio.run(worker(QUERY, topk=3, alpha=1.0))
+
+    assert [doc.id for doc in docs] == ["b", "c", "a"]
+
+
+def test_alpha_fusion_sends_one_msearch():
+    worker, es_client, embeddings = make_worker()
+    docs = asyncio.run(worker(QUERY, topk=3, alpha=0.75))
+
+    # min-max 정규화 후 0.75 * vector + 0.25 * keyword: b 0.75, c 0.53, a 0.25
+    assert [doc.id for doc in docs] == ["b", "c", "a"]
+    assert es_client.num_msearch_calls == 1
+    assert embeddings.calls == 1
+    assert docs[0].page_content == "출장 경비 정산"
+    assert docs[0].metadata == {"source": "b.txt", "id": "b", "index": resolve_index("HR"), "score": 0.75}
+
+
+def test_rrf_fusion():
+    worker, _, _ = make_worker(fusion="rrf")
+    docs = asyncio.run(worker(QUERY, topk=3, alpha=0.5))
+
+    # a: keyword 1위 + vector 3위, c: 둘 다 2위, b: vector 1위만
+    assert [doc.id for doc in docs] == ["a", "c", "b"]
+
+
+def test_result_cache_skips_search_until_index_changes():
+    cache = RetrievalResultCache(generation_check_interval=0)
+    worker, es_client, embeddings = make_worker(result_cache=cache)
+
+    async def run():
+        first = await worker(QUERY, topk=3)
+        second = await worker(f"  {QUERY} ", topk=3)
+        assert [doc.id for doc in second] == [doc.id for doc in first]
+        assert es_client.num_msearch_calls == 1
+        assert embeddings.calls == 1
+
+        index = worker.index_name
+        await es_client.index(index, {**es_client.indices[index]["a"], TEXT_FIELD: "연차 휴가 연차 휴가 개정"}, id="a")
+        third = await worker(QUERY, topk=3)
+        assert es_client.num_msearch_calls == 2
+        assert third[[doc.id for doc in third].index("a")].page_content == "연차 휴가 연차 휴가 개정"
+
+    asyncio.run(run())
@@ -1,3 +1,4 @@
+import os
 import argparse
 from pathlib import Path
 
@@ -8,17 +9,75 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--index",
         type=str,
+        default=os.getenv("ELASTICSEARCH_INDEX", "omni-agent-docs"),
         help=f"Target Elasticsearch index",
     )
     parser.add_argument(
         "--docs",
         type=Path,
-        help=f"Directory holding source documents",
+        help=f"Directory holding source documents (defaults to ./docs)",
     )
     parser.add_argument(
         "--dry-run",
         action="store_true",
-        help="Process documents without writing to Elasticsearch.",
+        help="Run every stage (load, split, embed) without writing to Elasticsearch.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="Maximum number of characters per chunk.",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=200,
+        help="Number of overlapping characters between neighbouring chunks.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Number of chunks sent to the embedding model at once.",
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=4,
+        help="Number of embedding batches processed concurrently.",
+    )
+    parser.add_argument(
+        "--bulk-chunk-size",
+        type=int,
+        default=500,
+        help="Number of chunks per Elasticsearch bulk request.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=8,
+        help="Maximum number of items buffered between pipeline stages.",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="Path of the incremental ingestion manifest (defaults to ./.ingest_manifest/<index>.json).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-read every file and re-embed every chunk. The manifest is still used to delete stale chunks.",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=("es", "local"),
+        default=os.getenv("UPSERT_SINK", "es"),
+        help="Write chunks to Elasticsearch or to a local memory-mapped vector index.",
+    )
+    parser.add_argument(
+        "--local-index-dir",
+        type=Path,
+        help="Root directory of local vector indices for --sink local (defaults to $LOCAL_INDEX_DIR or ./.local_index).",
     )
     return parser.parse_args()
 
@@ -0,0 +1,108 @@
+"""
+증분 적재용 manifest.
+
+source 파일별로 마지막으로 적재한 시점의 mtime / size 와 chunk 별 content hash 를 로컬 JSON 파일에 저장한다.
+다음 적재 때는 바뀐 파일의 바뀐 chunk 만 embedding 하고, 사라진 chunk 는 index 에서 지운다.
+"""
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import logging
+
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def chunk_id(source: str, start_index: int) -> str:
+    """source 경로와 chunk 시작 offset 으로 만든 결정적인 chunk ID."""
+    return hashlib.sha1(f"{source}:{start_index}".encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class FileRecord:
+    mtime: float
+    size: int
+    # chunk ID -> content hash
+    chunks: Dict[str, str] = field(default_factory=dict)
+
+
+class IngestManifest:
+    """
+    ``rebuild`` 이면 모든 파일을 다시 읽고 모든 chunk 를 다시 embedding 한다. 이전 chunk 목록은 그대로 두어서
+    이번 적재에서 사라진 chunk 와 파일의 chunk 는 지운다.
+    ``settings`` (chunk_size 등) 가 바뀌면 chunk 경계가 모두 달라지므로 rebuild 로 읽는다.
+    """
+    def __init__(
+        self,
+        path: Path,
+        index_name: str,
+        settings: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, FileRecord]] = None,
+        rebuild: bool = False,
+    ) -> None:
+        self.path = Path(path)
+        self.index_name = index_name
+        self.settings = settings or {}
+        self.files: Dict[str, FileRecord] = files or {}
+        self.rebuild = rebuild
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        index_name: str,
+        settings: Optional[Dict[str, Any]] = None,
+        rebuild: bool = False,
+    ) -> "IngestManifest":
+        path = Path(path)
+        settings = settings or {}
+        if not path.exists():
+            return cls(path, index_name, settings, rebuild=rebuild)
+
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION or data.get("index") != index_name:
+            LOGGER.warning("Ignoring manifest %s (different version or index); doing a full re-index", path)
+            return cls(path, index_name, settings, rebuild=True)
+
+        files = {source: FileRecord(**record) for source, record in data["files"].items()}
+        if data.get("settings", {}) != settings:
+            LOGGER.warning("Settings changed since manifest %s was written; re-embedding every chunk", path)
+            rebuild = True
+        return cls(path, index_name, settings, files, rebuild=rebuild)
+
+    def save(self) -> None:
+        """임시 파일에 쓴 뒤 교체해서, 중간에 실패해도 이전 manifest 가 깨지지 않도록 한다."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "index": self.index_name,
+            "settings": self.settings,
+            "files": {source: asdict(record) for source, record in self.files.items()},
+        }
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, source: str, stat: os.stat_result) -> bool:
+        record = self.files.get(source)
+        return not self.rebuild and record is not None and record.mtime == stat.st_mtime and record.size == stat.st_size
+
+    def chunks_of(self, source: str) -> Dict[str, str]:
+        record = self.files.get(source)
+        return dict(record.chunks) if record else {}
+
+    def removed_sources(self, seen_sources: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """이번 적재에서 보이지 않은 source 와 그 chunk 목록."""
+        seen = set(seen_sources)
+        return {source: dict(record.chunks) for source, record in self.files.items() if source not in seen}
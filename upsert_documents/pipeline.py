@@ -0,0 +1,360 @@
+"""
+문서 적재용 streaming pipeline.
+
+    load (file -> Document) -> split (Document -> chunk batch) -> embed (batch -> vectors) -> write (bulk upsert)
+
+stage 사이는 크기가 제한된 asyncio.Queue 로 연결되어 있어서, 느린 stage 가 있으면 앞 stage 도 같이 멈춘다.
+embed stage 는 ``embed_concurrency`` 개의 worker 가 batch 를 동시에 처리한다.
+
+``manifest`` 가 주어지면 증분 적재를 한다. mtime/size 가 같은 파일은 읽지 않고, content hash 가 같은 chunk 는
+embedding 하지 않으며, 사라진 chunk 와 삭제된 파일의 chunk 는 index 에서 지운다.
+
+``local_index`` 가 주어지면 Elasticsearch 대신 local vector index (``retriever.local_index``) 에 쓴다.
+index 가 바뀌면 generation 을 올려서 검색 결과 cache (``retriever.result_cache``) 가 이전 결과를 버리게 한다.
+local index 는 commit 할 때마다 새 generation 이 되고, Elasticsearch 는 mapping ``_meta`` 의 값을 올린다.
+"""
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+
+from retriever.local_index import LocalIndexWriter
+from retriever.result_cache import bump_index_generation
+from retriever.workers import TEXT_FIELD, VECTOR_FIELD, METADATA_FIELD
+from upsert_documents.manifest import FileRecord, IngestManifest, chunk_id, content_hash
+
+LOGGER = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    skipped: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def wall_seconds(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """초당 처리한 output item 수 (wall time 기준)."""
+        return self.items_out / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.name:<6} in={self.items_in:<7} out={self.items_out:<7} skipped={self.skipped:<7} "
+            f"busy={self.busy_seconds:8.2f}s wall={self.wall_seconds:8.2f}s "
+            f"throughput={self.throughput:9.1f}/s"
+        )
+
+
+@dataclass
+class PipelineConfig:
+    batch_size: int = 64
+    embed_concurrency: int = 4
+    bulk_chunk_size: int = 500
+    queue_size: int = 8
+    dry_run: bool = False
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        index_name: str,
+        splitter: TextSplitter,
+        embeddings: Embeddings,
+        load_document: Callable[[Path], Optional[Document]],
+        source_name: Callable[[Path], str] = str,
+        es_client: Optional[AsyncElasticsearch] = None,
+        config: Optional[PipelineConfig] = None,
+        manifest: Optional[IngestManifest] = None,
+        local_index: Optional[LocalIndexWriter] = None,
+    ) -> None:
+        self.index_name = index_name
+        self.splitter = splitter
+        self.embeddings = embeddings
+        self.load_document = load_document
+        self.source_name = source_name
+        self.es_client = es_client
+        self.config = config or PipelineConfig()
+        self.manifest = manifest
+        self.local_index = local_index
+
+        if self.es_client is None and self.local_index is None and not self.config.dry_run:
+            raise ValueError("es_client or local_index is required unless dry_run is enabled")
+
+        self.metrics: Dict[str, StageMetrics] = {}
+        # 적재가 성공하면 manifest 에 반영할 file record
+        self._pending_records: Dict[str, FileRecord] = {}
+        self._removed_sources: List[str] = []
+        # chunk ID -> source. 쓰기에 실패한 chunk 의 source 는 manifest 에 반영하지 않는다
+        self._chunk_sources: Dict[str, str] = {}
+        self._deletes: List[str] = []
+        self._failed_sources: set[str] = set()
+
+    async def run(self, source_files: Iterable[Path]) -> Dict[str, StageMetrics]:
+        """모든 stage 를 동시에 실행하고, 끝나면 stage 별 metric 을 반환한다."""
+        size = self.config.queue_size
+        doc_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        batch_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        embedded_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+        self.metrics = {name: StageMetrics(name) for name in ("load", "split", "embed", "write")}
+
+        embedders = [
+            self._embed_stage(batch_queue, embedded_queue)
+            for _ in range(self.config.embed_concurrency)
+        ]
+        # 한 stage 가 실패하면 TaskGroup 이 나머지 stage 를 cancel 한다
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._load_stage(source_files, doc_queue))
+            tg.create_task(self._split_stage(doc_queue, batch_queue))
+            for embedder in embedders:
+                tg.create_task(embedder)
+            tg.create_task(self._write_stage(embedded_queue))
+
+        for metrics in self.metrics.values():
+            LOGGER.info(metrics.summary())
+        LOGGER.info("Deleted %d stale chunks", len(self._deletes))
+
+        if self.manifest is not None and not self.config.dry_run:
+            self._commit_manifest()
+        return self.metrics
+
+    def _commit_manifest(self) -> None:
+        for source, record in self._pending_records.items():
+            if source in self._failed_sources:
+                LOGGER.warning("Not recording %s in the manifest; it will be retried next run", source)
+                continue
+            self.manifest.files[source] = record
+
+        for source in self._removed_sources:
+            if source not in self._failed_sources:
+                self.manifest.files.pop(source, None)
+
+        self.manifest.save()
+
+    async def _load_stage(self, source_files: Iterable[Path], output: asyncio.Queue) -> None:
+        metrics = self.metrics["load"]
+        seen_sources = []
+        for path in source_files:
+            metrics.items_in += 1
+            source = self.source_name(path)
+            seen_sources.append(source)
+
+            start = time.perf_counter()
+            stat = path.stat()
+            if self.manifest is not None and self.manifest.is_unchanged(source, stat):
+                metrics.skipped += 1
+                metrics.busy_seconds += time.perf_counter() - start
+                continue
+
+            document = await asyncio.to_thread(self.load_document, path)
+            metrics.busy_seconds += time.perf_counter() - start
+
+            self._pending_records[source] = FileRecord(mtime=stat.st_mtime, size=stat.st_size)
+            if document is None:
+                self._schedule_deletes(source, self._previous_chunks(source))
+                continue
+            metrics.items_out += 1
+            await output.put(document)
+
+        if self.manifest is not None:
+            for source, chunks in self.manifest.removed_sources(seen_sources).items():
+                LOGGER.info("Source removed: %s (%d chunks)", source, len(chunks))
+                self._removed_sources.append(source)
+                self._schedule_deletes(source, chunks)
+
+        metrics.finished_at = time.perf_counter()
+        await output.put(_STOP)
+
+    async def _split_stage(self, input: asyncio.Queue, output: asyncio.Queue) -> None:
+        metrics = self.metrics["split"]
+        batch: List[Document] = []
+        while (document := await input.get()) is not _STOP:
+            metrics.items_in += 1
+            start = time.perf_counter()
+            chunks = self._changed_chunks(document, self.splitter.split_documents([document]))
+            metrics.busy_seconds += time.perf_counter() - start
+
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= self.config.batch_size:
+                    metrics.items_out += len(batch)
+                    await output.put(batch)
+                    batch = []
+
+        if batch:
+            metrics.items_out += len(batch)
+            await output.put(batch)
+
+        metrics.finished_at = time.perf_counter()
+        # embed worker 마다 종료 신호를 하나씩 보낸다
+        for _ in range(self.config.embed_concurrency):
+            await output.put(_STOP)
+
+    def _changed_chunks(self, document: Document, chunks: List[Document]) -> List[Document]:
+        """chunk ID 를 붙이고, 이전 적재와 content hash 가 다른 chunk 만 반환한다 (rebuild 면 모두 반환한다)."""
+        metrics = self.metrics["split"]
+        source = document.metadata["source"]
+        previous = self._previous_chunks(source)
+        record = self._pending_records.setdefault(source, FileRecord(mtime=0.0, size=0))
+
+        changed = []
+        for chunk in chunks:
+            chunk.id = chunk_id(source, chunk.metadata.get("start_index", 0))
+            digest = content_hash(chunk.page_content)
+            record.chunks[chunk.id] = digest
+
+            # previous 가 있으면 manifest 도 있다
+            if previous.get(chunk.id) == digest and not self.manifest.rebuild:
+                metrics.skipped += 1
+                continue
+            self._chunk_sources[chunk.id] = source
+            changed.append(chunk)
+
+        self._schedule_deletes(source, previous.keys() - record.chunks.keys())
+        return changed
+
+    def _previous_chunks(self, source: str) -> Dict[str, str]:
+        return self.manifest.chunks_of(source) if self.manifest is not None else {}
+
+    def _schedule_deletes(self, source: str, chunk_ids: Iterable[str]) -> None:
+        for stale_id in chunk_ids:
+            self._chunk_sources[stale_id] = source
+            self._deletes.append(stale_id)
+
+    async def _embed_stage(self, input: asyncio.Queue, output: asyncio.Queue) -> None:
+        metrics = self.metrics["embed"]
+        while (batch := await input.get()) is not _STOP:
+            metrics.items_in += len(batch)
+            start = time.perf_counter()
+            vectors = await self.embeddings.aembed_documents([chunk.page_content for chunk in batch])
+            metrics.busy_seconds += time.perf_counter() - start
+
+            metrics.items_out += len(batch)
+            await output.put(list(zip(batch, vectors)))
+
+        metrics.finished_at = time.perf_counter()
+        await output.put(_STOP)
+
+    async def _write_stage(self, input: asyncio.Queue) -> None:
+        metrics = self.metrics["write"]
+
+        if self.config.dry_run:
+            async for action in self._iter_actions(input):
+                metrics.items_out += action["_op_type"] != "delete"
+            metrics.finished_at = time.perf_counter()
+            LOGGER.info("Dry-run enabled; skipped writing %d chunks.", metrics.items_out)
+            return
+
+        if self.local_index is not None:
+            await self._write_local(input)
+            return
+
+        start = time.perf_counter()
+        # 하나라도 쓰거나 지웠으면 (일부가 실패했더라도) generation 을 올린다
+        changed = False
+        async for ok, item in async_streaming_bulk(
+            self.es_client,
+            self._iter_actions(input),
+            chunk_size=self.config.bulk_chunk_size,
+            raise_on_error=False,
+        ):
+            op_type, result = next(iter(item.items()))
+            if ok:
+                metrics.items_out += op_type != "delete"
+                changed = True
+            elif op_type == "delete" and result.get("status") == 404:
+                # 이미 없는 chunk 를 지우는 것은 실패로 보지 않는다
+                continue
+            else:
+                LOGGER.error("Failed to %s chunk: %s", op_type, result)
+                self._failed_sources.add(self._chunk_sources.get(result.get("_id"), ""))
+
+        if changed:
+            generation = await bump_index_generation(self.es_client, self.index_name)
+            LOGGER.info("Bumped '%s' to generation %d", self.index_name, generation)
+        metrics.busy_seconds = time.perf_counter() - start
+        metrics.finished_at = time.perf_counter()
+
+    async def _write_local(self, input: asyncio.Queue) -> None:
+        """chunk 를 모두 반영한 뒤 새 generation 을 한 번에 쓴다."""
+        metrics = self.metrics["write"]
+        start = time.perf_counter()
+        async for action in self._iter_actions(input):
+            if action["_op_type"] == "delete":
+                self.local_index.delete(action["_id"])
+                continue
+            self.local_index.upsert(action["_id"], action[TEXT_FIELD], action[METADATA_FIELD], action[VECTOR_FIELD])
+            metrics.items_out += 1
+
+        await asyncio.to_thread(self.local_index.commit)
+        metrics.busy_seconds = time.perf_counter() - start
+        metrics.finished_at = time.perf_counter()
+
+    async def _iter_actions(self, input: asyncio.Queue) -> AsyncIterator[Dict[str, Any]]:
+        metrics = self.metrics["write"]
+        remaining_producers = self.config.embed_concurrency
+        index_ready = self.config.dry_run or self.es_client is None
+
+        while remaining_producers:
+            batch = await input.get()
+            if batch is _STOP:
+                remaining_producers -= 1
+                continue
+
+            if not index_ready:
+                await self._ensure_index(dims=len(batch[0][1]))
+                index_ready = True
+
+            for chunk, vector in batch:
+                metrics.items_in += 1
+                yield self._to_action(chunk, vector)
+
+        for stale_id in self._deletes:
+            yield {"_op_type": "delete", "_index": self.index_name, "_id": stale_id}
+
+    def _to_action(self, chunk: Document, vector: List[float]) -> Dict[str, Any]:
+        return {
+            "_op_type": "index",
+            "_index": self.index_name,
+            "_id": chunk.id,
+            TEXT_FIELD: chunk.page_content,
+            VECTOR_FIELD: vector,
+            METADATA_FIELD: chunk.metadata,
+        }
+
+    async def _ensure_index(self, dims: int) -> None:
+        if await self.es_client.indices.exists(index=self.index_name):
+            return
+
+        await self.es_client.indices.create(
+            index=self.index_name,
+            mappings={
+                "properties": {
+                    TEXT_FIELD: {"type": "text"},
+                    VECTOR_FIELD: {"type": "dense_vector", "dims": dims, "index": True, "similarity": "cosine"},
+                    METADATA_FIELD: {"type": "object"},
+                }
+            },
+        )
+        LOGGER.info("Created index '%s' (dims=%d)", self.index_name, dims)
@@ -10,28 +10,34 @@ Environment variables you can use:
     ELASTICSEARCH_API_KEY      -> API key for Elastic Cloud/Serverless
     ELASTICSEARCH_USERNAME     -> Basic auth username (fallback if no API key)
     ELASTICSEARCH_PASSWORD     -> Basic auth password (fallback if no API key)
+    LOCAL_INDEX_DIR            -> Root directory of local vector indices (``--sink local``)
 """
 
 from __future__ import annotations
 
-import argparse
+import asyncio
 import json
 import logging
 import os
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List
 
 from elasticsearch import Elasticsearch, AsyncElasticsearch
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from models.embedding import emb
+from models.http_pool import close_http_pools
+from retriever.es_client import get_async_es_client
+from retriever.local_index import LOCAL_INDEX_DIR, LocalIndexWriter
 from upsert_documents.argparser import parse_args
+from upsert_documents.manifest import IngestManifest
+from upsert_documents.pipeline import IngestionPipeline, PipelineConfig, StageMetrics
 
 LOGGER = logging.getLogger(__name__)
 BASE_DIR = Path(__file__).resolve().parents[1]
 DOCS_DIR = BASE_DIR / "docs"
+MANIFEST_DIR = BASE_DIR / ".ingest_manifest"
 
 SUPPORTED_TEXT_EXTS = {".txt", ".md", ".markdown", ".json"}
 
@@ -40,26 +46,28 @@ class ESDocumentHandler:
         self.index_name = index_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.es_client = self.get_es_client(is_async=False)
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            separators=["\n\n", "\n", " ", ""],
+            add_start_index=True,
+        )
 
     # Set ES client
     def get_es_client(self, is_async: bool = False) -> Elasticsearch | AsyncElasticsearch:
-        """Instantiate an ElasticsearchStore with the configured auth."""
-        es_url = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
-        username = os.getenv("ELASTICSEARCH_USERNAME", "elastic")
-        password = os.getenv("ELASTICSEARCH_PASSWORD")
-
+        """
+        Return an Elasticsearch client with the configured auth.
+        The async client is the process-wide pooled one; close it with ``close_http_pools``.
+        """
         if is_async: # Asynchronous ES client
-            return AsyncElasticsearch(
-                [{"host": es_url, "scheme": "https"}],
-                basic_auth=(username, password),
-                verify_certs=False,
-                ca_certs=None
-            )
+            return get_async_es_client()
 
         else: # Synchronous ES client
+            es_url = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
+            username = os.getenv("ELASTICSEARCH_USERNAME", "elastic")
+            password = os.getenv("ELASTICSEARCH_PASSWORD")
             return Elasticsearch(
-                [{"host": es_url, "scheme": "https"}],
+                es_url,
                 basic_auth=(username, password),
                 verify_certs=False,
                 ca_certs=None
@@ -67,64 +75,69 @@ class ESDocumentHandler:
         
     def load_documents(self, source_dir: Path) -> List[Document]:
         """Load supported files and create LangChain Document objects."""
-        documents: List[Document] = []
-        for file_path in _iter_source_files(source_dir):
-            content = _load_file(file_path).strip()
-            if not content:
-                LOGGER.warning("Skipping empty file: %s", file_path)
-                continue
-            documents.append(
-                Document(
-                    page_content=content,
-                    metadata={
-                        "source": str(file_path.relative_to(BASE_DIR)),
-                        "filename": file_path.name,
-                    },
-                )
-            )
+        documents = [
+            doc for doc in map(self.load_document, _iter_source_files(source_dir)) if doc is not None
+        ]
         if not documents:
             raise ValueError(
                 f"No readable documents found in {source_dir}. "
                 f"Supported extensions: {', '.join(sorted(SUPPORTED_TEXT_EXTS))}"
             )
         return documents
-    
-    def add_documents(self, documents: List[Document]):
-        for doc in documents:
-            # 1. split documents
-
-            # 2. upsert to db
-            self.es_client.index(index=self.index_name, document=doc.page_content, id=doc.metadata["source"])
-
-            """Load, chunk, and upload documents."""
-        LOGGER.info("Loading documents from %s", docs_path)
-        raw_docs = load_documents(docs_path)
-        LOGGER.info("Loaded %d source documents", len(raw_docs))
-
-        chunks = split_documents(raw_docs)
-        LOGGER.info(
-            "Split into %d chunks (chunk_size=%d, chunk_overlap=%d)",
-            len(chunks),
-            CHUNK_SIZE,
-            CHUNK_OVERLAP,
-        )
 
-        if dry_run:
-            LOGGER.info("Dry-run enabled; skipping upload.")
-            return
+    def load_document(self, file_path: Path) -> Document | None:
+        """Load one file, or return None if it is empty."""
+        content = _load_file(file_path).strip()
+        if not content:
+            LOGGER.warning("Skipping empty file: %s", file_path)
+            return None
+        return Document(
+            page_content=content,
+            metadata={
+                "source": self.source_name(file_path),
+                "filename": file_path.name,
+            },
+        )
 
-        store = build_store(index_name)
-        store.add_documents(chunks)
-        LOGGER.info("Finished upserting %d chunks into index '%s'", len(chunks), index_name)
+    @staticmethod
+    def source_name(file_path: Path) -> str:
+        return str(file_path.resolve().relative_to(BASE_DIR))
+
+    async def add_documents(
+        self,
+        source_dir: Path,
+        config: PipelineConfig,
+        manifest: IngestManifest | None = None,
+        local_index_dir: Path | None = None,
+    ) -> Dict[str, StageMetrics]:
+        """
+        Stream files under source_dir through load -> split -> embed -> bulk upsert.
+        With a manifest, only new or changed chunks are embedded and stale chunks are deleted.
+        With ``local_index_dir``, chunks go to a local vector index under that directory instead of Elasticsearch.
+        """
+        es_client = local_index = None
+        if config.dry_run:
+            pass
+        elif local_index_dir is not None:
+            local_index = LocalIndexWriter(local_index_dir / self.index_name)
+        else:
+            es_client = self.get_es_client(is_async=True)
+        pipeline = IngestionPipeline(
+            index_name=self.index_name,
+            splitter=self.splitter,
+            embeddings=emb,
+            load_document=self.load_document,
+            source_name=self.source_name,
+            es_client=es_client,
+            config=config,
+            manifest=manifest,
+            local_index=local_index,
+        )
+        return await pipeline.run(_iter_source_files(source_dir))
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """Chunk documents so they work well with vector search."""
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""],
-        )
-        return splitter.split_documents(documents)
+        return self.splitter.split_documents(documents)
 
 
 def _iter_source_files(source_dir: Path) -> Iterable[Path]:
@@ -152,13 +165,75 @@ def _load_file(path: Path) -> str:
     return text
 
 
-def upsert(index_name: str, docs_path: Path, dry_run: bool = False) -> None:
-    ...
+def upsert(
+    index_name: str,
+    docs_path: Path | None,
+    dry_run: bool = False,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    batch_size: int = 64,
+    embed_concurrency: int = 4,
+    bulk_chunk_size: int = 500,
+    queue_size: int = 8,
+    manifest_path: Path | None = None,
+    full: bool = False,
+    sink: str = "es",
+    local_index_dir: Path | None = None,
+) -> Dict[str, StageMetrics]:
+    """
+    Load, chunk, embed, and upload documents.
+    Unless ``full`` is set, only chunks that changed since the last run (per the manifest) are re-embedded.
+    Either way, chunks that no longer exist are deleted from the index.
+    ``sink="local"`` writes a local vector index under ``local_index_dir`` instead of Elasticsearch.
+    """
+    docs_path = docs_path or DOCS_DIR
+    handler = ESDocumentHandler(index_name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    config = PipelineConfig(
+        batch_size=batch_size,
+        embed_concurrency=embed_concurrency,
+        bulk_chunk_size=bulk_chunk_size,
+        queue_size=queue_size,
+        dry_run=dry_run,
+    )
+    if sink == "local":
+        local_index_dir = local_index_dir or LOCAL_INDEX_DIR
+    else:
+        local_index_dir = None
+    # sink 마다 적재 상태가 다르므로 manifest 도 따로 둔다
+    manifest_path = manifest_path or MANIFEST_DIR / (f"{index_name}.local.json" if sink == "local" else f"{index_name}.json")
+    settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    # full 이어도 이전 manifest 를 읽어야 사라진 chunk 를 지울 수 있다
+    manifest = IngestManifest.load(manifest_path, index_name, settings, rebuild=full)
+
+    LOGGER.info("Upserting documents from %s into %s index '%s'", docs_path, sink, index_name)
+
+    async def run() -> Dict[str, StageMetrics]:
+        try:
+            return await handler.add_documents(docs_path, config, manifest, local_index_dir)
+        finally:
+            await close_http_pools()
+
+    return asyncio.run(run())
+
 
 def main() -> None:
     logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
     args = parse_args()
-    upsert(index_name=args.index, docs_path=args.docs, dry_run=args.dry_run)
+    upsert(
+        index_name=args.index,
+        docs_path=args.docs,
+        dry_run=args.dry_run,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        embed_concurrency=args.embed_concurrency,
+        bulk_chunk_size=args.bulk_chunk_size,
+        queue_size=args.queue_size,
+        manifest_path=args.manifest,
+        full=args.full,
+        sink=args.sink,
+        local_index_dir=args.local_index_dir,
+    )
 
 
 if __name__ == "__main__":
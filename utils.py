@@ -1,7 +1,6 @@
 import os
-import requests
 
-from typing import List
+from typing import List, Optional, Tuple
 from langchain_core.messages import (
     AnyMessage, 
     SystemMessage, 
@@ -11,19 +10,105 @@ from langchain_core.messages import (
 )
 
 
-def get_chat_history(messages: List[AnyMessage]):
-    chat_history = ""
-    for msg in messages:
-        if isinstance(msg, SystemMessage):
-            chat_history += f"- System: {msg.content}\n"
-        elif isinstance(msg, HumanMessage):
-            chat_history += f"- User: {msg.content}\n"
-        elif isinstance(msg, AIMessage):
-            chat_history += f"- Assistant: {msg.content}\n"
-        elif isinstance(msg, ToolMessage):
-            chat_history += f"- Tool use: {msg.content}\n"
+def estimate_tokens(text: str) -> int:
+    """
+    tokenizer 없이 token 수를 대략 추정한다. (UTF-8 4 bytes 당 1 token, 한글은 글자당 약 0.75 token)
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def render_message(msg: AnyMessage) -> str:
+    if isinstance(msg, SystemMessage):
+        return f"- System: {msg.content}\n"
+    elif isinstance(msg, HumanMessage):
+        return f"- User: {msg.content}\n"
+    elif isinstance(msg, AIMessage):
+        return f"- Assistant: {msg.content}\n"
+    elif isinstance(msg, ToolMessage):
+        return f"- Tool use: {msg.content}\n"
+    return ""
+
+
+class _Segment:
+    __slots__ = ("key", "text", "tokens", "is_tool", "_content", "_truncated")
+
+    def __init__(self, key: Tuple[str, str], msg: AnyMessage) -> None:
+        self.key = key
+        self.text = render_message(msg)
+        self.tokens = estimate_tokens(self.text)
+        self.is_tool = isinstance(msg, ToolMessage)
+        self._content = msg.content if self.is_tool else None
+        self._truncated: Optional[Tuple[str, int]] = None
+
+    def truncated(self, max_chars: int) -> Tuple[str, int]:
+        if self._truncated is None:
+            content = str(self._content)
+            if len(content) > max_chars:
+                content = f"{content[:max_chars]} ...(truncated {len(content) - max_chars} chars)"
+            text = f"- Tool use: {content}\n"
+            self._truncated = (text, estimate_tokens(text))
+        return self._truncated
+
+
+_OMITTED_TOOL_TEXT = "- Tool use: (omitted)\n"
+
+
+class ChatHistoryBuilder:
+    """
+    message 별로 render 한 문자열과 token 수를 cache 해두고, 새로 추가된 message 만 render 한다.
+
+    ``render(messages, token_budget=...)`` 를 주면 전체가 budget 을 넘을 때 오래된 ToolMessage 부터
+    ``truncated_tool_chars`` 글자로 자르고, 그래도 넘으면 내용을 생략한다. 최근 ``keep_recent_tool_messages`` 개의
+    ToolMessage 와 다른 message 는 그대로 둔다.
+    """
+    def __init__(self, keep_recent_tool_messages: int = 2, truncated_tool_chars: int = 500) -> None:
+        self.keep_recent_tool_messages = keep_recent_tool_messages
+        self.truncated_tool_chars = truncated_tool_chars
+        self._segments: List[_Segment] = []
+
+    def render(self, messages: List[AnyMessage], token_budget: Optional[int] = None) -> str:
+        self._sync(messages)
+
+        texts = [segment.text for segment in self._segments]
+        total = sum(segment.tokens for segment in self._segments)
+        if token_budget is None or total <= token_budget:
+            return "".join(texts)
+
+        tool_indexes = [i for i, segment in enumerate(self._segments) if segment.is_tool]
+        old_tool_indexes = tool_indexes[:max(len(tool_indexes) - self.keep_recent_tool_messages, 0)]
+
+        for i in old_tool_indexes:
+            text, tokens = self._segments[i].truncated(self.truncated_tool_chars)
+            total -= self._segments[i].tokens - tokens
+            texts[i] = text
+            if total <= token_budget:
+                return "".join(texts)
+
+        omitted_tokens = estimate_tokens(_OMITTED_TOOL_TEXT)
+        for i in old_tool_indexes:
+            total -= estimate_tokens(texts[i]) - omitted_tokens
+            texts[i] = _OMITTED_TOOL_TEXT
+            if total <= token_budget:
+                break
+
+        return "".join(texts)
+
+    def _sync(self, messages: List[AnyMessage]) -> None:
+        """이미 render 한 앞부분은 재사용하고, 달라진 지점부터 다시 render 한다."""
+        keys = [(msg.type, msg.id or str(id(msg))) for msg in messages]
 
-    return chat_history
+        common = 0
+        for segment, key in zip(self._segments, keys):
+            if segment.key != key:
+                break
+            common += 1
+
+        del self._segments[common:]
+        self._segments.extend(_Segment(key, msg) for key, msg in zip(keys[common:], messages[common:]))
+
+
+def get_chat_history(messages: List[AnyMessage]):
+    return ChatHistoryBuilder().render(messages)
 
 
 def safe_filename(filename):
@@ -36,21 +121,14 @@ def safe_filename(filename):
 
     return filename
 
-def call_llm(prompt: str = "", user_input: str = "") -> dict:
-    """
-    Genos LLM 호출하는 함수
-    """
-    token = "b37080c0a4f747d9978f8bd1c4f6ecce"
-    url = "https://genos.genon.ai:3443/api/gateway/rep/serving/43"
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
-    data = {
-        "model": "google/gemini-2.5-pro-preview",
-        "messages": [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": user_input}
-        ]
-    }
-    response = requests.post(url=f"{url}/v1/chat/completions", headers=headers, json=data)
-    return response.json()["choices"][0]["message"]
\ No newline at end of file
+async def call_llm(prompt: str = "", user_input: str = "") -> dict:
+    """
+    Genos LLM 호출하는 함수. 공유 connection pool 을 쓰고 event loop 를 막지 않는다.
+    """
+    from models.gateway import get_gateway_client
+
+    response = await get_gateway_client().chat([
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": user_input}
+    ])
+    return response["choices"][0]["message"]
\ No newline at end of file